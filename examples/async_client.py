@@ -0,0 +1,34 @@
+"""
+Review many files concurrently with the async client.
+
+Usage: python examples/async_client.py path/to/file.py [more files...]
+"""
+
+import asyncio
+import sys
+
+from src.bulk_review import LANGUAGE_EXTENSIONS
+from src.client import CodeReviewClient, ResultCache
+
+API_URL = "http://localhost:8000"
+
+async def main(paths):
+    """Review the given files, reusing cached results for unchanged ones."""
+    items = []
+    for path in paths:
+        extension = "." + path.rsplit(".", 1)[-1].lower()
+        with open(path, "r", encoding="utf-8") as f:
+            items.append({"code": f.read(), "language": LANGUAGE_EXTENSIONS.get(extension, "text")})
+
+    cache = ResultCache(directory=".review_cache")
+    async with CodeReviewClient(API_URL, max_concurrency=4, cache=cache) as client:
+        async for result in client.stream_batch(items):
+            path = paths[result["index"]]
+            if "error" in result:
+                print(f"{path}: failed ({result['error']})")
+                continue
+            count = sum(len(section["items"]) for section in result["suggestions"])
+            print(f"{path}: {count} suggestions")
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
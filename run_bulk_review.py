@@ -0,0 +1,19 @@
+import logging
+from src.bulk_review import main
+from src.config import Config
+
+# Configure logging
+logging.basicConfig(
+    level=getattr(logging, Config.LOG_LEVEL),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume.")
+    except Exception as e:
+        logger.error(f"Bulk review failed: {str(e)}")
+        raise
@@ -30,6 +30,9 @@ setup(
     entry_points={
         "console_scripts": [
             "code-review-assistant=src.run_server:main",
+            "code-review-bulk=src.bulk_review:main",
+            "code-review-replay=src.replay:main",
+            "code-review-gateway=src.gateway:main",
         ],
     },
     include_package_data=True,
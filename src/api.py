@@ -1,18 +1,31 @@
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List, Dict
+import asyncio
+import json
 import logging
 from datetime import datetime
 import os
+import time
 import uuid
 
 from .config import Config
 from .model_manager import ModelManager
 from .code_reviewer import CodeReviewer
+from .profiling import RequestProfiler
+from .prompts import PROMPT_REGISTRY
+from .model_swap import InsufficientMemoryError
+from .live_metrics import MetricsBroadcaster
+from .traffic_capture import TrafficRecorder
+from . import history_archive
+from .cancellation import DEADLINE, DISCONNECTED, CancellationToken, ReviewCancelled, run_with_token
+from .memory_watchdog import register_prometheus
+from .security import require_admin
 
 # Configure logging
 logging.basicConfig(
@@ -51,26 +64,80 @@ app.mount("/static", StaticFiles(directory=static_dir, html=True), name="static"
 templates = Jinja2Templates(directory=static_dir)
 
 # Initialize components
-model_manager = ModelManager(model_name=Config.MODEL_NAME)
-code_reviewer = CodeReviewer(model_manager)
+# The fallback model is only used by degradation, so it is not loaded otherwise
+fallback_model = (ModelManager(model_name=Config.FALLBACK_MODEL_NAME)
+                  if Config.ENABLE_DEGRADATION and Config.FALLBACK_MODEL_NAME else None)
+# The model is only reachable through code_reviewer.model_slot, so a hot swap can free it
+code_reviewer = CodeReviewer(ModelManager(model_name=Config.MODEL_NAME), fallback_model)
+metrics_broadcaster = MetricsBroadcaster(code_reviewer.get_review_metrics, Config.METRICS_PUSH_INTERVAL)
+code_reviewer.add_listener(metrics_broadcaster.notify_review)
+request_profiler = RequestProfiler(Config.PROFILE_OUTPUT_DIR, max_artifacts=Config.PROFILE_MAX_ARTIFACTS)
+traffic_recorder = TrafficRecorder(Config.TRAFFIC_CAPTURE_DIR)
+if Config.ENABLE_TRAFFIC_CAPTURE:
+    traffic_recorder.start()
 
 # Pydantic models
 class CodeReviewRequest(BaseModel):
     code: str
     language: str
     prompt_version: Optional[str] = "default"
+    base_review_id: Optional[str] = None
 
 class CodeReviewResponse(BaseModel):
     review_id: str
     suggestions: List[Dict]
     metrics: Dict
     timestamp: str
+    reused: bool = False
+    reused_from: Optional[str] = None
+    base_review_id: Optional[str] = None
+    prompt_version: str = "default"
+    # full, reduced, fallback_model or static (see degradation.MODES)
+    mode: str = "full"
 
-class MetricsResponse(BaseModel):
+class BatchReviewRequest(BaseModel):
+    requests: List[CodeReviewRequest]
+
+class BatchReviewResponse(BaseModel):
+    reviews: List[CodeReviewResponse]
+
+class FollowupRequest(BaseModel):
+    question: str
+
+class FollowupResponse(BaseModel):
+    review_id: str
+    question: str
+    answer: str
+    session_reused: bool
+    metrics: Dict
+
+class LanguageMetrics(BaseModel):
     total_reviews: int
     avg_response_time: float
     avg_suggestions: float
+    p50_response_time: float
+    p95_response_time: float
+    p99_response_time: float
+    throughput: float
+    tokens_saved: int
+
+class MetricsResponse(LanguageMetrics):
+    window: str
     reviews_today: int
+    by_language: Dict[str, LanguageMetrics]
+
+class ModelSwapRequest(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
+    model_name: str
+    backend: Optional[str] = None
+
+class CaptureRequest(BaseModel):
+    name: Optional[str] = None
+
+class ProfilingRequest(BaseModel):
+    count: int = 0
+    sample_rate: float = 0.0
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
@@ -87,43 +154,290 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "model_status": "loaded"
+        "model_status": "swapping" if code_reviewer.model_slot.swapping else "loaded",
+        "review_mode": code_reviewer.degradation.mode
     }
 
 @app.post("/api/v1/review", response_model=CodeReviewResponse)
-async def review_code(request: CodeReviewRequest, background_tasks: BackgroundTasks):
-    """Submit code for review."""
+async def review_code(request: CodeReviewRequest, background_tasks: BackgroundTasks, http_request: Request):
+    """Submit code for review.
+
+    The review is abandoned when the client disconnects or its deadline
+    (X-Request-Timeout header in seconds, else REQUEST_TIMEOUT_SECONDS) passes.
+    """
+    arrival = traffic_recorder.mark_arrival()
+    started = time.monotonic()
+    status = 200
     try:
+        prompt_version = request.prompt_version or "default"
+        if prompt_version not in PROMPT_REGISTRY:
+            raise HTTPException(status_code=400, detail=f"Unknown prompt version: {prompt_version}")
+        if request.base_review_id and code_reviewer.get_review(request.base_review_id) is None:
+            raise HTTPException(status_code=404, detail=f"Review {request.base_review_id} not found")
+        
         review_id = str(uuid.uuid4())
-        review = code_reviewer.review_code(
-            code=request.code,
-            language=request.language,
-            review_id=review_id
+        token = _request_token(http_request)
+        # Run in a worker thread so concurrent requests (and coalescing of
+        # identical ones) are not serialized on the event loop
+        review = await _run_cancellable(
+            http_request,
+            token,
+            _run_review,
+            request,
+            review_id,
+            prompt_version
         )
         
         # Add background task to update metrics
         background_tasks.add_task(update_metrics, review)
         
-        return CodeReviewResponse(
-            review_id=review.review_id,
-            suggestions=review.suggestions,
-            metrics=review.metrics,
-            timestamp=review.timestamp.isoformat()
-        )
+        return _review_response(review)
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    except ReviewCancelled as e:
+        error = _cancelled_error(e)
+        status = error.status_code
+        raise error
+    except ValueError as e:
+        # An incremental review whose base is in another language
+        status = 400
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        status = 500
         logger.error(f"Error during code review: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if arrival is not None:
+            # Written after the response is sent so capture adds no latency
+            background_tasks.add_task(
+                traffic_recorder.record,
+                arrival,
+                endpoint="review",
+                language=request.language,
+                code=request.code,
+                status=status,
+                latency=time.monotonic() - started,
+                tokenizer=code_reviewer.model_manager.tokenizer,
+                prompt_version=request.prompt_version or "default",
+                incremental=request.base_review_id is not None
+            )
+            if status != 200:
+                # Error responses do not run the request's background tasks
+                _schedule(background_tasks())
+
+_scheduled = set()
+
+def _schedule(coroutine):
+    """Run a coroutine on the event loop without waiting for it, keeping it referenced until done."""
+    task = asyncio.create_task(coroutine)
+    _scheduled.add(task)
+    task.add_done_callback(_scheduled.discard)
+
+def _run_review(request: CodeReviewRequest, review_id: str, prompt_version: str):
+    """Review a request in a worker thread, profiling it if selected."""
+    with request_profiler.claim(review_id):
+        return code_reviewer.review_code(
+            code=request.code,
+            language=request.language,
+            review_id=review_id,
+            base_review_id=request.base_review_id,
+            prompt_version=prompt_version
+        )
+
+def _request_token(http_request: Request) -> CancellationToken:
+    """Cancellation token carrying the request's deadline."""
+    timeout = Config.REQUEST_TIMEOUT_SECONDS
+    header = http_request.headers.get("X-Request-Timeout")
+    if header is not None:
+        try:
+            timeout = float(header)
+        except ValueError:
+            timeout = 0
+        if timeout <= 0:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout must be a positive number of seconds")
+    return CancellationToken(timeout if timeout > 0 else None)
+
+async def _run_cancellable(http_request: Request, token: CancellationToken, fn, *args):
+    """Run fn in a worker thread under token, cancelling it if the client disconnects."""
+    async def watch():
+        while not token.cancelled:
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected; cancelling its review")
+                token.cancel(DISCONNECTED)
+                return
+            await asyncio.sleep(Config.DISCONNECT_POLL_INTERVAL)
+
+    watcher = asyncio.create_task(watch())
+    try:
+        return await run_in_threadpool(run_with_token, token, fn, *args)
+    except asyncio.CancelledError:
+        # The server gave up on the request (e.g. a streaming response noticed the disconnect)
+        token.cancel(DISCONNECTED)
+        raise
+    finally:
+        watcher.cancel()
+
+def _cancelled_error(e: ReviewCancelled) -> HTTPException:
+    # A disconnected client never sees its 499; it is for logs and traffic captures
+    return HTTPException(status_code=504 if e.reason == DEADLINE else 499, detail=str(e))
+
+def _review_response(review) -> CodeReviewResponse:
+    """API representation of a finished review."""
+    return CodeReviewResponse(
+        review_id=review.review_id,
+        suggestions=review.suggestions,
+        metrics=review.metrics,
+        timestamp=review.timestamp.isoformat(),
+        reused=review.reused_from is not None,
+        reused_from=review.reused_from,
+        base_review_id=review.base_review_id,
+        prompt_version=review.prompt_version,
+        mode=review.mode
+    )
+
+def _batch_items(request: BatchReviewRequest) -> List[Dict]:
+    """Validate a batch and turn it into review_batch requests."""
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one request")
+    if len(request.requests) > Config.MAX_BATCH_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {Config.MAX_BATCH_REQUESTS} requests")
+    items = []
+    for item in request.requests:
+        prompt_version = item.prompt_version or "default"
+        if prompt_version not in PROMPT_REGISTRY:
+            raise HTTPException(status_code=400, detail=f"Unknown prompt version: {prompt_version}")
+        if item.base_review_id:
+            raise HTTPException(status_code=400, detail="Incremental reviews are not supported in batches")
+        items.append({
+            'code': item.code,
+            'language': item.language,
+            'prompt_version': prompt_version,
+            'review_id': str(uuid.uuid4())
+        })
+    return items
+
+@app.post("/api/v1/review/batch", response_model=BatchReviewResponse)
+async def review_batch(request: BatchReviewRequest, http_request: Request):
+    """Review several submissions with batched generation; results keep request order."""
+    items = _batch_items(request)
+    token = _request_token(http_request)
+    try:
+        reviews = await _run_cancellable(http_request, token, code_reviewer.review_batch, items)
+        return BatchReviewResponse(reviews=[_review_response(review) for review in reviews])
+    except ReviewCancelled as e:
+        raise _cancelled_error(e)
+    except Exception as e:
+        logger.error(f"Error during batch review: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/review/batch/stream")
+async def review_batch_stream(request: BatchReviewRequest, http_request: Request):
+    """Review a batch, streaming NDJSON results as each model batch finishes.
+
+    Each line is a review with an `index` field giving its position in the
+    request, or an `error` line for a chunk that failed. The stream ends
+    early if the client disconnects or the deadline passes.
+    """
+    items = _batch_items(request)
+    chunk_size = max(1, code_reviewer.model_manager.batch_size)
+    token = _request_token(http_request)
+
+    async def results():
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            try:
+                reviews = await _run_cancellable(http_request, token, code_reviewer.review_batch, chunk)
+            except ReviewCancelled as e:
+                logger.info(f"Streamed batch stopped after {start} of {len(items)} reviews: {e.reason}")
+                for index in range(start, len(items)):
+                    yield json.dumps({'index': index, 'error': str(e)}) + '\n'
+                return
+            except Exception as e:
+                logger.error(f"Error during streamed batch review: {str(e)}")
+                for offset in range(len(chunk)):
+                    yield json.dumps({'index': start + offset, 'error': str(e)}) + '\n'
+                continue
+            for offset, review in enumerate(reviews):
+                yield json.dumps({'index': start + offset, **_review_response(review).model_dump()}) + '\n'
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/api/v1/review/{review_id}/followup", response_model=FollowupResponse)
+async def follow_up(review_id: str, request: FollowupRequest, http_request: Request):
+    """Ask a follow-up question about a review."""
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question must not be empty")
+    if code_reviewer.get_review(review_id) is None:
+        raise HTTPException(status_code=404, detail=f"Review {review_id} not found")
+    token = _request_token(http_request)
+    try:
+        result = await _run_cancellable(http_request, token, code_reviewer.follow_up, review_id, request.question)
+        return FollowupResponse(**result)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ReviewCancelled as e:
+        raise _cancelled_error(e)
+    except Exception as e:
+        logger.error(f"Error answering follow-up: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/prompts")
+async def get_prompt_versions():
+    """List the available prompt versions."""
+    return [{
+        "version": version,
+        "description": PROMPT_REGISTRY.get(version).description
+    } for version in PROMPT_REGISTRY.versions()]
 
 @app.get("/api/v1/metrics", response_model=MetricsResponse)
-async def get_metrics():
-    """Get review metrics."""
+async def get_metrics(window: str = "all", language: Optional[str] = None):
+    """Get review metrics over a window (1m, 5m, 15m, 1h, 6h, 24h, 7d, 30d or all)."""
     try:
-        metrics = code_reviewer.get_review_metrics()
+        metrics = code_reviewer.get_review_metrics(window, language)
         return MetricsResponse(**metrics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching metrics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/metrics/sketch")
+async def get_metrics_sketch(window: str = "all", language: Optional[str] = None):
+    """Raw latency sketches behind /api/v1/metrics, so a gateway can merge replicas exactly."""
+    try:
+        return code_reviewer.metrics_rollup.export(window, language)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/v1/metrics/memory")
+async def get_memory_metrics():
+    """Memory readings and the inference limits the memory watchdog has set."""
+    return code_reviewer.memory_watchdog.describe()
+
+@app.websocket("/api/v1/ws/metrics")
+async def metrics_stream(websocket: WebSocket):
+    """Push a metrics snapshot, then metric deltas and new reviews as they happen."""
+    await websocket.accept()
+    queue = await metrics_broadcaster.subscribe()
+
+    async def forward():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        # Clients only listen; reading notices disconnects while no pushes are due
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in metrics stream: {str(e)}")
+    finally:
+        sender.cancel()
+        metrics_broadcaster.unsubscribe(queue)
+
 @app.get("/api/v1/history")
 async def get_history(limit: Optional[int] = None):
     """Get review history."""
@@ -134,12 +448,152 @@ async def get_history(limit: Optional[int] = None):
             "language": review.language,
             "suggestions": review.suggestions,
             "metrics": review.metrics,
-            "timestamp": review.timestamp.isoformat()
+            "timestamp": review.timestamp.isoformat(),
+            "reused": review.reused_from is not None,
+            "mode": review.mode
         } for review in history]
     except Exception as e:
         logger.error(f"Error fetching history: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/history/search")
+async def search_history(q: str, language: Optional[str] = None, section: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         page: int = 1, page_size: int = 20):
+    """Search suggestions in review history, best matches first."""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    if page < 1 or not 1 <= page_size <= Config.MAX_SEARCH_PAGE_SIZE:
+        raise HTTPException(status_code=400,
+                            detail=f"page must be positive and page_size between 1 and {Config.MAX_SEARCH_PAGE_SIZE}")
+    since, until = _local_times(since, until)
+    try:
+        return code_reviewer.search_history(q, language, section, since, until, page, page_size)
+    except Exception as e:
+        logger.error(f"Error searching history: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _local_times(*times: Optional[datetime]) -> List[Optional[datetime]]:
+    """Query times as naive local times, like review timestamps."""
+    return [t.astimezone().replace(tzinfo=None) if t and t.tzinfo else t for t in times]
+
+async def _analytics(aggregate, since: Optional[datetime], until: Optional[datetime]):
+    """Run an aggregate from history_archive over archived and live reviews in [since, until)."""
+    since, until = _local_times(since, until)
+    try:
+        table = await run_in_threadpool(code_reviewer.history_table, since, until)
+        return {
+            "since": since.isoformat() if since else None,
+            "until": until.isoformat() if until else None,
+            "reviews": table.num_rows,
+            "results": await run_in_threadpool(aggregate, table)
+        }
+    except Exception as e:
+        logger.error(f"Error computing analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/analytics/languages")
+async def get_language_analytics(since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Reviews and suggestions per language per day."""
+    return await _analytics(history_archive.counts_by_language_day, since, until)
+
+@app.get("/api/v1/analytics/sections")
+async def get_section_analytics(since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Findings per section type, overall and per language."""
+    return await _analytics(history_archive.section_counts, since, until)
+
+@app.get("/api/v1/analytics/themes")
+async def get_theme_analytics(since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """How often each finding theme (SQL injection, error handling, ...) comes up."""
+    return await _analytics(history_archive.theme_counts, since, until)
+
+@app.get("/api/v1/analytics/latency")
+async def get_latency_analytics(since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Latency distribution of generated reviews by code size."""
+    return await _analytics(history_archive.latency_by_code_size, since, until)
+
+@app.get("/api/v1/admin/archive", dependencies=[Depends(require_admin)])
+async def get_archive():
+    """Size of the history archive."""
+    if code_reviewer.archive is None:
+        raise HTTPException(status_code=404, detail="History archive is disabled")
+    return code_reviewer.archive.describe()
+
+@app.get("/api/v1/admin/degradation", dependencies=[Depends(require_admin)])
+async def get_degradation():
+    """Current review mode and the latency it is based on."""
+    return code_reviewer.degradation.describe()
+
+@app.get("/api/v1/admin/sessions", dependencies=[Depends(require_admin)])
+async def get_sessions():
+    """Occupancy and hit rate of the follow-up session store."""
+    return code_reviewer.sessions.describe()
+
+@app.get("/api/v1/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling():
+    """Get profiling settings and the list of saved profiles."""
+    return request_profiler.status()
+
+@app.post("/api/v1/admin/profiling", dependencies=[Depends(require_admin)])
+async def configure_profiling(request: ProfilingRequest):
+    """Profile the next N review requests and/or a sampled fraction of them."""
+    try:
+        request_profiler.configure(count=request.count, sample_rate=request.sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return request_profiler.status()
+
+@app.delete("/api/v1/admin/profiling", dependencies=[Depends(require_admin)])
+async def disable_profiling():
+    """Stop profiling review requests."""
+    request_profiler.disable()
+    return request_profiler.status()
+
+@app.get("/api/v1/admin/profiling/{artifact}", dependencies=[Depends(require_admin)])
+async def download_profile(artifact: str):
+    """Download a saved pstats file or Chrome trace."""
+    path = request_profiler.artifact_path(artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=artifact)
+
+@app.get("/api/v1/admin/capture", dependencies=[Depends(require_admin)])
+async def get_capture():
+    """Get the traffic capture state."""
+    return traffic_recorder.status()
+
+@app.post("/api/v1/admin/capture", dependencies=[Depends(require_admin)])
+async def start_capture(request: CaptureRequest):
+    """Start recording anonymised review request shapes for replay."""
+    try:
+        return traffic_recorder.start(request.name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/api/v1/admin/capture", dependencies=[Depends(require_admin)])
+async def stop_capture():
+    """Stop recording traffic."""
+    return traffic_recorder.stop()
+
+@app.get("/api/v1/admin/model", dependencies=[Depends(require_admin)])
+async def get_model():
+    """Get the active model and the progress of any hot swap."""
+    return code_reviewer.model_slot.describe()
+
+@app.post("/api/v1/admin/model", status_code=202, dependencies=[Depends(require_admin)])
+async def swap_model(request: ModelSwapRequest):
+    """Load a new model in the background and switch new requests to it."""
+    try:
+        # Sizing the new model may fetch its config from the Hub
+        return await run_in_threadpool(code_reviewer.model_slot.start_swap, request.model_name, request.backend)
+    except InsufficientMemoryError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting model swap: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 async def update_metrics(review):
     """Background task to update metrics."""
     try:
@@ -149,6 +603,27 @@ async def update_metrics(review):
     except Exception as e:
         logger.error(f"Error updating metrics: {str(e)}")
 
+@app.on_event("startup")
+def start_memory_watchdog():
+    """Start adapting inference limits to memory, and serve Prometheus metrics if enabled."""
+    code_reviewer.memory_watchdog.start()
+    if Config.ENABLE_METRICS and register_prometheus(code_reviewer.memory_watchdog):
+        from prometheus_client import start_http_server
+        try:
+            start_http_server(Config.PROMETHEUS_METRICS_PORT)
+        except OSError as e:
+            logger.error(f"Could not serve Prometheus metrics on port {Config.PROMETHEUS_METRICS_PORT}: {str(e)}")
+
+@app.on_event("shutdown")
+def stop_memory_watchdog():
+    code_reviewer.memory_watchdog.stop()
+
+@app.on_event("shutdown")
+def flush_history_archive():
+    """Write reviews still buffered for the archive."""
+    if code_reviewer.archive is not None:
+        code_reviewer.archive.flush()
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler."""
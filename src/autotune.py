@@ -0,0 +1,237 @@
+"""
+CPU inference autotuner.
+
+Benchmarks a short generation across thread counts, batch sizes and dtypes and
+stores the fastest setting per host fingerprint, so later starts on the same
+kind of machine apply it instead of torch's defaults.
+
+Usage: python -m src.autotune [--force]
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import platform
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import torch
+
+from .config import Config
+from .prompts import count_tokens
+
+logger = logging.getLogger(__name__)
+
+AUTOTUNE_PROMPT = """Review this python code.
+```python
+def total(values):
+    result = 0
+    for v in values:
+        result += v
+    return result
+```
+"""
+
+DTYPES = {
+    'float32': torch.float32,
+    'bfloat16': torch.bfloat16,
+    'float16': torch.float16
+}
+
+
+def _available_cpus() -> int:
+    """CPUs this process may run on, honouring container CPU sets."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _cpu_model() -> str:
+    """CPU model name from /proc/cpuinfo, or the platform processor string."""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def host_fingerprint(model_name: str, backend: str) -> str:
+    """Identify the host hardware, software and model a tuning result applies to."""
+    host = {
+        'machine': platform.machine(),
+        'cpu_model': _cpu_model(),
+        'cpus': _available_cpus(),
+        'torch': torch.__version__,
+        'model': model_name,
+        'backend': backend
+    }
+    return hashlib.sha256(json.dumps(host, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def load_tuning(fingerprint: str, path: str = Config.AUTOTUNE_CACHE_PATH) -> Optional[Dict]:
+    """Return the stored settings for a fingerprint, if any."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get(fingerprint)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable autotune cache {path}: {str(e)}")
+        return None
+
+
+def save_tuning(fingerprint: str, result: Dict, path: str = Config.AUTOTUNE_CACHE_PATH):
+    """Store settings for a fingerprint, keeping entries for other hosts."""
+    entries = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+    entries[fingerprint] = result
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write atomically so concurrent replicas never read a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def candidate_settings(cpus: int) -> List[Dict]:
+    """Settings to benchmark on a host with the given CPU count."""
+    threads = sorted({max(1, cpus // 4), max(1, cpus // 2), cpus})
+    # Grouped by dtype so the model is cast once per dtype
+    return [
+        {'threads': t, 'batch_size': b, 'dtype': d}
+        for d, t, b in itertools.product(Config.AUTOTUNE_DTYPES, threads, Config.AUTOTUNE_BATCH_SIZES)
+    ]
+
+
+def apply_interop_threads(model_name: str, backend: str):
+    """Apply the stored inter-op thread count.
+
+    torch only accepts this before any inter-op parallel work has started, so
+    ModelManager calls it before loading the model.
+    """
+    stored = load_tuning(host_fingerprint(model_name, backend))
+    if not stored or 'interop_threads' not in stored['settings']:
+        return
+    try:
+        torch.set_num_interop_threads(stored['settings']['interop_threads'])
+    except RuntimeError:
+        logger.warning("Inter-op thread count was already fixed for this process")
+
+
+def apply_settings(model_manager, settings: Dict) -> bool:
+    """Apply settings to torch and the model; returns False if the dtype is unsupported."""
+    torch.set_num_threads(settings['threads'])
+    if not model_manager.backend.set_dtype(DTYPES[settings['dtype']]):
+        return False
+    model_manager.batch_size = settings['batch_size']
+    return True
+
+
+def benchmark(model_manager, settings: Dict, max_new_tokens: int) -> Optional[Dict]:
+    """Time one batched generation under the given settings."""
+    if not apply_settings(model_manager, settings):
+        return None
+    prompts = [AUTOTUNE_PROMPT] * settings['batch_size']
+    try:
+        # Warm up caches and lazy initialization before timing
+        model_manager.backend.generate_batch(prompts, max_new_tokens)
+        start = time.perf_counter()
+        outputs = model_manager.backend.generate_batch(prompts, max_new_tokens)
+        elapsed = time.perf_counter() - start
+    except Exception as e:
+        logger.warning(f"Autotune candidate {settings} failed: {str(e)}")
+        return None
+    # Sequences can stop at EOS before max_new_tokens, so count what was generated
+    generated = sum(count_tokens(model_manager.tokenizer, output) for output in outputs)
+    return {
+        'latency': elapsed,
+        'tokens_per_second': generated / elapsed
+    }
+
+
+def run_autotune(model_manager, max_new_tokens: int = Config.AUTOTUNE_MAX_NEW_TOKENS) -> Dict:
+    """Benchmark all candidates and return the best result.
+
+    Candidates whose single-batch latency exceeds AUTOTUNE_MAX_LATENCY are
+    discarded so a large batch never wins on throughput alone.
+    """
+    best = None
+    for settings in candidate_settings(_available_cpus()):
+        measurement = benchmark(model_manager, settings, max_new_tokens)
+        if measurement is None:
+            continue
+        logger.info(f"Autotune {settings}: {measurement['tokens_per_second']:.1f} tok/s, "
+                    f"{measurement['latency']:.2f}s")
+        if Config.AUTOTUNE_MAX_LATENCY and measurement['latency'] > Config.AUTOTUNE_MAX_LATENCY:
+            continue
+        if best is None or measurement['tokens_per_second'] > best['tokens_per_second']:
+            best = {'settings': settings, **measurement}
+
+    if best is None:
+        raise RuntimeError("No autotune candidate completed successfully")
+    best['settings'] = dict(best['settings'], interop_threads=Config.AUTOTUNE_INTEROP_THREADS)
+    best['tuned_at'] = datetime.now().isoformat()
+    return best
+
+
+def autotune_model_manager(model_manager, mode: str) -> Optional[Dict]:
+    """Apply stored settings or tune, depending on mode.
+
+    Modes: off (do nothing), load (apply stored settings only), run (tune if
+    nothing is stored), force (always tune).
+    """
+    if mode == 'off':
+        return None
+    fingerprint = host_fingerprint(model_manager.model_name, model_manager.backend.name)
+    stored = load_tuning(fingerprint)
+
+    if stored and mode != 'force':
+        logger.info(f"Applying autotuned settings for host {fingerprint}: {stored['settings']}")
+        apply_settings(model_manager, stored['settings'])
+        return stored
+    if mode not in ('run', 'force'):
+        logger.info(f"No autotuned settings for host {fingerprint}; using defaults")
+        return None
+
+    logger.info(f"Autotuning inference settings for host {fingerprint}")
+    result = run_autotune(model_manager)
+    save_tuning(fingerprint, result)
+    apply_settings(model_manager, result['settings'])
+    logger.info(f"Autotune selected {result['settings']} ({result['tokens_per_second']:.1f} tok/s)")
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point: tune this host and store the result."""
+    parser = argparse.ArgumentParser(description="Benchmark and store CPU inference settings for this host.")
+    parser.add_argument("--force", action="store_true", help="Re-tune even if settings are stored")
+    parser.add_argument("--model", default=Config.MODEL_NAME)
+    parser.add_argument("--backend", default=Config.INFERENCE_BACKEND)
+    args = parser.parse_args(argv)
+
+    from .model_manager import ModelManager
+
+    # Tune explicitly below rather than through the startup hook
+    manager = ModelManager(model_name=args.model, backend=args.backend, autotune_mode='off')
+    result = autotune_model_manager(manager, 'force' if args.force else 'run')
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Offline bulk review of a directory tree.
+
+Files are reviewed in-process by a pool of worker processes, each with its own
+ModelManager, and results are appended to a JSONL file as they complete. The
+output file doubles as the checkpoint: on restart, files already present in it
+with the same content hash are skipped.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing.util
+import os
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .autotune import host_fingerprint, load_tuning
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_EXTENSIONS = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.jsx': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'typescript',
+    '.java': 'java',
+    '.c': 'c',
+    '.h': 'c',
+    '.cc': 'cpp',
+    '.cpp': 'cpp',
+    '.hpp': 'cpp',
+    '.go': 'go',
+    '.rs': 'rust',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.cs': 'csharp',
+    '.kt': 'kotlin',
+    '.swift': 'swift',
+    '.scala': 'scala',
+    '.sh': 'shell',
+}
+
+DEFAULT_EXCLUDED_DIRS = {
+    '.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv',
+    '.tox', '.mypy_cache', '.pytest_cache', 'build', 'dist'
+}
+
+# Reviewer owned by each worker process, created by _init_worker
+_worker_reviewer = None
+
+
+def iter_source_files(root: str, languages: Optional[Set[str]] = None,
+                      excluded_dirs: Set[str] = DEFAULT_EXCLUDED_DIRS) -> Iterator[Tuple[str, str]]:
+    """Yield (path, language) for reviewable files under root in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in excluded_dirs)
+        for filename in sorted(filenames):
+            language = LANGUAGE_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+            if language and (not languages or language in languages):
+                yield os.path.join(dirpath, filename), language
+
+
+def load_checkpoint(output_path: str) -> Set[Tuple[str, str]]:
+    """Return the (path, sha256) pairs already reviewed successfully in the output file.
+
+    Failed records are removed, since those files are retried and appended
+    again, so the output keeps one record per (path, sha256). A trailing
+    partial line left by an interrupted run is dropped as well.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    kept = []
+    rewrite = False
+    with open(output_path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Dropping partial record at end of {output_path}")
+                rewrite = True
+                break
+            if record.get('error'):
+                rewrite = True
+                continue
+            done.add((record['path'], record['sha256']))
+            kept.append(line)
+
+    if rewrite:
+        # Write the cleaned checkpoint beside the original and swap it in atomically
+        temp_path = output_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, output_path)
+    return done
+
+
+def _init_worker(model_name: str, workers: int):
+    """Load the model once per worker process."""
+    global _worker_reviewer
+    import torch
+    from .model_manager import ModelManager
+    from .code_reviewer import CodeReviewer
+
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
+    # Workers must not write to and compact the same archive directory
+    Config.HISTORY_ARCHIVE_DIR = os.path.join(Config.HISTORY_ARCHIVE_DIR, f"bulk-worker-{os.getpid()}")
+    _worker_reviewer = CodeReviewer(ModelManager(model_name=model_name))
+    # Runs when the pool shuts the worker down, unlike atexit handlers
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+    # Share the (possibly autotuned) thread budget between workers
+    torch.set_num_threads(max(1, torch.get_num_threads() // workers))
+
+
+def _close_worker():
+    """Write the reviews a worker still buffers for its history archive."""
+    if _worker_reviewer is not None and _worker_reviewer.archive is not None:
+        _worker_reviewer.archive.flush()
+
+
+def _review_files(batch: List[Dict]) -> List[Dict]:
+    """Review a batch of files in a worker process."""
+    try:
+        reviews = _worker_reviewer.review_batch([
+            {'code': item['code'], 'language': item['language'], 'review_id': str(uuid.uuid4())}
+            for item in batch
+        ])
+    except Exception as e:
+        return [_record(item, error=str(e)) for item in batch]
+    return [_record(item, review=review) for item, review in zip(batch, reviews)]
+
+
+def _record(item: Dict, review=None, error: Optional[str] = None) -> Dict:
+    """Build the JSONL record for a reviewed file."""
+    record = {
+        'path': item['path'],
+        'language': item['language'],
+        'sha256': item['sha256']
+    }
+    if review is not None:
+        record.update({
+            'review_id': review.review_id,
+            'suggestions': review.suggestions,
+            'metrics': review.metrics,
+            'timestamp': review.timestamp.isoformat(),
+            'reused': review.reused_from is not None
+        })
+    if error is not None:
+        record['error'] = error
+    return record
+
+
+def _iter_batches(root: str, languages: Optional[Set[str]], done: Set[Tuple[str, str]],
+                  batch_size: int, max_file_bytes: int) -> Iterator[List[Dict]]:
+    """Read pending files and group them into batches."""
+    batch = []
+    for path, language in iter_source_files(root, languages):
+        relative_path = os.path.relpath(path, root)
+        if os.path.getsize(path) > max_file_bytes:
+            logger.info(f"Skipping {relative_path}: larger than {max_file_bytes} bytes")
+            continue
+        with open(path, 'rb') as f:
+            content = f.read()
+        sha256 = hashlib.sha256(content).hexdigest()
+        if (relative_path, sha256) in done:
+            continue
+        batch.append({
+            'path': relative_path,
+            'language': language,
+            'sha256': sha256,
+            'code': content.decode('utf-8', errors='replace')
+        })
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_bulk_review(root: str, output_path: str, languages: Optional[Set[str]] = None,
+                    workers: int = Config.BULK_WORKERS, batch_size: int = Config.BULK_BATCH_SIZE,
+                    max_file_bytes: int = Config.BULK_MAX_FILE_BYTES,
+                    model_name: str = Config.MODEL_NAME) -> Dict:
+    """Review every matching file under root, appending results to output_path."""
+    done = load_checkpoint(output_path)
+    if done:
+        logger.info(f"Resuming: {len(done)} files already reviewed")
+
+    stats = {'reviewed': 0, 'failed': 0, 'skipped': len(done)}
+    batches = _iter_batches(root, languages, done, batch_size, max_file_bytes)
+
+    with open(output_path, 'a', encoding='utf-8') as out, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(model_name, workers)
+    ) as pool:
+        # Keep a bounded number of batches in flight so file contents are not
+        # all read into memory up front.
+        in_flight = set()
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < workers * 2:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                else:
+                    in_flight.add(pool.submit(_review_files, batch))
+            if not in_flight:
+                break
+
+            completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                for record in future.result():
+                    out.write(json.dumps(record) + '\n')
+                    if record.get('error'):
+                        stats['failed'] += 1
+                        logger.error(f"Failed to review {record['path']}: {record['error']}")
+                    else:
+                        stats['reviewed'] += 1
+            # Persist completed work before moving on so an interrupted run resumes here
+            out.flush()
+            os.fsync(out.fileno())
+            logger.info(f"Progress: {stats['reviewed']} reviewed, {stats['failed']} failed")
+
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point for bulk reviews."""
+    parser = argparse.ArgumentParser(description="Review a directory of source files offline.")
+    parser.add_argument("root", help="Directory to review")
+    parser.add_argument("-o", "--output", default="reviews.jsonl", help="JSONL file to append results to")
+    parser.add_argument("-l", "--language", action="append", dest="languages",
+                        help="Only review files in this language (repeatable)")
+    parser.add_argument("-w", "--workers", type=int, default=Config.BULK_WORKERS,
+                        help="Number of worker processes, each loading its own model")
+    parser.add_argument("-b", "--batch-size", type=int,
+                        help="Files per batched generation call (default: autotuned or BULK_BATCH_SIZE)")
+    parser.add_argument("--max-file-bytes", type=int, default=Config.BULK_MAX_FILE_BYTES,
+                        help="Skip files larger than this")
+    parser.add_argument("--model", default=Config.MODEL_NAME, help="Model to load in each worker")
+    args = parser.parse_args(argv)
+
+    batch_size = args.batch_size
+    if batch_size is None:
+        tuned = load_tuning(host_fingerprint(args.model, Config.INFERENCE_BACKEND))
+        batch_size = tuned['settings']['batch_size'] if tuned else Config.BULK_BATCH_SIZE
+
+    stats = run_bulk_review(
+        root=args.root,
+        output_path=args.output,
+        languages=set(args.languages) if args.languages else None,
+        workers=args.workers,
+        batch_size=batch_size,
+        max_file_bytes=args.max_file_bytes,
+        model_name=args.model
+    )
+    print(f"Reviewed {stats['reviewed']} files, {stats['failed']} failed, "
+          f"{stats['skipped']} already done. Results in {args.output}")
+    return stats
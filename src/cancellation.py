@@ -0,0 +1,144 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+import torch
+from transformers import StoppingCriteria
+
+DEADLINE = 'deadline'
+DISCONNECTED = 'disconnected'
+
+
+class ReviewCancelled(Exception):
+    """A review abandoned because its deadline passed or its client went away."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Review cancelled: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """Cancellation state of one request: an optional deadline plus explicit cancel()."""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._reason: Optional[str] = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = DISCONNECTED):
+        if self._reason is None:
+            self._reason = reason
+        self._event.set()
+
+    @property
+    def reason(self) -> Optional[str]:
+        """Why the request was cancelled, or None while it is still wanted."""
+        if self._reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(DEADLINE)
+        return self._reason
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to seconds, returning True early if cancelled."""
+        if self.deadline is not None:
+            seconds = min(seconds, max(0.0, self.deadline - time.monotonic()))
+        self._event.wait(seconds)
+        return self.cancelled
+
+
+class SharedToken:
+    """Token of work shared by several requests; cancelled only once all of them are.
+
+    A member of None is a caller that can never cancel, which keeps the work alive.
+    """
+
+    def __init__(self, tokens: Optional[List[Optional[CancellationToken]]] = None):
+        self._tokens: List[Optional[CancellationToken]] = []
+        self._lock = threading.Lock()
+        for token in tokens or []:
+            self.add(token)
+
+    def add(self, token: Optional[CancellationToken]):
+        with self._lock:
+            self._tokens.append(token)
+
+    @property
+    def reason(self) -> Optional[str]:
+        with self._lock:
+            tokens = list(self._tokens)
+        reasons = [token.reason if token is not None else None for token in tokens]
+        if not reasons or None in reasons:
+            return None
+        # Report a deadline if any caller timed out; otherwise everyone disconnected
+        return DEADLINE if DEADLINE in reasons else reasons[0]
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def wait(self, seconds: float) -> bool:
+        # Members cancel independently, so poll rather than wait on one event
+        end = time.monotonic() + seconds
+        while not self.cancelled and time.monotonic() < end:
+            time.sleep(min(0.05, max(0.0, end - time.monotonic())))
+        return self.cancelled
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('cancellation_token', default=None)
+
+
+def current_token():
+    """Token of the request running in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def use_token(token):
+    """Make token the current request's token for the duration of the block."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def run_with_token(token, fn, *args, **kwargs):
+    """Call fn with token as the current token (for use in worker threads)."""
+    with use_token(token):
+        return fn(*args, **kwargs)
+
+
+def is_cancelled() -> bool:
+    token = current_token()
+    return token is not None and token.cancelled
+
+
+def check_cancelled():
+    """Raise ReviewCancelled if the current request has been cancelled."""
+    token = current_token()
+    if token is not None and token.cancelled:
+        raise ReviewCancelled(token.reason)
+
+
+def sleep(seconds: float):
+    """Sleep, waking early if the current request is cancelled."""
+    token = current_token()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.wait(seconds)
+
+
+class CancellationCriteria(StoppingCriteria):
+    """Stops generate() at the next decode step once the token is cancelled."""
+
+    def __init__(self, token):
+        self.token = token
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.token.cancelled, dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,284 @@
+"""
+Async Python client for the Code Review Assistant API.
+
+    async with CodeReviewClient("http://localhost:8000", max_concurrency=8) as client:
+        results = await client.review_many([
+            {"code": source, "language": "python"} for source in sources
+        ])
+
+Connections are pooled and kept alive across calls, at most `max_concurrency`
+requests are in flight at once, transient failures (connection errors, 429,
+502, 503 and 504) are retried with jittered exponential backoff that honours
+Retry-After, and results are cached by content hash so unchanged files are
+not sent again.
+"""
+import asyncio
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class CodeReviewError(Exception):
+    """A request the server rejected or that kept failing after retries."""
+
+    def __init__(self, status: Optional[int], detail: str):
+        super().__init__(f"{status}: {detail}" if status else detail)
+        self.status = status
+        self.detail = detail
+
+
+def content_key(code: str, language: str, prompt_version: str = "default") -> str:
+    """Cache key for a submission."""
+    digest = hashlib.sha256()
+    for part in (language.strip().lower(), prompt_version, code):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultCache:
+    """LRU cache of review results in memory, optionally persisted as one file per key."""
+
+    def __init__(self, max_entries: int = 1024, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._remember(key, result)
+            return result
+        return None
+
+    def put(self, key: str, result: Dict):
+        self._remember(key, result)
+        if self.directory:
+            # Write then rename so concurrent processes never read a partial file
+            temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(temp_path, self._path(key))
+
+    def _remember(self, key: str, result: Dict):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class CodeReviewClient:
+    """Pooled, concurrency-limited, retrying async client for the review API."""
+
+    def __init__(self, base_url: str = "http://localhost:8000", max_concurrency: int = 8,
+                 timeout: float = 300.0, max_retries: int = 4, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, cache: Optional[ResultCache] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache if cache is not None else ResultCache()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            # The server stops working on a review once the client would have given up on it
+            headers={'X-Request-Timeout': str(timeout)} if timeout and timeout > 0 else None,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport
+        )
+
+    async def __aenter__(self) -> "CodeReviewClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Delay before a retry: Retry-After if given, else full-jitter exponential backoff."""
+        if response is not None:
+            delay = retry_after_seconds(response.headers.get('Retry-After'))
+            if delay is not None:
+                return min(delay, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _error(response: httpx.Response) -> CodeReviewError:
+        try:
+            detail = response.json().get('detail', response.text)
+        except ValueError:
+            detail = response.text
+        return CodeReviewError(response.status_code, str(detail))
+
+    async def _request(self, method: str, path: str, **kwargs) -> Dict:
+        """Send a request under the concurrency limit, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                async with self._semaphore:
+                    response = await self._client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise CodeReviewError(None, f"{method} {path} failed: {str(e)}") from e
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                if response.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise self._error(response)
+            delay = self._backoff(attempt, response)
+            logger.info(f"Retrying {method} {path} in {delay:.2f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+
+    async def review(self, code: str, language: str, prompt_version: str = "default",
+                     base_review_id: Optional[str] = None) -> Dict:
+        """Review one submission, answering from the cache when the content was seen before.
+
+        Incremental reviews (base_review_id) depend on server state and are never cached.
+        """
+        key = content_key(code, language, prompt_version)
+        if base_review_id is None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        payload = {'code': code, 'language': language, 'prompt_version': prompt_version}
+        if base_review_id is not None:
+            payload['base_review_id'] = base_review_id
+        result = await self._request("POST", "/api/v1/review", json=payload)
+        if base_review_id is None:
+            self.cache.put(key, result)
+        return result
+
+    async def review_many(self, items: List[Dict], return_exceptions: bool = False) -> List:
+        """Review submissions concurrently (bounded by max_concurrency), in input order.
+
+        Each item is a dict with code and language and optionally prompt_version
+        and base_review_id. With return_exceptions, failures are returned in
+        place instead of raised.
+        """
+        return await asyncio.gather(
+            *(self.review(**item) for item in items),
+            return_exceptions=return_exceptions
+        )
+
+    def _split_cached(self, items: List[Dict]):
+        """Results known from the cache by index, and the items still to send."""
+        results: Dict[int, Dict] = {}
+        pending = []
+        for index, item in enumerate(items):
+            cached = self.cache.get(content_key(item['code'], item['language'], item.get('prompt_version', 'default')))
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append((index, item))
+        return results, pending
+
+    def _remember(self, item: Dict, result: Dict):
+        self.cache.put(content_key(item['code'], item['language'], item.get('prompt_version', 'default')), result)
+
+    async def review_batch(self, items: List[Dict], batch_size: int = 32) -> List[Dict]:
+        """Review submissions through the batch endpoint, sending only uncached ones."""
+        results, pending = self._split_cached(items)
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            response = await self._request(
+                "POST", "/api/v1/review/batch",
+                json={'requests': [item for _, item in chunk]}
+            )
+            for (index, item), result in zip(chunk, response['reviews']):
+                self._remember(item, result)
+                results[index] = result
+        return [results[index] for index in range(len(items))]
+
+    async def stream_batch(self, items: List[Dict], batch_size: int = 32) -> AsyncIterator[Dict]:
+        """Yield results as the server finishes them; cached results come first.
+
+        Each result carries `index`, its position in items. A stream is retried
+        only if it fails before producing any result.
+        """
+        results, pending = self._split_cached(items)
+        for index, result in results.items():
+            yield {**result, 'index': index}
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            async for line in self._stream_lines("/api/v1/review/batch/stream",
+                                                 {'requests': [item for _, item in chunk]}):
+                result = json.loads(line)
+                index, item = chunk[result['index']]
+                result['index'] = index
+                if 'error' not in result:
+                    self._remember(item, {k: v for k, v in result.items() if k != 'index'})
+                yield result
+
+    async def _stream_lines(self, path: str, payload: Dict) -> AsyncIterator[str]:
+        received = False
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                async with self._semaphore, self._client.stream("POST", path, json=payload) as response:
+                    if response.status_code < 400:
+                        async for line in response.aiter_lines():
+                            if line.strip():
+                                received = True
+                                yield line
+                        return
+                    await response.aread()
+                    if response.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                        raise self._error(response)
+            except httpx.TransportError as e:
+                # Retrying after partial output would repeat results
+                if received or attempt == self.max_retries:
+                    raise CodeReviewError(None, f"POST {path} failed: {str(e)}") from e
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def follow_up(self, review_id: str, question: str) -> Dict:
+        """Ask a question about a previous review."""
+        return await self._request("POST", f"/api/v1/review/{review_id}/followup", json={'question': question})
+
+    async def metrics(self, window: str = "all", language: Optional[str] = None) -> Dict:
+        """Server review metrics over a window."""
+        params = {'window': window}
+        if language is not None:
+            params['language'] = language
+        return await self._request("GET", "/api/v1/metrics", params=params)
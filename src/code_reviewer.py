@@ -1,84 +1,545 @@
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+import copy
+import hashlib
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from .model_manager import ModelManager
+from .model_manager import DEFAULT_RESPONSE, ModelManager
 from .config import Config
+from .fingerprint import code_fingerprint
+from .prompts import (FOLLOWUP_TEMPLATE, FORKED_PROMPT_VERSION, PROMPT_REGISTRY, SECTION_CONTINUATIONS,
+                      SECTION_PREFIX_TEMPLATE, count_tokens)
+from .incremental import FILE_LEVEL, attribute_findings, diff_blocks, offset_findings, splice_findings, split_blocks
+from .model_swap import ModelSlot
+from .single_flight import SingleFlight
+from .metrics_rollup import MetricsRollup
+from .minify import MinifiedCode, minify_code
+from .sessions import GenerationSession, SessionStore
+from .search_index import SearchIndex
+from .history_archive import HistoryArchive, review_row, rows_table
+from .degradation import FALLBACK_MODEL, FULL, MODES, STATIC, DegradationController
+from .static_analysis import static_review
+from .cancellation import ReviewCancelled, check_cancelled, current_token, is_cancelled
+from .memory_watchdog import MemoryWatchdog, kv_bytes_per_token
+from .system_memory import memory_limit_bytes
 
 logger = logging.getLogger(__name__)
 
+REVIEW_SECTIONS = ['Issues', 'Improvements', 'Best Practices', 'Security']
+
 class CodeReview:
-    def __init__(self, code: str, language: str, review_id: str):
+    def __init__(self, code: str, language: str, review_id: str, prompt_version: str = "default"):
         self.code = code
         self.language = language
         self.review_id = review_id
+        self.prompt_version = prompt_version
         self.timestamp = datetime.now()
         self.suggestions: List[Dict] = []
         self.metrics: Dict = {}
+        self.fingerprint: Optional[str] = None
+        self.reused_from: Optional[str] = None
+        self.base_review_id: Optional[str] = None
+        self.block_findings: Dict[str, List[Dict]] = {}
+        # Which degradation mode produced the suggestions
+        self.mode: str = FULL
 
 class CodeReviewer:
-    def __init__(self, model_manager: ModelManager):
-        self.model_manager = model_manager
+    def __init__(self, model_manager: ModelManager, fallback_model: Optional[ModelManager] = None):
+        # Requests lease the model from the slot so it can be hot-swapped
+        self.model_slot = ModelSlot(model_manager)
+        # Smaller model used while degraded; without one that mode is skipped
+        self.fallback_model = fallback_model
+        self.degradation = DegradationController(
+            Config.DEGRADATION_SLO_SECONDS,
+            percentile=Config.DEGRADATION_PERCENTILE,
+            window=Config.DEGRADATION_WINDOW,
+            min_samples=Config.DEGRADATION_MIN_SAMPLES,
+            recovery_ratio=Config.DEGRADATION_RECOVERY_RATIO,
+            cooldown_seconds=Config.DEGRADATION_COOLDOWN_SECONDS,
+            modes=[mode for mode in MODES if mode != FALLBACK_MODEL or fallback_model is not None],
+            enabled=Config.ENABLE_DEGRADATION,
+            load_window_seconds=Config.DEGRADATION_LOAD_WINDOW_SECONDS,
+            load_recovery_ratio=Config.DEGRADATION_LOAD_RECOVERY_RATIO
+        )
         self.review_history: List[CodeReview] = []
+        self._fingerprint_index: Dict[str, CodeReview] = {}
+        self._reviews_by_id: Dict[str, CodeReview] = {}
+        self._history_lock = threading.Lock()
+        # Full-text index over the suggestions of reviews in history
+        self.search_index = SearchIndex()
+        # Concurrent identical requests share one generation
+        self._flights = SingleFlight()
+        self._listeners: List[Callable[[CodeReview], None]] = []
+        # Latency/throughput rollups outlive history eviction
+        self.metrics_rollup = MetricsRollup(Config.LATENCY_SKETCH_ACCURACY, Config.METRICS_MAX_LANGUAGES)
+        # Generation contexts of recent reviews, continued by follow-up questions
+        self.sessions = SessionStore(Config.SESSION_MAX_BYTES, Config.SESSION_MAX_COUNT, Config.SESSION_TTL_SECONDS)
+        # Reviews evicted from history are kept on disk for analytics
+        self.archive = (HistoryArchive(Config.HISTORY_ARCHIVE_DIR, Config.HISTORY_ARCHIVE_FLUSH_ROWS,
+                                       Config.HISTORY_ARCHIVE_COMPACT_FILES)
+                        if Config.ENABLE_HISTORY_ARCHIVE else None)
+        # Inference concurrency and batch tokens shrink under memory pressure
+        self.memory_watchdog = MemoryWatchdog(
+            Config.MEMORY_CEILING_BYTES or memory_limit_bytes(),
+            max_concurrency=Config.MAX_INFERENCE_CONCURRENCY,
+            max_batch_tokens=Config.MAX_BATCH_TOKENS,
+            min_batch_tokens=Config.MIN_BATCH_TOKENS,
+            high_watermark=Config.MEMORY_HIGH_WATERMARK,
+            low_watermark=Config.MEMORY_LOW_WATERMARK,
+            interval=Config.MEMORY_CHECK_INTERVAL,
+            enabled=Config.ENABLE_MEMORY_WATCHDOG,
+            token_bytes=lambda: kv_bytes_per_token(getattr(self.model_manager, 'model', None)),
+            session_bytes=lambda: self.sessions.describe()['bytes']
+        )
         
-    def _create_review_prompt(self, code: str, language: str) -> str:
-        """Create a structured prompt for code review."""
-        return f"""As a code reviewer, analyze the following {language} code and provide specific suggestions in exactly these sections:
-- Issues: (list critical problems)
-- Improvements: (list suggested enhancements)
-- Best Practices: (list recommendations)
-- Security: (list security concerns)
-
-Code to review:
-```{language}
-{code}
-```
-
-Provide your review in exactly these sections: Issues, Improvements, Best Practices, Security.
-Each section should contain a list of specific points.
-"""
-
-    def review_code(self, code: str, language: str, review_id: str) -> CodeReview:
-        """Perform code review using the LLM."""
+    def _create_review_prompt(self, code: str, language: str, prompt_version: str = "default",
+                              tokenizer=None) -> str:
+        """Create a structured prompt for code review from the registered template.
+
+        With a tokenizer the prompt carries its token IDs, built from the
+        template's pre-tokenized static text.
+        """
+        return PROMPT_REGISTRY.get(prompt_version).render_encoded(code, language, tokenizer)
+
+    @property
+    def model_manager(self) -> ModelManager:
+        """The model new reviews will use."""
+        return self.model_slot.current
+
+    @staticmethod
+    def _cache_key(review: CodeReview) -> str:
+        """Key for the fingerprint index; reviews are only reused for the same prompt."""
+        return f"{review.prompt_version}:{review.fingerprint}"
+
+    @staticmethod
+    def _flight_key(code: str, language: str, prompt_version: str, base_review_id: Optional[str]) -> str:
+        """Key identifying requests whose generations can be shared."""
+        digest = hashlib.sha256()
+        for part in (language.lower(), prompt_version, base_review_id or "", code):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def review_code(self, code: str, language: str, review_id: str,
+                    base_review_id: Optional[str] = None, prompt_version: str = "default") -> CodeReview:
+        """Perform code review using the LLM.
+
+        When base_review_id is given, only the blocks that changed since that
+        review are sent to the model and the rest of its findings are kept.
+        Raises ReviewCancelled when the request's cancellation token fires.
+        """
         try:
+            check_cancelled()
             start_time = datetime.now()
             
-            # Create review instance
-            review = CodeReview(code, language, review_id)
+            # Forked sections use their own prompt, so the review is tagged and cached under it
+            if Config.PARALLEL_SECTIONS:
+                prompt_version = FORKED_PROMPT_VERSION
             
-            # Generate review prompt
-            prompt = self._create_review_prompt(code, language)
+            # Create review instance
+            review = CodeReview(code, language, review_id, prompt_version)
             
-            # Get model response
-            response = self.model_manager.generate_text(
-                prompt,
-                max_new_tokens=Config.MAX_OUTPUT_LENGTH
-            )
+            # Reuse a prior review of semantically identical code
+            if Config.ENABLE_FINGERPRINT_CACHE:
+                review.fingerprint = code_fingerprint(code, language)
+                previous = self._fingerprint_index.get(self._cache_key(review))
+                if previous is not None:
+                    return self._reuse_review(review, previous, start_time)
             
-            # Parse and structure the response
-            sections = self._parse_review_response(response)
+            # Identical requests already in flight share that generation
+            key = self._flight_key(code, language, prompt_version, base_review_id)
+            outcome, shared = self._flights.do(key, lambda: self._run_review(review, base_review_id), current_token())
+            if shared:
+                outcome = copy.deepcopy(outcome)
             
             # Store suggestions
-            review.suggestions = sections
+            review.suggestions = outcome['suggestions']
+            review.block_findings = outcome['block_findings']
+            review.base_review_id = outcome['base_review_id']
+            review.mode = outcome['mode']
             
             # Calculate metrics
             end_time = datetime.now()
             review.metrics = {
                 'response_time': (end_time - start_time).total_seconds(),
                 'code_length': len(code),
-                'suggestion_count': sum(len(section['items']) for section in sections)
+                'suggestion_count': sum(len(section['items']) for section in review.suggestions)
             }
+            review.metrics.update(outcome['metrics'])
+            if shared:
+                review.metrics['coalesced'] = True
+            self.degradation.observe(review.metrics['response_time'])
             
             # Store review in history
             self._add_to_history(review)
             
             return review
             
+        except ReviewCancelled as e:
+            logger.info(f"Review {review_id} abandoned: {e.reason}")
+            raise
         except Exception as e:
             logger.error(f"Error during code review: {str(e)}")
             raise
 
+    def _run_review(self, review: CodeReview, base_review_id: Optional[str]) -> Dict:
+        """Generate the suggestions for a review without modifying it."""
+        self.degradation.arrive()
+        mode = self.degradation.mode
+        outcome = {'block_findings': {}, 'base_review_id': None, 'metrics': {}, 'mode': mode}
+        if mode == STATIC:
+            outcome['suggestions'] = self._static_sections(review.code, review.language)
+            return outcome
+        max_new_tokens = self._output_budget(mode)
+        with self._model_for(mode, self._token_estimate(review.code, max_new_tokens)) as model_manager:
+            # The deadline may have passed while waiting for the model
+            check_cancelled()
+            if base_review_id:
+                base = self.get_review(base_review_id)
+                if base is None:
+                    raise ValueError(f"Unknown base review: {base_review_id}")
+                outcome['suggestions'], outcome['block_findings'], outcome['metrics'] = \
+                    self._review_incremental(review, base, model_manager, max_new_tokens)
+                outcome['base_review_id'] = base.review_id
+            else:
+                outcome['suggestions'], tokens_saved = self._generate_suggestions(
+                    review.code, review.language, review.prompt_version, model_manager,
+                    session_key=review.review_id, max_new_tokens=max_new_tokens
+                )
+                if Config.ENABLE_MINIFICATION:
+                    outcome['metrics']['tokens_saved'] = tokens_saved
+        # Generation stopped early; its truncated output must not be stored
+        check_cancelled()
+        return outcome
+
+    @contextmanager
+    def _model_for(self, mode: str, tokens: int = 0):
+        """Lease the model that generates in a degradation mode, once memory allows tokens more."""
+        with self.memory_watchdog.admit(tokens):
+            if mode == FALLBACK_MODEL:
+                yield self.fallback_model
+            else:
+                with self.model_slot.lease() as model_manager:
+                    yield model_manager
+
+    def _token_estimate(self, code: str, max_new_tokens: int) -> int:
+        """Prompt plus output tokens a review of code keeps in the KV cache."""
+        tokenizer = getattr(self.model_manager, 'tokenizer', None)
+        branches = len(REVIEW_SECTIONS) if Config.PARALLEL_SECTIONS else 1
+        return count_tokens(tokenizer, code) + branches * max_new_tokens
+
+    @staticmethod
+    def _output_budget(mode: str) -> int:
+        """Generation length for a degradation mode."""
+        return Config.MAX_OUTPUT_LENGTH if mode == FULL else Config.DEGRADED_MAX_OUTPUT_LENGTH
+
+    @staticmethod
+    def _static_sections(code: str, language: str) -> List[Dict]:
+        """Static analysis findings in review sections."""
+        findings = static_review(code, language)
+        return [{'type': section_type, 'items': findings[section_type]} for section_type in REVIEW_SECTIONS]
+
+    def _minify(self, code: str, language: str, model_manager: ModelManager):
+        """Minify code for prompting; returns (minified, tokens saved) or (None, 0) when disabled."""
+        if not Config.ENABLE_MINIFICATION:
+            return None, 0
+        minified = minify_code(code, language)
+        tokenizer = getattr(model_manager, 'tokenizer', None)
+        tokens_saved = count_tokens(tokenizer, code) - count_tokens(tokenizer, minified.code)
+        return minified, tokens_saved
+
+    @staticmethod
+    def _remap(sections: List[Dict], minified: Optional[MinifiedCode]) -> List[Dict]:
+        """Map line numbers in findings on minified code back to the submitted code."""
+        return minified.remap_findings(sections) if minified is not None else sections
+
+    def _generate_suggestions(self, code: str, language: str, prompt_version: str,
+                              model_manager: ModelManager, session_key: Optional[str] = None,
+                              max_new_tokens: Optional[int] = None):
+        """Run the model over the code and parse its review into sections.
+
+        With a session_key, the generation context is kept for follow-up
+        questions. Returns (sections, prompt tokens saved by minification).
+        """
+        max_new_tokens = max_new_tokens or Config.MAX_OUTPUT_LENGTH
+        minified, tokens_saved = self._minify(code, language, model_manager)
+        
+        if Config.PARALLEL_SECTIONS:
+            sections = self._generate_sections_forked(minified.code if minified else code, language, model_manager,
+                                                      min(Config.SECTION_MAX_NEW_TOKENS, max_new_tokens))
+            return self._remap(sections, minified), tokens_saved
+        
+        # Generate review prompt
+        prompt = self._create_review_prompt(minified.code if minified else code, language, prompt_version,
+                                            getattr(model_manager, 'tokenizer', None))
+        
+        # Get model response
+        if session_key is not None and Config.ENABLE_REVIEW_SESSIONS:
+            try:
+                response, session = model_manager.generate_session(prompt, max_new_tokens=max_new_tokens)
+                if not is_cancelled():
+                    self.sessions.put(session_key, session)
+            except Exception as e:
+                logger.error(f"Error generating text: {str(e)}")
+                response = DEFAULT_RESPONSE
+        else:
+            response = model_manager.generate_text(
+                prompt,
+                max_new_tokens=max_new_tokens
+            )
+        
+        # Parse and structure the response
+        return self._remap(self._parse_review_response(response), minified), tokens_saved
+
+    def _generate_sections_forked(self, code: str, language: str, model_manager: ModelManager,
+                                  max_new_tokens: int) -> List[Dict]:
+        """Generate every section in parallel from one prefilled copy of the code.
+
+        The shared prefix is forked into one continuation per section and the
+        branches are decoded as a single batch, so latency tracks the longest
+        section rather than the sum of all of them.
+        """
+        prefix = SECTION_PREFIX_TEMPLATE.format(language=language, code=code)
+        responses = model_manager.generate_forked(
+            prefix,
+            [SECTION_CONTINUATIONS[section_type] for section_type in REVIEW_SECTIONS],
+            max_new_tokens=max_new_tokens
+        )
+        sections = []
+        for section_type, response in zip(REVIEW_SECTIONS, responses):
+            # Each branch starts inside its own section; items under other headings are dropped
+            items = [
+                item
+                for section in self._split_sections(f"- {section_type}:\n{response}")
+                if section['type'] == section_type
+                for item in section['items']
+            ]
+            sections.append({'type': section_type, 'items': items})
+        return sections
+
+    def _review_incremental(self, review: CodeReview, base: CodeReview, model_manager: ModelManager,
+                            max_new_tokens: Optional[int] = None):
+        """Re-review only the blocks that changed since the base review."""
+        if base.language.lower() != review.language.lower():
+            raise ValueError(f"Base review {base.review_id} is for {base.language}, not {review.language}")
+        
+        base_blocks = split_blocks(base.code, base.language)
+        blocks = split_blocks(review.code, review.language)
+        diff = diff_blocks(base_blocks, blocks)
+        
+        base_findings = base.block_findings or attribute_findings(base.suggestions, base_blocks)
+        
+        # Findings on unchanged blocks carry over, their line references following
+        # the block if it moved. File-level findings may refer to any block, so
+        # they are dropped once a block changed or was removed.
+        edited = bool(diff['changed'] or diff['removed'])
+        base_starts = {block['hash']: block['start'] for block in reversed(base_blocks)}
+        unchanged = {block['hash']: block for block in reversed(diff['unchanged'])}
+        block_findings = {}
+        for key, sections in base_findings.items():
+            if key == FILE_LEVEL and not edited:
+                block_findings[key] = sections
+            elif key in unchanged:
+                block_findings[key] = offset_findings(sections, unchanged[key], base_starts[key])
+        tokens_saved = 0
+        for block in diff['changed']:
+            logger.info(f"Re-reviewing block {block['name']} of review {review.review_id}")
+            sections, saved = self._generate_suggestions(
+                block['code'], review.language, review.prompt_version, model_manager,
+                max_new_tokens=max_new_tokens
+            )
+            # The block was reviewed alone, so its line 1 is its start line in the file
+            block_findings[block['hash']] = offset_findings(sections, block)
+            tokens_saved += saved
+        
+        keep = [FILE_LEVEL] + [block['hash'] for block in blocks]
+        sections = splice_findings(REVIEW_SECTIONS, block_findings, keep)
+        metrics = {
+            'incremental': True,
+            'changed_blocks': len(diff['changed']),
+            'unchanged_blocks': len(diff['unchanged']),
+            'removed_blocks': len(diff['removed'])
+        }
+        if Config.ENABLE_MINIFICATION:
+            metrics['tokens_saved'] = tokens_saved
+        return sections, block_findings, metrics
+
+    def review_batch(self, requests: List[Dict]) -> List[CodeReview]:
+        """Review several submissions with one batched model call.
+
+        Each request is a dict with code, language and review_id keys and an
+        optional prompt_version.
+        """
+        try:
+            check_cancelled()
+            start_time = datetime.now()
+            reviews = [
+                CodeReview(r['code'], r['language'], r['review_id'], r.get('prompt_version', 'default'))
+                for r in requests
+            ]
+            
+            pending = []
+            for review in reviews:
+                if Config.ENABLE_FINGERPRINT_CACHE:
+                    review.fingerprint = code_fingerprint(review.code, review.language)
+                    previous = self._fingerprint_index.get(self._cache_key(review))
+                    if previous is not None:
+                        self._reuse_review(review, previous, start_time)
+                        continue
+                pending.append(review)
+            
+            self.degradation.arrive(len(pending))
+            mode = self.degradation.mode
+            if pending and mode == STATIC:
+                for review in pending:
+                    review.suggestions = self._static_sections(review.code, review.language)
+                prepared = [(None, 0)] * len(pending)
+            elif pending:
+                max_new_tokens = self._output_budget(mode)
+                estimates = [self._token_estimate(r.code, max_new_tokens) for r in pending]
+                prepared = [None] * len(pending)
+                # Split so no single generate_batch call exceeds the batch token limit
+                for group in self.memory_watchdog.split_batch(estimates):
+                    with self._model_for(mode, sum(estimates[i] for i in group)) as model_manager:
+                        check_cancelled()
+                        for i in group:
+                            prepared[i] = self._minify(pending[i].code, pending[i].language, model_manager)
+                        prompts = [
+                            self._create_review_prompt(prepared[i][0].code if prepared[i][0] else pending[i].code,
+                                                       pending[i].language, pending[i].prompt_version,
+                                                       getattr(model_manager, 'tokenizer', None))
+                            for i in group
+                        ]
+                        responses = model_manager.generate_batch(
+                            prompts,
+                            max_new_tokens=max_new_tokens
+                        )
+                    check_cancelled()
+                    for i, response in zip(group, responses):
+                        pending[i].suggestions = self._remap(self._parse_review_response(response), prepared[i][0])
+            
+            if pending:
+                end_time = datetime.now()
+                for review, (minified, tokens_saved) in zip(pending, prepared):
+                    review.mode = mode
+                    review.metrics = {
+                        'response_time': (end_time - start_time).total_seconds(),
+                        'code_length': len(review.code),
+                        'suggestion_count': sum(len(section['items']) for section in review.suggestions),
+                        'batch_size': len(pending)
+                    }
+                    if minified is not None:
+                        review.metrics['tokens_saved'] = tokens_saved
+                    self.degradation.observe(review.metrics['response_time'])
+                    self._add_to_history(review)
+            
+            return reviews
+            
+        except ReviewCancelled as e:
+            logger.info(f"Batch of {len(requests)} reviews abandoned: {e.reason}")
+            raise
+        except Exception as e:
+            logger.error(f"Error during batch code review: {str(e)}")
+            raise
+
+    def _reuse_review(self, review: CodeReview, previous: CodeReview, start_time: datetime) -> CodeReview:
+        """Fill a review with the suggestions of a previous review of the same fingerprint."""
+        logger.info(f"Reusing review {previous.review_id} for {review.review_id}")
+        review.suggestions = copy.deepcopy(previous.suggestions)
+        review.reused_from = previous.reused_from or previous.review_id
+        review.block_findings = previous.block_findings
+        review.mode = previous.mode
+        review.metrics = {
+            'response_time': (datetime.now() - start_time).total_seconds(),
+            'code_length': len(review.code),
+            'suggestion_count': sum(len(section['items']) for section in review.suggestions),
+            'reused': True
+        }
+        self._add_to_history(review)
+        return review
+
+    def follow_up(self, review_id: str, question: str) -> Dict:
+        """Answer a question about a review, continuing its generation context.
+
+        The review's cached session is reused when it is still stored and was
+        computed by the current model; otherwise the context is rebuilt from
+        the review prompt and its findings. Raises KeyError for unknown reviews.
+        """
+        review = self.get_review(review_id)
+        if review is None:
+            raise KeyError(f"Unknown review: {review_id}")
+        
+        start_time = datetime.now()
+        tokens = self._token_estimate(review.code + question, Config.MAX_OUTPUT_LENGTH)
+        with self.memory_watchdog.admit(tokens), self.model_slot.lease() as model_manager:
+            prompt = FOLLOWUP_TEMPLATE.format(question=question)
+            session = self.sessions.take(review_id)
+            if session is not None and self._session_tokens(session, model_manager) + count_tokens(
+                    model_manager.tokenizer, prompt) > Config.MAX_INPUT_LENGTH:
+                # Earlier follow-ups are dropped so the code and findings still fit
+                logger.info(f"Session for review {review_id} exceeds MAX_INPUT_LENGTH; rebuilding it")
+                session = None
+            if session is None:
+                logger.info(f"No session for review {review_id}; recomputing its context")
+                session = GenerationSession(self._review_context(review))
+            answer, session = model_manager.generate_session(
+                prompt,
+                session,
+                max_new_tokens=Config.MAX_OUTPUT_LENGTH
+            )
+        check_cancelled()
+        self.sessions.put(review_id, session)
+        
+        return {
+            'review_id': review_id,
+            'question': question,
+            'answer': answer.strip(),
+            'session_reused': session.reused_cache,
+            'metrics': {'response_time': (datetime.now() - start_time).total_seconds()}
+        }
+
+    @staticmethod
+    def _session_tokens(session: GenerationSession, model_manager: ModelManager) -> int:
+        """Tokens of context a session already holds."""
+        if session.input_ids is not None:
+            return session.input_ids.shape[1]
+        return count_tokens(model_manager.tokenizer, session.text)
+
+    def _review_context(self, review: CodeReview) -> str:
+        """Rebuild the text a review was generated from, followed by its findings."""
+        code = minify_code(review.code, review.language).code if Config.ENABLE_MINIFICATION else review.code
+        if review.prompt_version == FORKED_PROMPT_VERSION:
+            prompt = SECTION_PREFIX_TEMPLATE.format(language=review.language, code=code)
+        else:
+            prompt = self._create_review_prompt(code, review.language, review.prompt_version)
+        findings = '\n\n'.join(
+            '\n'.join([f"- {section['type']}:"] + [f"- {item}" for item in section['items']])
+            for section in review.suggestions
+        )
+        return prompt + findings
+
     def _parse_review_response(self, response: str) -> List[Dict]:
         """Parse the LLM response into structured sections."""
+        sections = self._split_sections(response)
+        
+        # Ensure all required sections exist
+        result = []
+        for section_type in REVIEW_SECTIONS:
+            found_section = next((s for s in sections if s['type'] == section_type), None)
+            if found_section:
+                result.append(found_section)
+            else:
+                result.append({
+                    'type': section_type,
+                    'items': []
+                })
+        
+        return result
+
+    @staticmethod
+    def _split_sections(response: str) -> List[Dict]:
+        """Split a response into its "- Heading:" sections in order, repeats included."""
         sections = []
         current_section = None
         
@@ -107,47 +568,70 @@ Each section should contain a list of specific points.
                 if item:  # Only add non-empty items
                     current_section['items'].append(item)
         
-        # Ensure all required sections exist
-        required_sections = ['Issues', 'Improvements', 'Best Practices', 'Security']
-        result = []
-        for section_type in required_sections:
-            found_section = next((s for s in sections if s['type'] == section_type), None)
-            if found_section:
-                result.append(found_section)
-            else:
-                result.append({
-                    'type': section_type,
-                    'items': []
-                })
-        
-        return result
+        return sections
 
     def _add_to_history(self, review: CodeReview):
         """Add review to history and maintain size limit."""
-        self.review_history.append(review)
-        if len(self.review_history) > Config.MAX_HISTORY_ITEMS:
-            self.review_history.pop(0)
-
-    def get_review_metrics(self) -> Dict:
-        """Calculate aggregate metrics from review history."""
-        if not self.review_history:
-            return {
-                'total_reviews': 0,
-                'avg_response_time': 0.0,
-                'avg_suggestions': 0.0,
-                'reviews_today': 0
-            }
-            
-        total_reviews = len(self.review_history)
-        avg_response_time = sum(r.metrics['response_time'] for r in self.review_history) / total_reviews
-        avg_suggestions = sum(r.metrics['suggestion_count'] for r in self.review_history) / total_reviews
-        
-        return {
-            'total_reviews': total_reviews,
-            'avg_response_time': avg_response_time,
-            'avg_suggestions': avg_suggestions,
-            'reviews_today': sum(1 for r in self.review_history if r.timestamp.date() == datetime.now().date())
-        }
+        evicted = None
+        with self._history_lock:
+            self.review_history.append(review)
+            self._reviews_by_id[review.review_id] = review
+            self.search_index.add(review)
+            # Degraded reviews are not reused once the load has passed
+            if review.fingerprint and review.mode == FULL:
+                self._fingerprint_index[self._cache_key(review)] = review
+            if len(self.review_history) > Config.MAX_HISTORY_ITEMS:
+                evicted = self.review_history.pop(0)
+                self._reviews_by_id.pop(evicted.review_id, None)
+                self.search_index.remove(evicted.review_id)
+                if evicted.fingerprint and self._fingerprint_index.get(self._cache_key(evicted)) is evicted:
+                    del self._fingerprint_index[self._cache_key(evicted)]
+
+        if evicted is not None and self.archive is not None:
+            try:
+                self.archive.append(evicted)
+            except Exception as e:
+                logger.error(f"Error archiving review {evicted.review_id}: {str(e)}")
+
+        self.metrics_rollup.record(
+            review.language,
+            review.metrics.get('response_time', 0.0),
+            review.metrics.get('suggestion_count', 0),
+            review.metrics.get('tokens_saved', 0)
+        )
+        for listener in self._listeners:
+            try:
+                listener(review)
+            except Exception as e:
+                logger.error(f"Error in history listener: {str(e)}")
+
+    def add_listener(self, listener: Callable[[CodeReview], None]):
+        """Call listener with every review added to history."""
+        self._listeners.append(listener)
+
+    def get_review_metrics(self, window: str = 'all', language: Optional[str] = None) -> Dict:
+        """Aggregate metrics over a window (see metrics_rollup.WINDOWS), optionally for one language."""
+        return self.metrics_rollup.summary(window, language)
+
+    def search_history(self, query: str, language: Optional[str] = None, section: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       page: int = 1, page_size: int = 20) -> Dict:
+        """Reviews in history whose suggestions match query, ranked by BM25."""
+        total, results = self.search_index.search(query, language, section, since, until,
+                                                  offset=(page - 1) * page_size, limit=page_size)
+        return {'query': query, 'total': total, 'page': page, 'page_size': page_size, 'results': results}
+
+    def history_table(self, since: Optional[datetime] = None, until: Optional[datetime] = None):
+        """Archived and in-memory reviews in [since, until) as an Arrow table for analytics."""
+        with self._history_lock:
+            live = [review_row(review) for review in self.review_history]
+        if self.archive is None:
+            return rows_table(live, since, until)
+        return self.archive.table(since, until, extra_rows=live)
+
+    def get_review(self, review_id: str) -> Optional[CodeReview]:
+        """Look up a review in history by its ID."""
+        return self._reviews_by_id.get(review_id)
 
     def get_review_history(self, limit: Optional[int] = None) -> List[CodeReview]:
         """Get review history with optional limit."""
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Review modes from most to least expensive
+FULL = 'full'
+REDUCED = 'reduced'              # shorter output budget
+FALLBACK_MODEL = 'fallback_model'  # smaller model, shorter output budget
+STATIC = 'static'                # static analysis only, no model
+MODES = [FULL, REDUCED, FALLBACK_MODEL, STATIC]
+
+
+class DegradationController:
+    """Steps reviews down to cheaper modes while latency breaks the SLO.
+
+    The controller keeps the latencies of recent generated reviews. Once it has
+    min_samples of them, it compares their percentile with slo_seconds. Above
+    the SLO it moves one mode down. Below recovery_ratio * slo_seconds it moves
+    one mode back up. Samples are cleared after each step so the next decision
+    judges the new mode, and steps are at least cooldown_seconds apart so a
+    single slow burst cannot fall straight through to static analysis.
+
+    Latency alone cannot tell when it is safe to step up, since a cheaper mode
+    is fast under the same load that overwhelmed the mode above it. Each step
+    down therefore records the arrival rate of reviews needing generation
+    (a load signal independent of the mode). Stepping back up also requires
+    that rate to fall below load_recovery_ratio times the recorded rate.
+    """
+
+    def __init__(self, slo_seconds: float, percentile: float = 0.95, window: int = 50,
+                 min_samples: int = 10, recovery_ratio: float = 0.5, cooldown_seconds: float = 30.0,
+                 modes: Optional[List[str]] = None, enabled: bool = True, load_window_seconds: float = 60.0,
+                 load_recovery_ratio: float = 0.8, clock: Callable[[], float] = time.monotonic):
+        self.slo_seconds = slo_seconds
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.recovery_ratio = recovery_ratio
+        self.cooldown_seconds = cooldown_seconds
+        self.modes = modes or list(MODES)
+        self.enabled = enabled
+        self.load_window_seconds = load_window_seconds
+        self.load_recovery_ratio = load_recovery_ratio
+        self.transitions = 0
+        self._level = 0
+        self._samples: deque = deque(maxlen=window)
+        self._arrivals: deque = deque()
+        # Arrival rate at each step down, popped when stepping back up
+        self._overload_rates: List[float] = []
+        self._last_change = float('-inf')
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        """Mode new reviews should run in."""
+        return self.modes[self._level]
+
+    def arrive(self, count: int = 1):
+        """Record reviews starting generation, whatever mode they run in."""
+        if not self.enabled:
+            return
+        with self._lock:
+            now = self._clock()
+            self._arrivals.extend([now] * count)
+            self._prune_arrivals(now)
+
+    def _prune_arrivals(self, now: float):
+        while self._arrivals and now - self._arrivals[0] > self.load_window_seconds:
+            self._arrivals.popleft()
+
+    def _arrival_rate(self, now: float) -> float:
+        self._prune_arrivals(now)
+        return len(self._arrivals) / self.load_window_seconds
+
+    def _load_recovered(self, now: float) -> bool:
+        if not self._overload_rates:
+            return True
+        return self._arrival_rate(now) <= self._overload_rates[-1] * self.load_recovery_ratio
+
+    def observe(self, latency: float) -> str:
+        """Record the latency of a review and return the (possibly new) mode."""
+        if not self.enabled:
+            return self.mode
+        with self._lock:
+            self._samples.append(latency)
+            if len(self._samples) < self.min_samples:
+                return self.mode
+            now = self._clock()
+            if now - self._last_change < self.cooldown_seconds:
+                return self.mode
+            observed = self._observed()
+            if observed > self.slo_seconds and self._level < len(self.modes) - 1:
+                self._overload_rates.append(self._arrival_rate(now))
+                self._step(1, observed, now)
+            elif (observed < self.slo_seconds * self.recovery_ratio and self._level > 0
+                  and self._load_recovered(now)):
+                self._overload_rates.pop()
+                self._step(-1, observed, now)
+            return self.mode
+
+    def _observed(self) -> float:
+        ordered = sorted(self._samples)
+        return ordered[min(int(self.percentile * len(ordered)), len(ordered) - 1)]
+
+    def _step(self, direction: int, observed: float, now: float):
+        previous = self.mode
+        self._level += direction
+        self._samples.clear()
+        self._last_change = now
+        self.transitions += 1
+        logger.warning(
+            f"Review latency p{int(self.percentile * 100)} {observed:.2f}s against SLO {self.slo_seconds:.2f}s: "
+            f"switching from {previous} to {self.mode} mode"
+        )
+
+    def describe(self) -> Dict:
+        """Current mode, and the latency and load it is judged on."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'mode': self.mode,
+                'modes': list(self.modes),
+                'slo_seconds': self.slo_seconds,
+                'observed_latency': self._observed() if self._samples else None,
+                'samples': len(self._samples),
+                'arrival_rate': self._arrival_rate(self._clock()),
+                'recovery_arrival_rate': (self._overload_rates[-1] * self.load_recovery_ratio
+                                          if self._overload_rates else None),
+                'transitions': self.transitions
+            }
@@ -0,0 +1,79 @@
+import ast
+import hashlib
+import io
+import logging
+import re
+import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Languages whose comments use C-style `//` and `/* */` markers
+C_STYLE_LANGUAGES = {
+    'c', 'cpp', 'c++', 'csharp', 'c#', 'java', 'javascript', 'js', 'typescript', 'ts',
+    'go', 'rust', 'kotlin', 'swift', 'scala', 'php', 'dart'
+}
+
+# Languages whose comments start with `#`
+HASH_COMMENT_LANGUAGES = {
+    'ruby', 'shell', 'bash', 'sh', 'perl', 'r', 'yaml', 'toml', 'powershell'
+}
+
+STRING_REGEX = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`'
+C_COMMENT_REGEX = r'//[^\n]*|/\*.*?\*/'
+HASH_COMMENT_REGEX = r'#[^\n]*'
+_TOKEN = r'[A-Za-z_$][\w$]*|\d[\w.]*|\S'
+
+_C_STYLE_PATTERN = re.compile(f'({C_COMMENT_REGEX})|({STRING_REGEX}|{_TOKEN})', re.DOTALL)
+_HASH_PATTERN = re.compile(f'({HASH_COMMENT_REGEX})|({STRING_REGEX}|{_TOKEN})', re.DOTALL)
+_PLAIN_PATTERN = re.compile(f'()({STRING_REGEX}|{_TOKEN})', re.DOTALL)
+
+
+def _normalize_python(code: str) -> str:
+    """Normalize Python code to its AST, falling back to the token stream."""
+    try:
+        tree = ast.parse(code)
+        return ast.dump(tree, annotate_fields=False, include_attributes=False)
+    except (SyntaxError, ValueError):
+        pass
+
+    # Code that does not parse is still tokenized so that comments and
+    # whitespace differences do not change the fingerprint.
+    try:
+        skipped = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.ENCODING,
+                   tokenize.ENDMARKER}
+        tokens = tokenize.generate_tokens(io.StringIO(code).readline)
+        return ' '.join(
+            tok.string or tokenize.tok_name[tok.type]
+            for tok in tokens if tok.type not in skipped
+        )
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return _normalize_generic(code, 'python')
+
+
+def _normalize_generic(code: str, language: str) -> str:
+    """Normalize code to a whitespace-separated token stream without comments."""
+    if language in C_STYLE_LANGUAGES:
+        pattern = _C_STYLE_PATTERN
+    elif language in HASH_COMMENT_LANGUAGES or language == 'python':
+        pattern = _HASH_PATTERN
+    else:
+        pattern = _PLAIN_PATTERN
+    return ' '.join(match.group(2) for match in pattern.finditer(code) if match.group(2))
+
+
+def normalize_code(code: str, language: str) -> str:
+    """Strip comments and formatting from code, keeping only its token structure."""
+    language = language.strip().lower()
+    if language in ('python', 'py'):
+        return _normalize_python(code)
+    return _normalize_generic(code, language)
+
+
+def code_fingerprint(code: str, language: str) -> str:
+    """Return a stable hash of the normalized code for near-duplicate detection."""
+    normalized = normalize_code(code, language)
+    digest = hashlib.sha256()
+    digest.update(language.strip().lower().encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalized.encode('utf-8'))
+    return digest.hexdigest()
@@ -0,0 +1,476 @@
+"""
+Cache-affinity gateway in front of several review replicas.
+
+    python -m src.gateway --replica http://10.0.0.5:8000 --replica http://10.0.0.6:8000
+    python -m src.gateway --spawn-replicas 3    # local replicas on ports 8001-8003
+
+Reviews are routed by a consistent hash of their code fingerprint, so repeated
+and semantically identical submissions reach the replica whose fingerprint
+cache, sessions and history already hold them. Incremental reviews and
+follow-ups go to the replica that produced the review they refer to. When a
+replica fails its health check its keys move to the next replicas on the ring
+and return when it recovers; adding a replica moves only about 1/N of keys.
+Metrics are merged from the replicas' latency sketches and history is merged
+by timestamp.
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from .config import Config
+from .fingerprint import code_fingerprint
+from .metrics_rollup import merge_exports
+from .security import require_admin
+
+logger = logging.getLogger(__name__)
+
+# Replica responses that mean "try another replica"
+FAILOVER_STATUS = {502, 503}
+# Request headers passed through to replicas
+FORWARDED_HEADERS = ('x-request-timeout', 'x-admin-token')
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+
+    def __init__(self, nodes: Optional[List[str]] = None, vnodes: int = 64):
+        self.vnodes = vnodes
+        self._hashes: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes or []:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.sha1(value.encode('utf-8')).digest()[:8], 'big')
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._owners))
+
+    def add(self, node: str):
+        if node in self._owners:
+            return
+        for i in range(self.vnodes):
+            point = self._hash(f"{node}#{i}")
+            index = bisect.bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        kept = [(h, owner) for h, owner in zip(self._hashes, self._owners) if owner != node]
+        self._hashes = [h for h, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def walk(self, key: str) -> Iterator[str]:
+        """Distinct nodes in ring order starting at key's position."""
+        if not self._hashes:
+            return
+        start = bisect.bisect(self._hashes, self._hash(key))
+        seen = set()
+        for offset in range(len(self._hashes)):
+            owner = self._owners[(start + offset) % len(self._hashes)]
+            if owner not in seen:
+                seen.add(owner)
+                yield owner
+
+
+def routing_key(code: str, language: str, prompt_version: str = "default") -> str:
+    """Key matching the replicas' fingerprint cache, so equivalent code shares a replica."""
+    return f"{prompt_version or 'default'}:{code_fingerprint(code, language)}"
+
+
+class Gateway:
+    """Replica set, health state and request forwarding."""
+
+    def __init__(self, replicas: List[str], vnodes: int = 64, timeout: float = 300.0,
+                 route_cache_size: int = 100000, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.ring = HashRing(vnodes=vnodes)
+        self.healthy: Dict[str, bool] = {}
+        self.route_cache_size = route_cache_size
+        self.stats: Counter = Counter()
+        # review_id -> replica that holds it, for incremental reviews and follow-ups
+        self._routes: "OrderedDict[str, str]" = OrderedDict()
+        self.client = httpx.AsyncClient(timeout=timeout, transport=transport)
+        for replica in replicas:
+            self.add_replica(replica)
+
+    def add_replica(self, url: str):
+        url = url.rstrip('/')
+        self.ring.add(url)
+        self.healthy.setdefault(url, True)
+        logger.info(f"Added replica {url}")
+
+    def remove_replica(self, url: str) -> bool:
+        url = url.rstrip('/')
+        if url not in self.healthy:
+            return False
+        self.ring.remove(url)
+        del self.healthy[url]
+        logger.info(f"Removed replica {url}")
+        return True
+
+    def candidates(self, key: str) -> List[str]:
+        """Replicas to try for key: healthy ones in ring order, else all of them."""
+        ordered = list(self.ring.walk(key))
+        healthy = [replica for replica in ordered if self.healthy.get(replica)]
+        return healthy or ordered
+
+    def healthy_replicas(self) -> List[str]:
+        return [replica for replica in self.ring.nodes if self.healthy.get(replica)]
+
+    def _mark(self, replica: str, healthy: bool):
+        if replica in self.healthy and self.healthy[replica] != healthy:
+            logger.warning(f"Replica {replica} is now {'healthy' if healthy else 'unhealthy'}")
+            self.healthy[replica] = healthy
+
+    async def check_health(self):
+        """Probe every replica's /health once."""
+        async def probe(replica: str):
+            try:
+                response = await self.client.get(f"{replica}/health", timeout=5.0)
+                self._mark(replica, response.status_code == 200)
+            except httpx.HTTPError:
+                self._mark(replica, False)
+
+        await asyncio.gather(*(probe(replica) for replica in self.ring.nodes))
+
+    def remember(self, review_id: str, replica: str):
+        self._routes[review_id] = replica
+        self._routes.move_to_end(review_id)
+        while len(self._routes) > self.route_cache_size:
+            self._routes.popitem(last=False)
+
+    def replica_for_review(self, review_id: str) -> Optional[str]:
+        return self._routes.get(review_id)
+
+    async def forward(self, method: str, path: str, candidates: List[str], **kwargs) -> Tuple[httpx.Response, str]:
+        """Send to the first candidate that answers, marking failed ones unhealthy."""
+        for attempt, replica in enumerate(candidates):
+            try:
+                response = await self.client.request(method, f"{replica}{path}", **kwargs)
+            except httpx.TransportError as e:
+                logger.warning(f"Replica {replica} failed {method} {path}: {str(e)}")
+                self._mark(replica, False)
+                continue
+            if response.status_code in FAILOVER_STATUS:
+                self._mark(replica, False)
+                continue
+            if attempt:
+                self.stats['failovers'] += 1
+            return response, replica
+        raise HTTPException(status_code=503, detail="No replica available")
+
+    async def gather(self, path: str, **kwargs) -> List[Tuple[str, httpx.Response]]:
+        """GET path from every healthy replica; replicas that fail are left out."""
+        replicas = self.healthy_replicas()
+
+        async def fetch(replica: str):
+            try:
+                return replica, await self.client.get(f"{replica}{path}", **kwargs)
+            except httpx.TransportError as e:
+                logger.warning(f"Replica {replica} failed GET {path}: {str(e)}")
+                self._mark(replica, False)
+                return replica, None
+
+        results = await asyncio.gather(*(fetch(replica) for replica in replicas))
+        return [(replica, response) for replica, response in results if response is not None]
+
+    def describe(self) -> Dict:
+        return {
+            'replicas': [{'url': replica, 'healthy': self.healthy[replica]} for replica in self.ring.nodes],
+            'virtual_nodes': self.ring.vnodes,
+            'tracked_reviews': len(self._routes),
+            'routed': self.stats['routed'],
+            'failovers': self.stats['failovers']
+        }
+
+
+class ReplicaRequest(BaseModel):
+    url: str
+
+
+def _forwarded_headers(request: Request) -> Dict[str, str]:
+    return {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+
+
+def _relay(response: httpx.Response, replica: str) -> JSONResponse:
+    """Return a replica's JSON response, noting which replica served it."""
+    try:
+        content = response.json()
+    except ValueError:
+        content = {'detail': response.text}
+    return JSONResponse(content, status_code=response.status_code, headers={'X-Replica': replica})
+
+
+def create_gateway_app(gateway: Gateway, health_interval: float = 5.0) -> FastAPI:
+    """FastAPI app exposing the review API on top of gateway's replicas."""
+    app = FastAPI(title=f"{Config.API_TITLE} Gateway", version=Config.API_VERSION)
+    health_task: Dict[str, asyncio.Task] = {}
+
+    async def health_loop():
+        while True:
+            await asyncio.sleep(health_interval)
+            try:
+                await gateway.check_health()
+            except Exception as e:
+                logger.error(f"Error checking replica health: {str(e)}")
+
+    @app.on_event("startup")
+    async def start_health_checks():
+        await gateway.check_health()
+        health_task['task'] = asyncio.create_task(health_loop())
+
+    @app.on_event("shutdown")
+    async def stop_health_checks():
+        if 'task' in health_task:
+            health_task['task'].cancel()
+        await gateway.client.aclose()
+
+    @app.get("/health")
+    async def health_check():
+        """Gateway health; degraded while some replicas are down."""
+        healthy = gateway.healthy_replicas()
+        return {
+            "status": "healthy" if len(healthy) == len(gateway.healthy) else ("degraded" if healthy else "unavailable"),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            **gateway.describe()
+        }
+
+    @app.post("/api/v1/review")
+    async def review_code(request: Request):
+        """Route a review to the replica owning its fingerprint (or its base review)."""
+        body = await request.json()
+        candidates = gateway.candidates(routing_key(body.get('code', ''), body.get('language', ''),
+                                                    body.get('prompt_version')))
+        base = gateway.replica_for_review(body['base_review_id']) if body.get('base_review_id') else None
+        if base is not None:
+            candidates = [base] + [replica for replica in candidates if replica != base]
+        response, replica = await gateway.forward("POST", "/api/v1/review", candidates,
+                                                  json=body, headers=_forwarded_headers(request))
+        gateway.stats['routed'] += 1
+        if response.status_code == 200:
+            gateway.remember(response.json()['review_id'], replica)
+        return _relay(response, replica)
+
+    def _shard(items: List[Dict]) -> Dict[str, List[int]]:
+        """Item indices grouped by the replica owning each item."""
+        shards: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            candidates = gateway.candidates(routing_key(item.get('code', ''), item.get('language', ''),
+                                                        item.get('prompt_version')))
+            if not candidates:
+                raise HTTPException(status_code=503, detail="No replica available")
+            shards.setdefault(candidates[0], []).append(index)
+        return shards
+
+    async def _review_shard(replica: str, items: List[Dict], indices: List[int], headers: Dict[str, str]):
+        candidates = [replica] + [r for r in gateway.healthy_replicas() if r != replica]
+        response, served_by = await gateway.forward(
+            "POST", "/api/v1/review/batch", candidates,
+            json={'requests': [items[i] for i in indices]}, headers=headers
+        )
+        gateway.stats['routed'] += len(indices)
+        if response.status_code == 200:
+            for review in response.json()['reviews']:
+                gateway.remember(review['review_id'], served_by)
+        return indices, response, served_by
+
+    @app.post("/api/v1/review/batch")
+    async def review_batch(request: Request):
+        """Split a batch by owning replica, review the parts concurrently and restore request order."""
+        items = (await request.json()).get('requests', [])
+        if not items:
+            raise HTTPException(status_code=400, detail="Batch must contain at least one request")
+        headers = _forwarded_headers(request)
+        parts = await asyncio.gather(*(
+            _review_shard(replica, items, indices, headers) for replica, indices in _shard(items).items()
+        ))
+        reviews: List[Optional[Dict]] = [None] * len(items)
+        for indices, response, replica in parts:
+            if response.status_code != 200:
+                return _relay(response, replica)
+            for index, review in zip(indices, response.json()['reviews']):
+                reviews[index] = review
+        return {'reviews': reviews}
+
+    @app.post("/api/v1/review/batch/stream")
+    async def review_batch_stream(request: Request):
+        """Stream NDJSON results as each replica's part of the batch finishes."""
+        items = (await request.json()).get('requests', [])
+        if not items:
+            raise HTTPException(status_code=400, detail="Batch must contain at least one request")
+        headers = _forwarded_headers(request)
+        shards = _shard(items)
+
+        async def shard_lines(replica: str, indices: List[int]) -> List[Dict]:
+            # Failures are reported per item, as a replica's own stream does
+            try:
+                indices, response, _ = await _review_shard(replica, items, indices, headers)
+            except HTTPException as e:
+                logger.error(f"Streamed batch part failed: {e.detail}")
+                return [{'index': index, 'error': e.detail} for index in indices]
+            if response.status_code != 200:
+                return [{'index': index, 'error': response.text} for index in indices]
+            return [{'index': index, **review} for index, review in zip(indices, response.json()['reviews'])]
+
+        async def results():
+            tasks = [asyncio.create_task(shard_lines(replica, indices)) for replica, indices in shards.items()]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    for line in await finished:
+                        yield json.dumps(line) + '\n'
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(results(), media_type="application/x-ndjson")
+
+    @app.post("/api/v1/review/{review_id}/followup")
+    async def follow_up(review_id: str, request: Request):
+        """Send a follow-up to the replica holding the review, searching replicas if it is unknown."""
+        body = await request.json()
+        known = gateway.replica_for_review(review_id)
+        replicas = [known] if known else gateway.healthy_replicas()
+        response, replica, unavailable = None, None, False
+        for candidate in replicas:
+            try:
+                response, replica = await gateway.forward(
+                    "POST", f"/api/v1/review/{review_id}/followup", [candidate],
+                    json=body, headers=_forwarded_headers(request)
+                )
+            except HTTPException as e:
+                if e.status_code != 503:
+                    raise
+                # The review may be on another replica
+                unavailable = True
+                continue
+            if response.status_code != 404:
+                gateway.remember(review_id, replica)
+                return _relay(response, replica)
+        if unavailable:
+            # Not found on the replicas that answered, but it may be on one that did not
+            raise HTTPException(status_code=503, detail="No replica available")
+        if response is None:
+            raise HTTPException(status_code=404, detail=f"Review {review_id} not found")
+        return _relay(response, replica)
+
+    @app.get("/api/v1/metrics")
+    async def get_metrics(window: str = "all", language: Optional[str] = None):
+        """Metrics of all healthy replicas, merged from their latency sketches."""
+        params = {'window': window}
+        if language is not None:
+            params['language'] = language
+        exports = []
+        for replica, response in await gateway.gather("/api/v1/metrics/sketch", params=params):
+            if response.status_code != 200:
+                return _relay(response, replica)
+            exports.append(response.json())
+        return merge_exports(exports, window)
+
+    @app.get("/api/v1/history")
+    async def get_history(limit: Optional[int] = None):
+        """History of all healthy replicas, oldest first, each entry tagged with its replica."""
+        params = {'limit': limit} if limit else {}
+        entries = []
+        for replica, response in await gateway.gather("/api/v1/history", params=params):
+            if response.status_code == 200:
+                entries.extend({**entry, 'replica': replica} for entry in response.json())
+        entries.sort(key=lambda entry: entry['timestamp'])
+        return entries[-limit:] if limit else entries
+
+    @app.get("/api/v1/prompts")
+    async def get_prompt_versions():
+        response, replica = await gateway.forward("GET", "/api/v1/prompts", gateway.healthy_replicas())
+        return _relay(response, replica)
+
+    @app.get("/api/v1/gateway/replicas")
+    async def get_replicas():
+        return gateway.describe()
+
+    @app.post("/api/v1/gateway/replicas", dependencies=[Depends(require_admin)])
+    async def add_replica(request: ReplicaRequest):
+        """Add a replica; about 1/N of review keys move to it."""
+        gateway.add_replica(request.url)
+        await gateway.check_health()
+        return gateway.describe()
+
+    @app.delete("/api/v1/gateway/replicas", dependencies=[Depends(require_admin)])
+    async def remove_replica(request: ReplicaRequest):
+        if not gateway.remove_replica(request.url):
+            raise HTTPException(status_code=404, detail=f"Unknown replica: {request.url}")
+        return gateway.describe()
+
+    return app
+
+
+def spawn_replicas(count: int, base_port: int, host: str = "127.0.0.1") -> List[Tuple[str, subprocess.Popen]]:
+    """Start local replica servers on consecutive ports; returns (url, process) pairs."""
+    replicas = []
+    for i in range(count):
+        port = base_port + i
+        env = {
+            **os.environ,
+            'PORT': str(port),
+            # Replicas must not append to the same archive and capture files
+            'HISTORY_ARCHIVE_DIR': os.path.join(Config.HISTORY_ARCHIVE_DIR, f"replica-{port}"),
+            'TRAFFIC_CAPTURE_DIR': os.path.join(Config.TRAFFIC_CAPTURE_DIR, f"replica-{port}"),
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.api:app", "--host", host, "--port", str(port)],
+            env=env
+        )
+        replicas.append((f"http://{host}:{port}", process))
+        logger.info(f"Started replica on port {port} (pid {process.pid})")
+    return replicas
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point for the gateway."""
+    parser = argparse.ArgumentParser(description="Route reviews across replicas by code fingerprint.")
+    parser.add_argument("--replica", action="append", default=list(Config.GATEWAY_REPLICAS),
+                        help="Replica base URL (repeatable; default GATEWAY_REPLICAS)")
+    parser.add_argument("--spawn-replicas", type=int, default=0,
+                        help="Start this many local replica processes")
+    parser.add_argument("--replica-base-port", type=int, default=Config.PORT + 1,
+                        help="First port for spawned replicas")
+    parser.add_argument("--host", default=Config.HOST)
+    parser.add_argument("--port", type=int, default=Config.PORT)
+    parser.add_argument("--virtual-nodes", type=int, default=Config.GATEWAY_VIRTUAL_NODES)
+    parser.add_argument("--health-interval", type=float, default=Config.GATEWAY_HEALTH_INTERVAL)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    spawned = spawn_replicas(args.spawn_replicas, args.replica_base_port) if args.spawn_replicas else []
+    replicas = args.replica + [url for url, _ in spawned]
+    if not replicas:
+        parser.error("Give at least one --replica or --spawn-replicas")
+    gateway = Gateway(replicas, vnodes=args.virtual_nodes, timeout=Config.GATEWAY_TIMEOUT,
+                      route_cache_size=Config.GATEWAY_ROUTE_CACHE_SIZE)
+    try:
+        uvicorn.run(create_gateway_app(gateway, args.health_interval), host=args.host, port=args.port,
+                    log_level=Config.LOG_LEVEL.lower())
+    finally:
+        for _, process in spawned:
+            process.terminate()
+        for _, process in spawned:
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
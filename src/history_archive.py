@@ -0,0 +1,330 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# One row per review; code itself is not archived, only its size
+SCHEMA = pa.schema([
+    ('review_id', pa.string()),
+    ('timestamp', pa.timestamp('ms')),
+    ('language', pa.string()),
+    ('prompt_version', pa.string()),
+    ('code_bytes', pa.int64()),
+    ('code_lines', pa.int32()),
+    ('response_time', pa.float64()),
+    ('suggestion_count', pa.int32()),
+    ('tokens_saved', pa.int32()),
+    ('reused', pa.bool_()),
+    ('finding_sections', pa.list_(pa.string())),
+    ('finding_texts', pa.list_(pa.string())),
+])
+
+# Finding themes matched case-insensitively against suggestion text
+THEMES = {
+    'sql_injection': r'sql injection|parameteri[sz]ed quer',
+    'input_validation': r'validat|sanitiz',
+    'secrets': r'hard-?coded (secret|password|credential|key|token)|api key',
+    'error_handling': r'error handling|exception|try.?except|try.?catch',
+    'documentation': r'docstring|comment|documentation',
+    'naming': r'naming|variable name|descriptive name',
+    'type_hints': r'type hint|type annotation',
+    'performance': r'performance|complexity|inefficient|optimi[sz]',
+    'testing': r'unit test|test coverage|tests?\b',
+    'resource_management': r'context manager|close|leak',
+}
+
+# Written while a month's parts are swapped for their merged file
+COMPACTION_MANIFEST = '.compaction.json'
+
+# Upper edges (bytes) of the code size buckets used for latency distributions
+CODE_SIZE_EDGES = (256, 1024, 4096, 16384, 65536)
+
+
+def review_row(review) -> Dict:
+    """Archive row for a CodeReview."""
+    sections, texts = [], []
+    for section in review.suggestions:
+        for item in section.get('items', []):
+            sections.append(section['type'])
+            texts.append(item)
+    return {
+        'review_id': review.review_id,
+        'timestamp': review.timestamp,
+        'language': review.language.strip().lower(),
+        'prompt_version': review.prompt_version,
+        'code_bytes': len(review.code.encode('utf-8')),
+        'code_lines': review.code.count('\n') + 1,
+        'response_time': float(review.metrics.get('response_time', 0.0)),
+        'suggestion_count': int(review.metrics.get('suggestion_count', len(texts))),
+        'tokens_saved': int(review.metrics.get('tokens_saved', 0)),
+        'reused': review.reused_from is not None,
+        'finding_sections': sections,
+        'finding_texts': texts,
+    }
+
+
+class HistoryArchive:
+    """Parquet archive of reviews that aged out of the in-memory history.
+
+    Rows are buffered and written by a background thread as zstd-compressed
+    part files, one directory per month. Once a month has more than
+    `compact_files` parts they are merged into a single file so scans stay
+    cheap. Queries read only the row groups whose timestamp statistics
+    overlap the requested range.
+    """
+
+    def __init__(self, directory: str, flush_rows: int = 256, compact_files: int = 16):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.compact_files = compact_files
+        self.archived = 0
+        self._buffer: List[Dict] = []
+        # Rows taken from the buffer whose part file is not visible yet
+        self._writing: List[Dict] = []
+        self._seq = 0
+        # Guards the buffer and which files are visible; files are written outside it
+        self._lock = threading.Condition()
+        # Serializes the background writer and explicit flushes
+        self._write_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        if os.path.isdir(directory):
+            self._recover()
+
+    def append(self, review):
+        """Buffer a review; the background writer writes a part file once flush_rows are pending."""
+        row = review_row(review)
+        with self._lock:
+            self._buffer.append(row)
+            self.archived += 1
+            if len(self._buffer) >= self.flush_rows:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._run, name='history-archive', daemon=True)
+                    self._writer.start()
+                self._lock.notify_all()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while len(self._buffer) < self.flush_rows:
+                    self._lock.wait()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing history archive: {str(e)}")
+
+    def flush(self):
+        """Write buffered rows to part files, grouped by month, and compact full months."""
+        with self._write_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                self._writing = rows
+            try:
+                by_month: Dict[str, List[Dict]] = {}
+                for row in rows:
+                    by_month.setdefault(row['timestamp'].strftime('%Y-%m'), []).append(row)
+                for month, month_rows in by_month.items():
+                    month_dir = os.path.join(self.directory, month)
+                    os.makedirs(month_dir, exist_ok=True)
+                    self._seq += 1
+                    path = os.path.join(month_dir, f"part-{int(time.time() * 1000)}-{self._seq}.parquet")
+                    temp_path = self._write_temp(pa.Table.from_pylist(month_rows, schema=SCHEMA), path)
+                    written = {id(row) for row in month_rows}
+                    with self._lock:
+                        os.replace(temp_path, path)
+                        self._writing = [row for row in self._writing if id(row) not in written]
+                    self._compact(month_dir)
+            finally:
+                with self._lock:
+                    self._writing = []
+
+    @staticmethod
+    def _write_temp(table: pa.Table, path: str) -> str:
+        # Written under a temporary name and renamed into place, so a crash never
+        # leaves a truncated file in the archive (dot-prefixed, so scans skip it)
+        temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        pq.write_table(table, temp_path, compression='zstd')
+        return temp_path
+
+    def _compact(self, month_dir: str):
+        parts = sorted(f for f in os.listdir(month_dir) if f.endswith('.parquet') and not f.startswith('.'))
+        if len(parts) <= self.compact_files:
+            return
+        paths = [os.path.join(month_dir, f) for f in parts]
+        table = pa.concat_tables(pq.read_table(path, schema=SCHEMA) for path in paths)
+        table = table.sort_by('timestamp')
+        self._seq += 1
+        path = os.path.join(month_dir, f"compacted-{int(time.time() * 1000)}-{self._seq}.parquet")
+        temp_path = self._write_temp(table, path)
+        # The manifest stages the swap: after a crash, _recover deletes the
+        # parts if the merged file made it into place, so no row is counted twice
+        manifest = os.path.join(month_dir, COMPACTION_MANIFEST)
+        with open(manifest, 'w') as f:
+            json.dump({'output': os.path.basename(path), 'parts': parts}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            os.replace(temp_path, path)
+            for part in paths:
+                os.remove(part)
+        os.remove(manifest)
+        logger.info(f"Compacted {len(paths)} archive files in {month_dir}")
+
+    def _recover(self):
+        """Finish compactions interrupted by a crash."""
+        for month in os.listdir(self.directory):
+            manifest = os.path.join(self.directory, month, COMPACTION_MANIFEST)
+            if not os.path.isfile(manifest):
+                continue
+            with open(manifest) as f:
+                staged = json.load(f)
+            if os.path.exists(os.path.join(self.directory, month, staged['output'])):
+                for part in staged['parts']:
+                    part_path = os.path.join(self.directory, month, part)
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                logger.info(f"Finished an interrupted compaction of {len(staged['parts'])} files in {month}")
+            os.remove(manifest)
+
+    def _files(self) -> List[str]:
+        files = []
+        if os.path.isdir(self.directory):
+            for root, _, names in os.walk(self.directory):
+                files.extend(os.path.join(root, n) for n in names if n.endswith('.parquet') and not n.startswith('.'))
+        return sorted(files)
+
+    def table(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+              extra_rows: Sequence[Dict] = ()) -> pa.Table:
+        """Archived and pending rows in [since, until), plus extra_rows (e.g. live history)."""
+        while True:
+            with self._lock:
+                pending = list(self._writing) + list(self._buffer)
+                files = self._files()
+            tables = []
+            try:
+                if files:
+                    dataset = ds.dataset(files, format='parquet', schema=SCHEMA)
+                    tables.append(dataset.to_table(filter=_time_filter(ds.field('timestamp'), since, until)))
+            except OSError:
+                if all(os.path.exists(path) for path in files):
+                    raise
+                # A compaction replaced files during the scan; take a new snapshot
+                continue
+            break
+        pending += list(extra_rows)
+        if pending:
+            tables.append(rows_table(pending, since, until))
+        if not tables:
+            return SCHEMA.empty_table()
+        return pa.concat_tables(tables)
+
+    def describe(self) -> Dict:
+        """Archive size and file counts."""
+        with self._lock:
+            files = self._files()
+            pending_rows = len(self._writing) + len(self._buffer)
+        return {
+            'directory': self.directory,
+            'files': len(files),
+            'bytes': sum(os.path.getsize(path) for path in files if os.path.exists(path)),
+            'pending_rows': pending_rows,
+            'archived_this_run': self.archived
+        }
+
+
+def rows_table(rows: Sequence[Dict], since: Optional[datetime] = None,
+               until: Optional[datetime] = None) -> pa.Table:
+    """Archive rows in [since, until) as a table."""
+    table = pa.Table.from_pylist(list(rows), schema=SCHEMA)
+    mask = _time_filter(table['timestamp'], since, until)
+    return table if mask is None else table.filter(mask)
+
+
+def _time_filter(column, since: Optional[datetime], until: Optional[datetime]):
+    """Comparison on a timestamp column or dataset field; None if unbounded."""
+    condition = None
+    for bound, compare in ((since, pc.greater_equal), (until, pc.less)):
+        if bound is None:
+            continue
+        term = compare(column, pa.scalar(bound, type=pa.timestamp('ms')))
+        condition = term if condition is None else pc.and_kleene(condition, term)
+    return condition
+
+
+def counts_by_language_day(table: pa.Table) -> List[Dict]:
+    """Reviews and suggestions per language per day."""
+    days = pc.strftime(pc.floor_temporal(table['timestamp'], unit='day'), format='%Y-%m-%d')
+    grouped = (table.select(['language', 'suggestion_count'])
+               .append_column('day', days)
+               .group_by(['day', 'language'])
+               .aggregate([('suggestion_count', 'count'), ('suggestion_count', 'sum')])
+               .sort_by([('day', 'ascending'), ('language', 'ascending')]))
+    return [{
+        'day': row['day'],
+        'language': row['language'],
+        'reviews': row['suggestion_count_count'],
+        'suggestions': row['suggestion_count_sum']
+    } for row in grouped.to_pylist()]
+
+
+def section_counts(table: pa.Table) -> Dict[str, Dict[str, int]]:
+    """Findings per section type, overall and per language."""
+    sections = pc.list_flatten(table['finding_sections'])
+    languages = pc.take(table['language'], pc.list_parent_indices(table['finding_sections']))
+    grouped = (pa.table({'language': languages, 'section': sections})
+               .group_by(['language', 'section'])
+               .aggregate([('section', 'count')]))
+    result: Dict[str, Dict[str, int]] = {'all': {}}
+    for row in grouped.to_pylist():
+        result.setdefault(row['language'], {})[row['section']] = row['section_count']
+        result['all'][row['section']] = result['all'].get(row['section'], 0) + row['section_count']
+    return result
+
+
+def theme_counts(table: pa.Table, themes: Dict[str, str] = THEMES) -> Dict[str, Dict[str, int]]:
+    """For each theme, matching findings and the number of reviews with at least one."""
+    texts = pc.utf8_lower(pc.list_flatten(table['finding_texts']))
+    owners = pc.list_parent_indices(table['finding_texts']).to_numpy(zero_copy_only=False)
+    result = {}
+    for theme, pattern in themes.items():
+        matches = pc.match_substring_regex(texts, pattern).to_numpy(zero_copy_only=False)
+        result[theme] = {
+            'findings': int(matches.sum()),
+            'reviews': int(np.unique(owners[matches]).size)
+        }
+    return result
+
+
+def latency_by_code_size(table: pa.Table, edges: Sequence[int] = CODE_SIZE_EDGES) -> List[Dict]:
+    """Latency distribution of generated (non-reused) reviews per code size bucket."""
+    generated = table.filter(pc.invert(table['reused']))
+    sizes = generated['code_bytes'].to_numpy()
+    latencies = generated['response_time'].to_numpy()
+    buckets = np.searchsorted(np.asarray(edges), sizes, side='left')
+    order = np.argsort(buckets, kind='stable')
+    bounds = np.searchsorted(buckets[order], np.arange(len(edges) + 2))
+
+    result = []
+    for bucket in range(len(edges) + 1):
+        values = latencies[order[bounds[bucket]:bounds[bucket + 1]]]
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) if values.size else (0.0, 0.0, 0.0)
+        result.append({
+            'min_bytes': 0 if bucket == 0 else int(edges[bucket - 1]) + 1,
+            'max_bytes': int(edges[bucket]) if bucket < len(edges) else None,
+            'reviews': int(values.size),
+            'mean_response_time': float(values.mean()) if values.size else 0.0,
+            'p50_response_time': float(p50),
+            'p95_response_time': float(p95),
+            'p99_response_time': float(p99)
+        })
+    return result
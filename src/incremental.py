@@ -0,0 +1,164 @@
+import ast
+import logging
+import re
+from typing import Dict, List, Optional
+
+from .fingerprint import code_fingerprint
+from .minify import MinifiedCode
+
+logger = logging.getLogger(__name__)
+
+# Key under which findings that cannot be attributed to a block are stored
+FILE_LEVEL = ""
+
+_DECLARATION_PATTERN = re.compile(
+    r'\b(?:function|def|func|fn|class|struct|interface|enum|impl|trait)\s+([A-Za-z_$][\w$]*)'
+)
+_CALL_PATTERN = re.compile(r'([A-Za-z_$][\w$]*)\s*\([^;]*$')
+
+
+def _make_block(name: str, lines: List[str], start: int, end: int, language: str) -> Dict:
+    """Build a block record for lines[start:end] (0-based, end exclusive)."""
+    block_code = '\n'.join(lines[start:end])
+    return {
+        'name': name,
+        'start': start + 1,
+        'end': end,
+        'code': block_code,
+        'hash': code_fingerprint(block_code, language)
+    }
+
+
+def _split_python_blocks(code: str, lines: List[str]) -> Optional[List[Dict]]:
+    """Split Python code into top-level function, class and statement blocks."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    blocks = []
+    pending = None
+    for node in tree.body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])]) - 1
+        end = node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if pending:
+                blocks.append(_make_block(f"module:{pending[0] + 1}", lines, pending[0], pending[1], 'python'))
+                pending = None
+            blocks.append(_make_block(node.name, lines, start, end, 'python'))
+        elif pending:
+            pending = (pending[0], end)
+        else:
+            pending = (start, end)
+    if pending:
+        blocks.append(_make_block(f"module:{pending[0] + 1}", lines, pending[0], pending[1], 'python'))
+    return blocks
+
+
+def _block_name(header: str, start: int) -> str:
+    """Guess a block name from its first line."""
+    match = _DECLARATION_PATTERN.search(header) or _CALL_PATTERN.search(header)
+    if match:
+        return match.group(1)
+    return f"block:{start + 1}"
+
+
+def _split_generic_blocks(lines: List[str], language: str) -> List[Dict]:
+    """Split code into blocks separated by blank lines outside of braces."""
+    blocks = []
+    depth = 0
+    start = None
+    for index, line in enumerate(lines):
+        if start is None:
+            if not line.strip():
+                continue
+            start = index
+        depth += line.count('{') - line.count('}')
+        depth = max(depth, 0)
+        next_blank = index + 1 >= len(lines) or not lines[index + 1].strip()
+        if depth == 0 and next_blank:
+            blocks.append(_make_block(_block_name(lines[start], start), lines, start, index + 1, language))
+            start = None
+    if start is not None:
+        blocks.append(_make_block(_block_name(lines[start], start), lines, start, len(lines), language))
+    return blocks
+
+
+def split_blocks(code: str, language: str) -> List[Dict]:
+    """Split code into independently reviewable blocks."""
+    lines = code.split('\n')
+    if language.strip().lower() in ('python', 'py'):
+        blocks = _split_python_blocks(code, lines)
+        if blocks is not None:
+            return blocks
+    return _split_generic_blocks(lines, language)
+
+
+def diff_blocks(old_blocks: List[Dict], new_blocks: List[Dict]) -> Dict[str, List[Dict]]:
+    """Classify blocks of a new revision as changed or unchanged, and find removed ones."""
+    old_hashes = {block['hash'] for block in old_blocks}
+    new_hashes = {block['hash'] for block in new_blocks}
+    return {
+        'changed': [block for block in new_blocks if block['hash'] not in old_hashes],
+        'unchanged': [block for block in new_blocks if block['hash'] in old_hashes],
+        'removed': [block for block in old_blocks if block['hash'] not in new_hashes]
+    }
+
+
+def _short_name(name: str) -> Optional[str]:
+    """Return the identifier to look for in findings, or None for anonymous blocks."""
+    if ':' in name:
+        return None
+    return name.rsplit('.', 1)[-1]
+
+
+def attribute_findings(suggestions: List[Dict], blocks: List[Dict]) -> Dict[str, List[Dict]]:
+    """Attribute each finding to the block whose name it mentions.
+
+    Findings that mention no block, or several, are kept at file level.
+    """
+    patterns = {}
+    for block in blocks:
+        name = _short_name(block['name'])
+        if name:
+            patterns[block['hash']] = re.compile(rf'\b{re.escape(name)}\b')
+
+    findings: Dict[str, List[Dict]] = {}
+    for section in suggestions:
+        for item in section['items']:
+            owners = [block_hash for block_hash, pattern in patterns.items() if pattern.search(item)]
+            key = owners[0] if len(owners) == 1 else FILE_LEVEL
+            sections = findings.setdefault(key, [])
+            target = next((s for s in sections if s['type'] == section['type']), None)
+            if target is None:
+                target = {'type': section['type'], 'items': []}
+                sections.append(target)
+            target['items'].append(item)
+    return findings
+
+
+def offset_findings(sections: List[Dict], block: Dict, first_line: int = 1) -> List[Dict]:
+    """Move line references in findings on a block to its lines in the whole file.
+
+    first_line is where the findings place the block's first line: 1 when the
+    block was reviewed alone, or its start in the revision they were made on.
+    References outside the block are kept.
+    """
+    line_map = list(range(1, first_line)) + list(range(block['start'], block['end'] + 1))
+    return MinifiedCode(block['code'], line_map).remap_findings(sections)
+
+
+def splice_findings(section_types: List[str], block_findings: Dict[str, List[Dict]],
+                    keep: List[str]) -> List[Dict]:
+    """Merge the findings of the given block hashes into one list of sections."""
+    result = [{'type': section_type, 'items': []} for section_type in section_types]
+    by_type = {section['type']: section for section in result}
+    for key in keep:
+        for section in block_findings.get(key, []):
+            target = by_type.get(section['type'])
+            if target is None:
+                continue
+            for item in section['items']:
+                if item not in target['items']:
+                    target['items'].append(item)
+    return result
@@ -0,0 +1,349 @@
+import logging
+import os
+from typing import Dict, List, Optional, Tuple, Type
+
+import torch
+from transformers import AutoModelForCausalLM, DynamicCache, StoppingCriteriaList
+
+from .config import Config
+from .sessions import GenerationSession
+from . import cancellation
+
+logger = logging.getLogger(__name__)
+
+MOCK_RESPONSE = """- Issues:
+- No critical issues found in the code
+- The code is simple and straightforward
+
+- Improvements:
+- Consider adding type hints for better code readability
+- Add input validation for the numbers parameter
+- Consider using sum() built-in function for better performance
+
+- Best Practices:
+- Add docstring to explain function purpose and parameters
+- Follow PEP 8 naming conventions
+- Consider adding return type annotation
+
+- Security:
+- No immediate security concerns for this simple function
+- Input validation would help prevent potential issues"""
+
+
+class InferenceBackend:
+    """Engine that turns prompts into completions for ModelManager."""
+
+    name = "base"
+    # Whether ModelManager should load a tokenizer for this backend
+    uses_tokenizer = True
+    # Whether the tokenizer may gain special tokens (requires resizable embeddings)
+    adds_special_tokens = True
+
+    def __init__(self):
+        self.model = None
+        self.tokenizer = None
+        self.device = "cpu"
+
+    def load(self, model_name: str, tokenizer, device: str):
+        """Load model weights."""
+        raise NotImplementedError
+
+    def generate(self, prompt: str, max_new_tokens: int) -> str:
+        """Generate a completion for one prompt."""
+        raise NotImplementedError
+
+    def generate_batch(self, prompts: List[str], max_new_tokens: int) -> List[str]:
+        """Generate completions for several prompts."""
+        return [self.generate(prompt, max_new_tokens) for prompt in prompts]
+
+    def generate_forked(self, prefix: str, continuations: List[str], max_new_tokens: int) -> List[str]:
+        """Generate one completion per continuation of a shared prefix.
+
+        The default batches the full prompts; backends that can reuse the
+        prefix's attention state override this to prefill it only once.
+        """
+        return self.generate_batch([prefix + continuation for continuation in continuations], max_new_tokens)
+
+    def generate_session(self, prompt: str, session: Optional[GenerationSession],
+                         max_new_tokens: int) -> Tuple[str, GenerationSession]:
+        """Continue a session (or start one) with more prompt text.
+
+        The default recomputes the whole context; backends that can keep their
+        attention cache override this to prefill only the new text.
+        """
+        context = (session.text if session is not None else "") + prompt
+        completion = self.generate(context, max_new_tokens)
+        return completion, GenerationSession(context + completion)
+
+    def set_dtype(self, dtype: torch.dtype) -> bool:
+        """Cast the model weights; returns False if the backend cannot."""
+        return False
+
+
+class TransformersBackend(InferenceBackend):
+    """Eager PyTorch execution of a Hugging Face causal LM."""
+
+    name = "transformers"
+
+    def load(self, model_name: str, tokenizer, device: str):
+        self.tokenizer = tokenizer
+        self.device = device
+        # Load model with CPU configuration
+        self.model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            device_map={"": device},
+            torch_dtype=torch.float32,  # Use float32 for CPU
+            token=Config.HUGGING_FACE_TOKEN,
+            low_cpu_mem_usage=True
+        )
+        # Resize embeddings to match tokenizer
+        self.model.resize_token_embeddings(len(tokenizer))
+        self.model.eval()
+
+    def set_dtype(self, dtype: torch.dtype) -> bool:
+        if self.model.dtype != dtype:
+            logger.info(f"Casting model to {dtype}")
+            self.model.to(dtype)
+        return True
+
+    def _generation_kwargs(self, max_new_tokens: int) -> Dict:
+        """Sampling parameters shared by single and batched generation."""
+        kwargs = {
+            'max_new_tokens': max_new_tokens,
+            'temperature': Config.TEMPERATURE,
+            'top_p': Config.TOP_P,
+            'do_sample': Config.TEMPERATURE > 0,
+            'pad_token_id': self.tokenizer.pad_token_id
+        }
+        # Stop at the next decode step once the request is abandoned
+        token = cancellation.current_token()
+        if token is not None:
+            kwargs['stopping_criteria'] = StoppingCriteriaList([cancellation.CancellationCriteria(token)])
+        return kwargs
+
+    def _prompt_inputs(self, prompts: List[str]) -> Dict:
+        """Left-padded input_ids and attention_mask, reusing token IDs carried by EncodedPrompts."""
+        rows = [getattr(prompt, 'input_ids', None) for prompt in prompts]
+        if any(row is None for row in rows):
+            # Decoder-only models need left padding so every prompt ends at the same position
+            padding_side = self.tokenizer.padding_side
+            self.tokenizer.padding_side = "left"
+            try:
+                return self.tokenizer(
+                    prompts[0] if len(prompts) == 1 else prompts,
+                    return_tensors="pt",
+                    padding=len(prompts) > 1,
+                    truncation=True,
+                    max_length=Config.MAX_INPUT_LENGTH
+                ).to(self.device)
+            finally:
+                self.tokenizer.padding_side = padding_side
+        rows = [row[:Config.MAX_INPUT_LENGTH] for row in rows]
+        width = max(len(row) for row in rows)
+        pad_token_id = self.tokenizer.pad_token_id or 0
+        return {
+            'input_ids': torch.tensor([[pad_token_id] * (width - len(row)) + row for row in rows], device=self.device),
+            'attention_mask': torch.tensor([[0] * (width - len(row)) + [1] * len(row) for row in rows],
+                                           device=self.device)
+        }
+
+    def generate(self, prompt: str, max_new_tokens: int) -> str:
+        inputs = self._prompt_inputs([prompt])
+        with torch.inference_mode():
+            output = self.model.generate(**inputs, **self._generation_kwargs(max_new_tokens))
+        prompt_length = inputs["input_ids"].shape[1]
+        return self.tokenizer.decode(output[0][prompt_length:], skip_special_tokens=True)
+
+    def generate_session(self, prompt: str, session: Optional[GenerationSession],
+                         max_new_tokens: int) -> Tuple[str, GenerationSession]:
+        input_ids = None
+        if session is not None and session.past_key_values is not None:
+            # Only the new text is prefilled; generate() skips positions already in the cache
+            new_ids = self.tokenizer(prompt, return_tensors="pt", add_special_tokens=False)["input_ids"].to(self.device)
+            if session.input_ids.shape[1] + new_ids.shape[1] <= Config.MAX_INPUT_LENGTH:
+                input_ids = torch.cat([session.input_ids, new_ids], dim=1)
+                past_key_values = session.past_key_values
+            else:
+                logger.info("Session context exceeds MAX_INPUT_LENGTH; rebuilding it without the cache")
+        if input_ids is None:
+            past_key_values = None
+            if session is None:
+                input_ids = self._prompt_inputs([prompt])["input_ids"]
+            else:
+                # Keep the end of an over-long context so the new prompt is never cut off
+                input_ids = self.tokenizer(session.text + prompt, return_tensors="pt")["input_ids"]
+                input_ids = input_ids[:, -Config.MAX_INPUT_LENGTH:].to(self.device)
+        keep_cache = self._growable_cache()
+        kwargs = {}
+        if keep_cache:
+            # An explicit DynamicCache overrides any cache_implementation, so the cache can grow
+            kwargs = {'past_key_values': past_key_values or DynamicCache(), 'cache_implementation': None}
+        with torch.inference_mode():
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                return_dict_in_generate=True,
+                **kwargs,
+                **self._generation_kwargs(max_new_tokens)
+            )
+        completion = self.tokenizer.decode(output.sequences[0][input_ids.shape[1]:], skip_special_tokens=True)
+        text = (session.text if session is not None else "") + prompt + completion
+        if not keep_cache:
+            return completion, GenerationSession(text)
+        result = GenerationSession(text, output.sequences, output.past_key_values)
+        result.reused_cache = past_key_values is not None
+        return completion, result
+
+    def _growable_cache(self) -> bool:
+        """Whether a session's attention cache can be kept and continued.
+
+        Models configured for a fixed-size cache (e.g. Gemma 2's hybrid sliding
+        window cache) do not decode correctly from a DynamicCache once the
+        context passes the window, so their sessions keep text only.
+        """
+        generation_config = getattr(self.model, 'generation_config', None)
+        return getattr(generation_config, 'cache_implementation', None) in (None, 'dynamic')
+
+    def generate_batch(self, prompts: List[str], max_new_tokens: int) -> List[str]:
+        if len(prompts) == 1:
+            return [self.generate(prompts[0], max_new_tokens)]
+        inputs = self._prompt_inputs(prompts)
+        with torch.inference_mode():
+            output = self.model.generate(**inputs, **self._generation_kwargs(max_new_tokens))
+        prompt_length = inputs["input_ids"].shape[1]
+        return self.tokenizer.batch_decode(output[:, prompt_length:], skip_special_tokens=True)
+
+    def generate_forked(self, prefix: str, continuations: List[str], max_new_tokens: int) -> List[str]:
+        prefix_ids = self.tokenizer(
+            prefix,
+            return_tensors="pt",
+            truncation=True,
+            max_length=Config.MAX_INPUT_LENGTH
+        )["input_ids"].to(self.device)
+        # Left-pad the branches so padding sits between the prefix and each branch;
+        # positions come from the attention mask, so every branch continues the prefix
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = "left"
+        try:
+            branches = self.tokenizer(
+                continuations,
+                return_tensors="pt",
+                padding=True,
+                add_special_tokens=False
+            ).to(self.device)
+        finally:
+            self.tokenizer.padding_side = padding_side
+
+        count = len(continuations)
+        with torch.inference_mode():
+            # Prefill the shared prefix once, then give every branch a copy of its cache
+            cache = self.model(input_ids=prefix_ids, past_key_values=DynamicCache(), use_cache=True).past_key_values
+            cache.batch_repeat_interleave(count)
+            input_ids = torch.cat([prefix_ids.expand(count, -1), branches["input_ids"]], dim=1)
+            attention_mask = torch.cat([
+                torch.ones(count, prefix_ids.shape[1], dtype=branches["attention_mask"].dtype, device=self.device),
+                branches["attention_mask"]
+            ], dim=1)
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=cache,
+                **self._generation_kwargs(max_new_tokens)
+            )
+        return self.tokenizer.batch_decode(output[:, input_ids.shape[1]:], skip_special_tokens=True)
+
+
+class CompiledTransformersBackend(TransformersBackend):
+    """Transformers model with its forward pass compiled by torch.compile."""
+
+    name = "compiled"
+
+    def load(self, model_name: str, tokenizer, device: str):
+        super().load(model_name, tokenizer, device)
+        logger.info(f"Compiling model forward pass (mode={Config.TORCH_COMPILE_MODE})")
+        self.model.forward = torch.compile(self.model.forward, mode=Config.TORCH_COMPILE_MODE, dynamic=True)
+        # Pay the compilation cost at startup rather than on the first request
+        self.generate("def warmup(): pass", max_new_tokens=2)
+
+
+class OnnxRuntimeBackend(TransformersBackend):
+    """ONNX Runtime CPU execution of a model exported with optimum."""
+
+    name = "onnx"
+    # Exported graphs have a fixed vocabulary, so the tokenizer is used as shipped
+    adds_special_tokens = False
+
+    def load(self, model_name: str, tokenizer, device: str):
+        try:
+            from optimum.onnxruntime import ORTModelForCausalLM
+        except ImportError as e:
+            raise RuntimeError(
+                "The onnx backend requires optimum[onnxruntime]: pip install optimum[onnxruntime]"
+            ) from e
+
+        self.tokenizer = tokenizer
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.device = "cpu"
+
+        export_dir = os.path.join(Config.ONNX_CACHE_DIR, model_name.replace("/", "--"))
+        if os.path.isdir(export_dir):
+            logger.info(f"Loading ONNX export from {export_dir}")
+            self.model = ORTModelForCausalLM.from_pretrained(export_dir, provider="CPUExecutionProvider")
+        else:
+            logger.info(f"Exporting {model_name} to ONNX in {export_dir}")
+            self.model = ORTModelForCausalLM.from_pretrained(
+                model_name,
+                export=True,
+                provider="CPUExecutionProvider",
+                token=Config.HUGGING_FACE_TOKEN
+            )
+            self.model.save_pretrained(export_dir)
+
+    def set_dtype(self, dtype: torch.dtype) -> bool:
+        # The exported graph fixes the dtype
+        return dtype == torch.float32
+
+    # ORT models manage their own cache buffers, so sessions are recomputed
+    # and forked prompts are batched in full
+    generate_session = InferenceBackend.generate_session
+    generate_forked = InferenceBackend.generate_forked
+
+
+class MockBackend(InferenceBackend):
+    """Deterministic canned responses with configurable latency, for load testing."""
+
+    name = "mock"
+    uses_tokenizer = False
+    adds_special_tokens = False
+
+    def load(self, model_name: str, tokenizer, device: str):
+        self.device = device
+
+    def set_dtype(self, dtype: torch.dtype) -> bool:
+        return True
+
+    def generate(self, prompt: str, max_new_tokens: int) -> str:
+        if Config.MOCK_LATENCY_SECONDS > 0:
+            cancellation.sleep(Config.MOCK_LATENCY_SECONDS)
+        return MOCK_RESPONSE
+
+    def generate_batch(self, prompts: List[str], max_new_tokens: int) -> List[str]:
+        # A batch costs about as much as its longest member, not the sum
+        if Config.MOCK_LATENCY_SECONDS > 0:
+            cancellation.sleep(Config.MOCK_LATENCY_SECONDS)
+        return [MOCK_RESPONSE for _ in prompts]
+
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {
+    backend.name: backend
+    for backend in (TransformersBackend, CompiledTransformersBackend, OnnxRuntimeBackend, MockBackend)
+}
+
+
+def create_backend(name: Optional[str] = None) -> InferenceBackend:
+    """Instantiate the named backend, defaulting to Config.INFERENCE_BACKEND."""
+    name = (name or Config.INFERENCE_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name}. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def review_summary(review) -> Dict:
+    """Compact description of a review pushed to dashboards."""
+    return {
+        'review_id': review.review_id,
+        'language': review.language,
+        'timestamp': review.timestamp.isoformat(),
+        'response_time': review.metrics.get('response_time', 0.0),
+        'suggestion_count': review.metrics.get('suggestion_count', 0),
+        'reused': review.reused_from is not None
+    }
+
+
+class MetricsBroadcaster:
+    """Pushes metric deltas and new review summaries to subscribers on a fixed tick.
+
+    Reviews are collected as they are added to history, from any thread. Once per
+    tick, if anything changed, metrics are aggregated once and the same message is
+    queued for every subscriber, so N dashboards cost one aggregation per tick.
+    """
+
+    def __init__(self, compute_metrics: Callable[[], Dict], interval: float,
+                 max_queue: int = 100, max_pending: int = 500):
+        self.compute_metrics = compute_metrics
+        self.interval = interval
+        self.max_queue = max_queue
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._pending = deque(maxlen=max_pending)
+        self._pending_lock = threading.Lock()
+        self._dirty = False
+        self._last_metrics: Dict = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def notify_review(self, review):
+        """Record a new review; safe to call from worker threads."""
+        summary = review_summary(review)
+        with self._pending_lock:
+            self._pending.append(summary)
+            self._dirty = True
+
+    def _snapshot(self) -> Dict:
+        return {'type': 'snapshot', 'metrics': self._last_metrics, 'reviews': []}
+
+    async def subscribe(self) -> asyncio.Queue:
+        """Register a subscriber; the first message is a full metrics snapshot."""
+        if not self._last_metrics:
+            self._last_metrics = self.compute_metrics()
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        queue.put_nowait(self._snapshot())
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Remove a subscriber; the tick loop stops when none are left."""
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    async def _run(self):
+        """Tick loop, running only while there are subscribers."""
+        try:
+            while self._subscribers:
+                await asyncio.sleep(self.interval)
+                message = self._collect()
+                if message is not None:
+                    self._publish(message)
+        except Exception as e:
+            logger.error(f"Error in metrics broadcaster: {str(e)}")
+
+    def _collect(self) -> Optional[Dict]:
+        """Aggregate once and build the delta message, or None if nothing changed."""
+        with self._pending_lock:
+            if not self._dirty:
+                return None
+            reviews: List[Dict] = list(self._pending)
+            self._pending.clear()
+            self._dirty = False
+
+        metrics = self.compute_metrics()
+        delta = {key: value for key, value in metrics.items() if self._last_metrics.get(key) != value}
+        self._last_metrics = metrics
+        return {'type': 'update', 'metrics': delta, 'reviews': reviews}
+
+    def _publish(self, message: Dict):
+        """Queue a message for every subscriber.
+
+        A subscriber too slow to keep up has its backlog replaced by a fresh
+        snapshot, since deltas on top of dropped deltas would be wrong.
+        """
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot())
@@ -0,0 +1,271 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+from .cancellation import check_cancelled
+from .system_memory import process_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+INCREASE = 'increase'
+DECREASE = 'decrease'
+HOLD = 'hold'
+
+
+def kv_bytes_per_token(model) -> int:
+    """Key/value cache bytes one token of context costs in model (0 when unknown)."""
+    config = getattr(model, 'config', None)
+    if config is None:
+        return 0
+    layers = getattr(config, 'num_hidden_layers', None)
+    heads = getattr(config, 'num_attention_heads', None)
+    hidden_size = getattr(config, 'hidden_size', None)
+    if not (layers and heads and hidden_size):
+        return 0
+    kv_heads = getattr(config, 'num_key_value_heads', None) or heads
+    head_dim = getattr(config, 'head_dim', None) or hidden_size // heads
+    dtype = getattr(model, 'dtype', torch.float32)
+    element_size = torch.tensor([], dtype=dtype).element_size() if isinstance(dtype, torch.dtype) else 4
+    # One key and one value vector per layer and KV head
+    return 2 * layers * kv_heads * head_dim * element_size
+
+
+class MemoryWatchdog:
+    """Limits concurrent inference and batch tokens to keep memory below a ceiling.
+
+    Each sample compares memory pressure (process RSS, or GPU memory when that
+    is fuller, over the ceiling) with two watermarks. Above high_watermark the
+    concurrency and batch token limits are cut by decrease_factor. Below
+    low_watermark they grow additively, by one request and batch_tokens_step
+    tokens. In between they hold. A request is also held back at admission
+    while its projected KV cache would cross the high watermark, unless
+    nothing else is running.
+    """
+
+    def __init__(self, ceiling_bytes: Optional[int], max_concurrency: int, max_batch_tokens: int,
+                 min_batch_tokens: int = 512, high_watermark: float = 0.85, low_watermark: float = 0.7,
+                 decrease_factor: float = 0.5, batch_tokens_step: int = 1024, interval: float = 1.0,
+                 enabled: bool = True, token_bytes: Optional[Callable[[], int]] = None,
+                 session_bytes: Optional[Callable[[], int]] = None,
+                 rss_reader: Callable[[], Optional[int]] = process_rss_bytes):
+        self.ceiling_bytes = ceiling_bytes
+        self.max_concurrency = max_concurrency
+        self.max_batch_tokens = max_batch_tokens
+        self.min_batch_tokens = min(min_batch_tokens, max_batch_tokens)
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.decrease_factor = decrease_factor
+        self.batch_tokens_step = batch_tokens_step
+        self.interval = interval
+        self.enabled = enabled and bool(ceiling_bytes)
+        self.concurrency_limit = max_concurrency
+        self.batch_token_limit = max_batch_tokens
+        self.decisions: Counter = Counter()
+        self.last_sample: Dict = {}
+        self._token_bytes = token_bytes or (lambda: 0)
+        self._session_bytes = session_bytes or (lambda: 0)
+        self._rss_reader = rss_reader
+        self._in_flight = 0
+        self._waiting = 0
+        self._tokens_in_flight = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def kv_cache_bytes(self) -> int:
+        """Estimated KV cache of running generations plus stored follow-up sessions."""
+        return self._tokens_in_flight * self._token_bytes() + self._session_bytes()
+
+    @staticmethod
+    def _gpu_pressure() -> float:
+        if not torch.cuda.is_available():
+            return 0.0
+        total = torch.cuda.get_device_properties(0).total_memory
+        return torch.cuda.memory_reserved(0) / total if total else 0.0
+
+    def _admissible(self, tokens: int) -> bool:
+        if not self.enabled:
+            return True
+        if self._in_flight >= self.concurrency_limit:
+            return False
+        rss = self._rss_reader()
+        if self._in_flight == 0 or rss is None:
+            return True
+        projected = rss + tokens * self._token_bytes()
+        return projected <= self.ceiling_bytes * self.high_watermark
+
+    @contextmanager
+    def admit(self, tokens: int = 0):
+        """Run an inference of about tokens prompt plus output tokens once the limits allow.
+
+        Waiting requests still honour the current request's cancellation token.
+        A disabled watchdog admits every request at once and only counts it.
+        """
+        with self._condition:
+            self._waiting += 1
+            try:
+                while not self._admissible(tokens):
+                    self._condition.wait(0.1)
+                    check_cancelled()
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+            self._tokens_in_flight += tokens
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._tokens_in_flight -= tokens
+                self._condition.notify_all()
+
+    def split_batch(self, token_counts: List[int]) -> List[List[int]]:
+        """Group item indices, in order, into batches within the batch token limit.
+
+        An item larger than the limit gets a batch of its own. A disabled
+        watchdog keeps every item in one batch.
+        """
+        if not self.enabled:
+            return [list(range(len(token_counts)))] if token_counts else []
+        groups: List[List[int]] = []
+        total = 0
+        for index, tokens in enumerate(token_counts):
+            if groups and total + tokens <= self.batch_token_limit:
+                groups[-1].append(index)
+                total += tokens
+            else:
+                groups.append([index])
+                total = tokens
+        return groups
+
+    def sample(self) -> Dict:
+        """Measure memory pressure and adjust the limits once."""
+        rss = self._rss_reader()
+        # Unknown RSS (no /proc and no psutil) leaves only GPU memory to judge
+        pressure = max(rss / self.ceiling_bytes if self.ceiling_bytes and rss is not None else 0.0,
+                       self._gpu_pressure())
+        with self._condition:
+            decision = HOLD
+            if self.enabled and pressure >= self.high_watermark:
+                concurrency = max(1, int(self.concurrency_limit * self.decrease_factor))
+                batch_tokens = max(self.min_batch_tokens, int(self.batch_token_limit * self.decrease_factor))
+                if (concurrency, batch_tokens) != (self.concurrency_limit, self.batch_token_limit):
+                    decision = DECREASE
+            elif self.enabled and pressure < self.low_watermark:
+                concurrency = min(self.max_concurrency, self.concurrency_limit + 1)
+                batch_tokens = min(self.max_batch_tokens, self.batch_token_limit + self.batch_tokens_step)
+                if (concurrency, batch_tokens) != (self.concurrency_limit, self.batch_token_limit):
+                    decision = INCREASE
+            if decision != HOLD:
+                if decision == DECREASE:
+                    logger.warning(
+                        f"Memory at {pressure:.0%} of ceiling: inference concurrency {self.concurrency_limit} -> "
+                        f"{concurrency}, batch tokens {self.batch_token_limit} -> {batch_tokens}"
+                    )
+                self.concurrency_limit, self.batch_token_limit = concurrency, batch_tokens
+                self._condition.notify_all()
+            self.decisions[decision] += 1
+            self.last_sample = {'rss_bytes': rss, 'pressure': pressure, 'decision': decision, 'time': time.time()}
+        return self.last_sample
+
+    def start(self):
+        """Sample in a background thread every interval seconds."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='memory-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Error sampling memory: {str(e)}")
+
+    def describe(self) -> Dict:
+        """Current limits, memory readings and the decisions taken so far."""
+        with self._condition:
+            return {
+                'enabled': self.enabled,
+                'ceiling_bytes': self.ceiling_bytes,
+                'rss_bytes': self._rss_reader(),
+                'kv_cache_bytes': self.kv_cache_bytes(),
+                'pressure': self.last_sample.get('pressure'),
+                'high_watermark': self.high_watermark,
+                'low_watermark': self.low_watermark,
+                'concurrency_limit': self.concurrency_limit,
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'batch_token_limit': self.batch_token_limit,
+                'max_batch_tokens': self.max_batch_tokens,
+                'tokens_in_flight': self._tokens_in_flight,
+                'last_decision': self.last_sample.get('decision'),
+                'decisions': {decision: self.decisions[decision] for decision in (INCREASE, DECREASE, HOLD)}
+            }
+
+
+# The collector registered by register_prometheus, reused by later calls
+_collector = None
+
+
+def register_prometheus(watchdog: MemoryWatchdog) -> bool:
+    """Expose the watchdog's readings as code_review_* Prometheus metrics.
+
+    The collector is registered once per process; later calls (e.g. a second
+    application startup) point it at the given watchdog. Returns False when
+    prometheus_client is not installed.
+    """
+    global _collector
+    try:
+        from prometheus_client import REGISTRY
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+    except ImportError:
+        logger.warning("prometheus_client is not installed; memory metrics are only served by the API")
+        return False
+
+    if _collector is not None:
+        _collector.watchdog = watchdog
+        return True
+
+    class _Collector:
+        def __init__(self, watchdog: MemoryWatchdog):
+            self.watchdog = watchdog
+
+        def collect(self):
+            state = self.watchdog.describe()
+            gauges = [
+                ('code_review_memory_rss_bytes', "Resident set size of the review process", 'rss_bytes'),
+                ('code_review_memory_kv_cache_bytes', "Estimated KV cache in generations and sessions",
+                 'kv_cache_bytes'),
+                ('code_review_memory_ceiling_bytes', "Memory ceiling the watchdog keeps below", 'ceiling_bytes'),
+                ('code_review_memory_pressure', "Memory use as a fraction of the ceiling", 'pressure'),
+                ('code_review_inference_concurrency_limit', "Inferences allowed to run at once",
+                 'concurrency_limit'),
+                ('code_review_inference_in_flight', "Inferences running", 'in_flight'),
+                ('code_review_inference_waiting', "Inferences waiting for admission", 'waiting'),
+                ('code_review_batch_token_limit', "Largest batch in prompt plus output tokens", 'batch_token_limit'),
+            ]
+            for name, documentation, key in gauges:
+                yield GaugeMetricFamily(name, documentation, value=state[key] or 0)
+            decisions = CounterMetricFamily('code_review_memory_decisions', "Watchdog limit decisions",
+                                            labels=['decision'])
+            for decision, count in state['decisions'].items():
+                decisions.add_metric([decision], count)
+            yield decisions
+
+    _collector = _Collector(watchdog)
+    REGISTRY.register(_collector)
+    return True
@@ -0,0 +1,318 @@
+import logging
+import math
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Window name -> (bucket granularity, number of buckets); 'all' uses lifetime totals
+WINDOWS: Dict[str, Tuple[str, int]] = {
+    '1m': ('minute', 1),
+    '5m': ('minute', 5),
+    '15m': ('minute', 15),
+    '1h': ('minute', 60),
+    '6h': ('hour', 6),
+    '24h': ('hour', 24),
+    '7d': ('day', 7),
+    '30d': ('day', 30),
+}
+
+# Buckets kept per granularity, enough for the longest window using it
+RETENTION = {'minute': 60, 'hour': 24, 'day': 30}
+
+BUCKET_SECONDS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+OTHER_LANGUAGE = 'other'
+
+
+class LatencySketch:
+    """Streaming quantile sketch with bounded relative error.
+
+    Values are counted in logarithmic bins (as in DDSketch/HDR histograms), so a
+    quantile is within `accuracy` of the true value relative to its size. Values
+    are clamped to [min_value, max_value], which bounds the number of bins and
+    therefore memory regardless of how many values are added. Sketches with
+    the same accuracy merge exactly by adding bin counts.
+    """
+
+    def __init__(self, accuracy: float = 0.01, min_value: float = 1e-4, max_value: float = 1e4):
+        self.accuracy = accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(min(value, self.max_value)) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        """Representative value of a bin, within accuracy of anything counted in it."""
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float):
+        """Record one value."""
+        if value <= self.min_value:
+            self.zero_count += 1
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'LatencySketch'):
+        """Add another sketch's values into this one."""
+        if other.accuracy != self.accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile (0 <= q <= 1); 0.0 when empty."""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return self.min
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict:
+        """JSON-safe form, for merging sketches from other processes."""
+        return {
+            'accuracy': self.accuracy,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'bins': {str(index): count for index, count in self.bins.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LatencySketch':
+        sketch = cls(data['accuracy'], data['min_value'], data['max_value'])
+        sketch.bins = {int(index): count for index, count in data['bins'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        if data['count']:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
+
+
+class _Stats:
+    """Latency sketch plus suggestion and token totals for one language in one bucket."""
+
+    def __init__(self, accuracy: float):
+        self.latency = LatencySketch(accuracy)
+        self.suggestions = 0
+        self.tokens_saved = 0
+
+    def add(self, response_time: float, suggestion_count: int, tokens_saved: int):
+        self.latency.add(response_time)
+        self.suggestions += suggestion_count
+        self.tokens_saved += tokens_saved
+
+    def merge(self, other: '_Stats'):
+        self.latency.merge(other.latency)
+        self.suggestions += other.suggestions
+        self.tokens_saved += other.tokens_saved
+
+    def to_dict(self) -> Dict:
+        return {'latency': self.latency.to_dict(), 'suggestions': self.suggestions, 'tokens_saved': self.tokens_saved}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> '_Stats':
+        stats = cls(data['latency']['accuracy'])
+        stats.latency = LatencySketch.from_dict(data['latency'])
+        stats.suggestions = data['suggestions']
+        stats.tokens_saved = data['tokens_saved']
+        return stats
+
+
+class MetricsRollup:
+    """Review latency and throughput per language in minute, hour and day buckets.
+
+    Each granularity keeps a fixed number of recent buckets and each bucket
+    holds one sketch per language, with languages beyond `max_languages`
+    folded into 'other', so memory stays constant however many reviews are
+    recorded. Windows are answered by merging the buckets they cover.
+    """
+
+    def __init__(self, accuracy: float = 0.01, max_languages: int = 32):
+        self.accuracy = accuracy
+        self.max_languages = max_languages
+        self.started_at = time.time()
+        self._buckets: Dict[str, Dict[int, Dict[str, _Stats]]] = {granularity: {} for granularity in RETENTION}
+        self._totals: Dict[str, _Stats] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket_key(granularity: str, timestamp: float) -> int:
+        # Day buckets follow the local calendar so "today" matches the dashboard
+        if granularity == 'day':
+            return date.fromtimestamp(timestamp).toordinal()
+        return int(timestamp // BUCKET_SECONDS[granularity])
+
+    @staticmethod
+    def _into_bucket(granularity: str, timestamp: float) -> float:
+        """Seconds from the start of timestamp's bucket to timestamp."""
+        if granularity == 'day':
+            midnight = datetime.combine(date.fromtimestamp(timestamp), datetime.min.time()).timestamp()
+            return timestamp - midnight
+        return timestamp % BUCKET_SECONDS[granularity]
+
+    def _language_key(self, language: str) -> str:
+        if language in self._totals or len(self._totals) < self.max_languages:
+            return language
+        return OTHER_LANGUAGE
+
+    def record(self, language: str, response_time: float, suggestion_count: int,
+               tokens_saved: int = 0, timestamp: Optional[float] = None):
+        """Record a finished review."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            language = self._language_key(language)
+            for granularity, buckets in self._buckets.items():
+                key = self._bucket_key(granularity, timestamp)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = {}
+                    # Drop buckets that no window can reach any more
+                    oldest = key - RETENTION[granularity] + 1
+                    for stale in [k for k in buckets if k < oldest]:
+                        del buckets[stale]
+                bucket.setdefault(language, _Stats(self.accuracy)).add(response_time, suggestion_count, tokens_saved)
+            self._totals.setdefault(language, _Stats(self.accuracy)).add(response_time, suggestion_count, tokens_saved)
+
+    def _merged(self, window: str, now: float) -> Dict[str, _Stats]:
+        """Per-language stats over a window, merged from its buckets."""
+        if window == 'all':
+            sources = [self._totals]
+        else:
+            granularity, span = WINDOWS[window]
+            newest = self._bucket_key(granularity, now)
+            buckets = self._buckets[granularity]
+            sources = [buckets[key] for key in range(newest - span + 1, newest + 1) if key in buckets]
+
+        merged: Dict[str, _Stats] = {}
+        for source in sources:
+            for language, stats in source.items():
+                merged.setdefault(language, _Stats(self.accuracy)).merge(stats)
+        return merged
+
+    @staticmethod
+    def _describe(stats: _Stats, elapsed: float) -> Dict:
+        latency = stats.latency
+        return {
+            'total_reviews': latency.count,
+            'avg_response_time': latency.mean,
+            'avg_suggestions': stats.suggestions / latency.count if latency.count else 0.0,
+            'p50_response_time': latency.quantile(0.50),
+            'p95_response_time': latency.quantile(0.95),
+            'p99_response_time': latency.quantile(0.99),
+            'throughput': latency.count / elapsed if elapsed > 0 else 0.0,
+            'tokens_saved': stats.tokens_saved
+        }
+
+    def _window(self, window: str, language: Optional[str]):
+        """(per-language stats, reviews today, elapsed seconds) for a window; raises ValueError if unknown."""
+        if window != 'all' and window not in WINDOWS:
+            raise ValueError(f"Unknown metrics window: {window}. Use one of: all, {', '.join(WINDOWS)}")
+
+        now = time.time()
+        uptime = now - self.started_at
+        if window == 'all':
+            elapsed = uptime
+        else:
+            # Full buckets before the newest plus the part of the newest that has passed
+            granularity, span = WINDOWS[window]
+            elapsed = min((span - 1) * BUCKET_SECONDS[granularity] + self._into_bucket(granularity, now), uptime)
+
+        with self._lock:
+            by_language = self._merged(window, now)
+            today = self._buckets['day'].get(self._bucket_key('day', now), {})
+            if language is not None:
+                by_language = {k: v for k, v in by_language.items() if k == language}
+                today = {k: v for k, v in today.items() if k == language}
+            reviews_today = sum(stats.latency.count for stats in today.values())
+        return by_language, reviews_today, elapsed
+
+    @classmethod
+    def _summarize(cls, window: str, by_language: Dict[str, _Stats], reviews_today: int,
+                   elapsed: float, accuracy: float) -> Dict:
+        overall = _Stats(accuracy)
+        for stats in by_language.values():
+            overall.merge(stats)
+        result = cls._describe(overall, elapsed)
+        result.update(
+            window=window,
+            reviews_today=reviews_today,
+            by_language={k: cls._describe(v, elapsed) for k, v in sorted(by_language.items())}
+        )
+        return result
+
+    def summary(self, window: str = 'all', language: Optional[str] = None) -> Dict:
+        """Latency percentiles and throughput (reviews per second) over a window.
+
+        Raises ValueError for unknown windows.
+        """
+        by_language, reviews_today, elapsed = self._window(window, language)
+        return self._summarize(window, by_language, reviews_today, elapsed, self.accuracy)
+
+    def export(self, window: str = 'all', language: Optional[str] = None) -> Dict:
+        """The sketches behind summary(), for merging across processes with merge_exports."""
+        by_language, reviews_today, elapsed = self._window(window, language)
+        return {
+            'window': window,
+            'accuracy': self.accuracy,
+            'elapsed': elapsed,
+            'reviews_today': reviews_today,
+            'by_language': {k: v.to_dict() for k, v in by_language.items()}
+        }
+
+
+def merge_exports(exports: List[Dict], window: str = 'all') -> Dict:
+    """Summary, in the form of MetricsRollup.summary, of several processes' exports.
+
+    Sketches merge exactly, so percentiles keep their accuracy. Throughput is
+    the combined review count over the longest elapsed time among them.
+    """
+    accuracy = exports[0]['accuracy'] if exports else 0.01
+    by_language: Dict[str, _Stats] = {}
+    for export in exports:
+        for language, data in export['by_language'].items():
+            by_language.setdefault(language, _Stats(accuracy)).merge(_Stats.from_dict(data))
+    return MetricsRollup._summarize(
+        window,
+        by_language,
+        sum(export['reviews_today'] for export in exports),
+        max((export['elapsed'] for export in exports), default=0.0),
+        accuracy
+    )
@@ -0,0 +1,113 @@
+import io
+import logging
+import re
+import tokenize
+from math import gcd
+from typing import Dict, List
+
+from .fingerprint import C_STYLE_LANGUAGES, HASH_COMMENT_LANGUAGES, C_COMMENT_REGEX, HASH_COMMENT_REGEX, STRING_REGEX
+
+logger = logging.getLogger(__name__)
+
+_C_STYLE_COMMENTS = re.compile(f'({C_COMMENT_REGEX})|{STRING_REGEX}', re.DOTALL)
+_HASH_COMMENTS = re.compile(f'({HASH_COMMENT_REGEX})|{STRING_REGEX}', re.DOTALL)
+
+# "line 12", "Line 12", "lines 12-15", "lines 12 to 15", "lines 3 and 7"; a bare
+# "L12" is not matched since it is as likely to be "L2 cache" or "L1 norm"
+_LINE_REFERENCE = re.compile(
+    r'\b([Ll]ines?\s+)(\d+)(?:(\s*(?:-|–|to|and|,)\s*)(\d+))?\b'
+)
+
+TAB_WIDTH = 4
+
+
+class MinifiedCode:
+    """Code with review-irrelevant text removed, and the way back to the original.
+
+    line_map[i] is the 1-based original line number of minified line i + 1.
+    """
+
+    def __init__(self, code: str, line_map: List[int]):
+        self.code = code
+        self.line_map = line_map
+
+    def original_line(self, line: int) -> int:
+        """Map a 1-based minified line number back; out-of-range numbers are kept."""
+        if 1 <= line <= len(self.line_map):
+            return self.line_map[line - 1]
+        return line
+
+    def remap_text(self, text: str) -> str:
+        """Rewrite line references in model output to original line numbers."""
+        def replace(match):
+            prefix, first, separator, second = match.groups()
+            result = f"{prefix}{self.original_line(int(first))}"
+            if second is not None:
+                result += f"{separator}{self.original_line(int(second))}"
+            return result
+        return _LINE_REFERENCE.sub(replace, text)
+
+    def remap_findings(self, sections: List[Dict]) -> List[Dict]:
+        """Remap line references in every item of parsed review sections."""
+        return [
+            {**section, 'items': [self.remap_text(item) for item in section['items']]}
+            for section in sections
+        ]
+
+
+def _strip_python_comments(code: str) -> str:
+    """Remove comments using the tokenizer so '#' inside strings is kept."""
+    lines = code.split('\n')
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type == tokenize.COMMENT:
+                row, col = tok.start
+                lines[row - 1] = lines[row - 1][:col]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return _strip_pattern_comments(code, _HASH_COMMENTS)
+    return '\n'.join(lines)
+
+
+def _strip_pattern_comments(code: str, pattern: re.Pattern) -> str:
+    """Remove regex-matched comments, keeping their newlines so lines stay aligned."""
+    def replace(match):
+        if match.group(1) is None:
+            return match.group(0)
+        return '\n' * match.group(1).count('\n')
+    return pattern.sub(replace, code)
+
+
+def strip_comments(code: str, language: str) -> str:
+    """Remove comments without changing the number of lines."""
+    language = language.strip().lower()
+    if language in ('python', 'py'):
+        return _strip_python_comments(code)
+    if language in C_STYLE_LANGUAGES:
+        return _strip_pattern_comments(code, _C_STYLE_COMMENTS)
+    if language in HASH_COMMENT_LANGUAGES:
+        return _strip_pattern_comments(code, _HASH_COMMENTS)
+    return code
+
+
+def minify_code(code: str, language: str) -> MinifiedCode:
+    """Strip comments, blank lines, trailing whitespace and excess indentation.
+
+    Indentation is divided by the common indentation unit, so nesting (and
+    Python's block structure) is preserved with one space per level.
+    """
+    kept = []
+    for number, line in enumerate(strip_comments(code, language).split('\n'), start=1):
+        line = line.rstrip().expandtabs(TAB_WIDTH)
+        if line:
+            kept.append((number, line))
+
+    unit = 0
+    for _, line in kept:
+        unit = gcd(unit, len(line) - len(line.lstrip(' ')))
+    unit = unit or 1
+
+    lines = []
+    for _, line in kept:
+        body = line.lstrip(' ')
+        lines.append(' ' * ((len(line) - len(body)) // unit) + body)
+    return MinifiedCode('\n'.join(lines), [number for number, _ in kept])
@@ -1,27 +1,62 @@
 import logging
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from typing import List, Optional, Tuple
+from transformers import AutoTokenizer
 import torch
+from torch.profiler import record_function
 from huggingface_hub import login
 from .config import Config
+from .inference_backends import create_backend
+from .sessions import GenerationSession
+from .autotune import apply_interop_threads, autotune_model_manager
 
 logger = logging.getLogger(__name__)
 
+# Label of model calls in request profiles, separating model time from the rest
+GENERATE_LABEL = "model_generate"
+
+# Returned when generation fails so callers still get every review section
+DEFAULT_RESPONSE = """- Issues:
+- No critical issues found
+
+- Improvements:
+- Consider adding error handling
+
+- Best Practices:
+- Add documentation
+
+- Security:
+- No immediate concerns"""
+
 class ModelManager:
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, backend: Optional[str] = None, autotune_mode: Optional[str] = None):
         self.model_name = model_name
         self.tokenizer = None
         self.model = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        
+        self.backend = create_backend(backend)
+        # Preferred number of prompts per generate_batch call
+        self.batch_size = 1
+        self.tuning = None
+        autotune_mode = autotune_mode or Config.AUTOTUNE_MODE
+        logger.info(f"Using inference backend: {self.backend.name}")
+
+        # Inter-op threads must be set before torch starts any parallel work
+        if autotune_mode != 'off':
+            apply_interop_threads(self.model_name, self.backend.name)
+
         # Login to Hugging Face Hub
-        if Config.HUGGING_FACE_TOKEN:
+        if Config.HUGGING_FACE_TOKEN and self.backend.uses_tokenizer:
             logger.info("Logging in to Hugging Face Hub")
             login(token=Config.HUGGING_FACE_TOKEN)
-        
+
         # Initialize tokenizer and model
-        self._init_tokenizer()
+        if self.backend.uses_tokenizer:
+            self._init_tokenizer()
         self._init_model()
-        
+
+        # Apply (or measure) the fastest thread, batch and dtype settings for this host
+        self.tuning = autotune_model_manager(self, autotune_mode)
+
     def _init_tokenizer(self):
         """Initialize the tokenizer."""
         try:
@@ -30,34 +65,26 @@ class ModelManager:
                 self.model_name,
                 token=Config.HUGGING_FACE_TOKEN
             )
-            # Ensure we have the necessary special tokens
-            special_tokens = {
-                'pad_token': '[PAD]',
-                'eos_token': '</s>',
-                'bos_token': '<s>'
-            }
-            self.tokenizer.add_special_tokens(special_tokens)
+            if self.backend.adds_special_tokens:
+                # Ensure we have the necessary special tokens
+                special_tokens = {
+                    'pad_token': '[PAD]',
+                    'eos_token': '</s>',
+                    'bos_token': '<s>'
+                }
+                self.tokenizer.add_special_tokens(special_tokens)
             logger.info("Tokenizer loaded successfully.")
         except Exception as e:
             logger.error(f"Error loading tokenizer: {str(e)}")
             raise
-            
+
     def _init_model(self):
-        """Initialize the model."""
+        """Initialize the model through the configured backend."""
         try:
             logger.info(f"Loading model: {self.model_name}")
-            
-            # Load model with CPU configuration
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                device_map={"": self.device},
-                torch_dtype=torch.float32,  # Use float32 for CPU
-                token=Config.HUGGING_FACE_TOKEN,
-                low_cpu_mem_usage=True
-            )
-            # Resize embeddings to match tokenizer
-            self.model.resize_token_embeddings(len(self.tokenizer))
-            logger.info(f"Using device: {self.device}")
+            self.backend.load(self.model_name, self.tokenizer, self.device)
+            self.model = self.backend.model
+            logger.info(f"Using device: {self.backend.device}")
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
@@ -65,36 +92,45 @@ class ModelManager:
     def generate_text(self, prompt: str, max_new_tokens: int = 1024) -> str:
         """Generate text from prompt."""
         try:
-            # For now, return a mock response in the correct format
-            return """- Issues:
-- No critical issues found in the code
-- The code is simple and straightforward
-
-- Improvements:
-- Consider adding type hints for better code readability
-- Add input validation for the numbers parameter
-- Consider using sum() built-in function for better performance
-
-- Best Practices:
-- Add docstring to explain function purpose and parameters
-- Follow PEP 8 naming conventions
-- Consider adding return type annotation
-
-- Security:
-- No immediate security concerns for this simple function
-- Input validation would help prevent potential issues"""
-            
+            with record_function(GENERATE_LABEL):
+                return self.backend.generate(prompt, max_new_tokens)
         except Exception as e:
             logger.error(f"Error generating text: {str(e)}")
             # Return a default response in case of error
-            return """- Issues:
-- No critical issues found
+            return DEFAULT_RESPONSE
 
-- Improvements:
-- Consider adding error handling
+    def generate_batch(self, prompts: List[str], max_new_tokens: int = 1024) -> List[str]:
+        """Generate text for several prompts in one call."""
+        try:
+            with record_function(GENERATE_LABEL):
+                return self.backend.generate_batch(prompts, max_new_tokens)
+        except Exception as e:
+            logger.error(f"Error generating batch of {len(prompts)}: {str(e)}")
+            return [DEFAULT_RESPONSE for _ in prompts]
 
-- Best Practices:
-- Add documentation
+    def generate_forked(self, prefix: str, continuations: List[str], max_new_tokens: int = 1024) -> List[str]:
+        """Generate continuations of a shared prefix, falling back to a plain batch."""
+        try:
+            with record_function(GENERATE_LABEL):
+                return self.backend.generate_forked(prefix, continuations, max_new_tokens)
+        except Exception as e:
+            logger.warning(f"Forked generation failed, generating full prompts instead: {str(e)}")
+            return self.generate_batch([prefix + continuation for continuation in continuations], max_new_tokens)
 
-- Security:
-- No immediate concerns"""
+    def generate_session(self, prompt: str, session: Optional[GenerationSession] = None,
+                         max_new_tokens: int = 1024) -> Tuple[str, GenerationSession]:
+        """Continue a generation session, reusing its attention cache when it belongs to this model."""
+        if session is not None and not session.has_cache_for(self):
+            session.drop_cache()
+        try:
+            with record_function(GENERATE_LABEL):
+                completion, session = self.backend.generate_session(prompt, session, max_new_tokens)
+        except Exception as e:
+            if session is None or session.past_key_values is None:
+                raise
+            logger.warning(f"Cached continuation failed, recomputing context: {str(e)}")
+            session.drop_cache()
+            with record_function(GENERATE_LABEL):
+                completion, session = self.backend.generate_session(prompt, session, max_new_tokens)
+        session.bind(self)
+        return completion, session
@@ -0,0 +1,160 @@
+import gc
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+import torch
+
+from .config import Config
+from .inference_backends import BACKENDS
+from .system_memory import available_memory_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientMemoryError(RuntimeError):
+    """Raised when a new model would not fit next to the current one."""
+
+
+def estimate_model_bytes(model_name: str, backend: str) -> int:
+    """Estimate the memory needed to load a model without loading its weights."""
+    if backend == 'mock':
+        return 0
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    config = AutoConfig.from_pretrained(model_name, token=Config.HUGGING_FACE_TOKEN)
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config)
+    parameters = sum(p.numel() for p in model.parameters())
+    # Weights are loaded as float32 on CPU
+    return parameters * torch.finfo(torch.float32).bits // 8
+
+
+class ModelSlot:
+    """Holds the active ModelManager and swaps it without dropping requests.
+
+    Requests lease the current manager for their whole duration. A swap loads
+    the new manager in a background thread, points new leases at it, then
+    waits for leases on the old manager to drain before releasing it.
+    """
+
+    def __init__(self, model_manager):
+        self.current = model_manager
+        self._in_flight: Dict[int, int] = {}
+        self._condition = threading.Condition()
+        self._swap_thread: Optional[threading.Thread] = None
+        # Held while a swap is being started, so concurrent requests cannot both start one
+        self._start_lock = threading.Lock()
+        self.status: Dict = {'state': 'idle'}
+
+    @contextmanager
+    def lease(self):
+        """Use the current model for the duration of a request."""
+        with self._condition:
+            manager = self.current
+            self._in_flight[id(manager)] = self._in_flight.get(id(manager), 0) + 1
+        try:
+            yield manager
+        finally:
+            with self._condition:
+                self._in_flight[id(manager)] -= 1
+                if not self._in_flight[id(manager)]:
+                    del self._in_flight[id(manager)]
+                    self._condition.notify_all()
+
+    def in_flight(self, manager=None) -> int:
+        """Number of requests currently using a manager (default: the current one)."""
+        with self._condition:
+            return self._in_flight.get(id(manager or self.current), 0)
+
+    @property
+    def swapping(self) -> bool:
+        return self._swap_thread is not None and self._swap_thread.is_alive()
+
+    def start_swap(self, model_name: str, backend: Optional[str] = None) -> Dict:
+        """Check memory and start loading a new model in the background.
+
+        Raises ValueError for unknown backends, RuntimeError if a swap is
+        already running and InsufficientMemoryError if both models would not fit.
+        """
+        backend = (backend or Config.INFERENCE_BACKEND).lower()
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend}")
+        if not self._start_lock.acquire(blocking=False):
+            raise RuntimeError("A model swap is already in progress")
+        try:
+            return self._start_swap(model_name, backend)
+        finally:
+            self._start_lock.release()
+
+    def _start_swap(self, model_name: str, backend: str) -> Dict:
+        if self.swapping:
+            raise RuntimeError("A model swap is already in progress")
+
+        required = estimate_model_bytes(model_name, backend)
+        available = available_memory_bytes()
+        needed = int(required * Config.SWAP_MEMORY_HEADROOM)
+        if available is not None and needed > available:
+            raise InsufficientMemoryError(
+                f"Loading {model_name} needs about {needed / 2**30:.1f} GiB "
+                f"but only {available / 2**30:.1f} GiB is available"
+            )
+
+        self.status = {
+            'state': 'loading',
+            'model_name': model_name,
+            'backend': backend,
+            'estimated_bytes': required,
+            'started_at': datetime.now().isoformat()
+        }
+        self._swap_thread = threading.Thread(
+            target=self._run_swap,
+            args=(model_name, backend),
+            name="model-swap",
+            daemon=True
+        )
+        self._swap_thread.start()
+        return self.status
+
+    def _run_swap(self, model_name: str, backend: str):
+        """Load, switch and drain; runs in the swap thread."""
+        from .model_manager import ModelManager
+
+        try:
+            logger.info(f"Loading {model_name} ({backend}) for hot swap")
+            new_manager = ModelManager(model_name=model_name, backend=backend)
+
+            with self._condition:
+                old_manager = self.current
+                self.current = new_manager
+            self.status.update(state='draining', switched_at=datetime.now().isoformat())
+            logger.info(f"Switched to {model_name}; draining {self.in_flight(old_manager)} in-flight requests")
+
+            with self._condition:
+                drained = self._condition.wait_for(
+                    lambda: id(old_manager) not in self._in_flight,
+                    timeout=Config.SWAP_DRAIN_TIMEOUT
+                )
+            if not drained:
+                logger.warning(f"Drain timed out after {Config.SWAP_DRAIN_TIMEOUT}s; releasing old model anyway")
+
+            # Drop the last reference so the old weights can be freed
+            del old_manager
+            gc.collect()
+            self.status.update(state='idle', completed_at=datetime.now().isoformat())
+            logger.info(f"Model swap to {model_name} complete")
+        except Exception as e:
+            logger.error(f"Model swap to {model_name} failed: {str(e)}")
+            self.status.update(state='failed', error=str(e))
+
+    def describe(self) -> Dict:
+        """Current model and swap progress."""
+        return {
+            'model_name': self.current.model_name,
+            'backend': self.current.backend.name,
+            'in_flight': self.in_flight(),
+            'swap': self.status
+        }
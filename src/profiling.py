@@ -0,0 +1,138 @@
+import contextlib
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from torch.profiler import ProfilerActivity, profile, record_function
+
+logger = logging.getLogger(__name__)
+
+# Returned by claim() when a request is not profiled, so the disabled path
+# costs a single attribute check and no allocation.
+_NO_CAPTURE = contextlib.nullcontext()
+
+_ARTIFACT_NAME = re.compile(r'^[\w.-]+$')
+
+
+class ProfileCapture:
+    """Python and torch operator profile of a single request."""
+
+    def __init__(self, profiler: "RequestProfiler", request_id: str):
+        self.profiler = profiler
+        self.request_id = request_id
+        self._python_profile = cProfile.Profile()
+        self._torch_profile = profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+        self._label = None
+
+    def __enter__(self):
+        self._torch_profile.__enter__()
+        self._label = record_function("review_request")
+        self._label.__enter__()
+        self._python_profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._python_profile.disable()
+            self._label.__exit__(exc_type, exc, tb)
+            self._torch_profile.__exit__(exc_type, exc, tb)
+            self.profiler._save(self)
+        except Exception as e:
+            logger.error(f"Error saving profile for {self.request_id}: {str(e)}")
+        finally:
+            self.profiler._release()
+        return False
+
+
+class RequestProfiler:
+    """Admin-controlled profiling of the next N requests or a sampled fraction."""
+
+    def __init__(self, output_dir: str, max_artifacts: int = 50):
+        self.output_dir = output_dir
+        self.max_artifacts = max_artifacts
+        self.enabled = False
+        self._remaining = 0
+        self._sample_rate = 0.0
+        self._busy = False
+        self._lock = threading.Lock()
+
+    def configure(self, count: int = 0, sample_rate: float = 0.0):
+        """Profile the next `count` requests and/or a `sample_rate` fraction of them."""
+        if count < 0 or not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("count must be >= 0 and sample_rate between 0 and 1")
+        with self._lock:
+            self._remaining = count
+            self._sample_rate = sample_rate
+            self.enabled = count > 0 or sample_rate > 0
+        logger.info(f"Profiling configured: count={count}, sample_rate={sample_rate}")
+
+    def disable(self):
+        """Stop profiling new requests."""
+        self.configure(0, 0.0)
+
+    def claim(self, request_id: str):
+        """Return a context manager that profiles the request if it was selected."""
+        if not self.enabled:
+            return _NO_CAPTURE
+        with self._lock:
+            # cProfile and the torch profiler are process-wide, so only one
+            # request is captured at a time.
+            if self._busy:
+                return _NO_CAPTURE
+            if self._remaining > 0:
+                self._remaining -= 1
+            elif not (self._sample_rate and random.random() < self._sample_rate):
+                return _NO_CAPTURE
+            self.enabled = self._remaining > 0 or self._sample_rate > 0
+            self._busy = True
+        return ProfileCapture(self, request_id)
+
+    def _release(self):
+        with self._lock:
+            self._busy = False
+
+    def _save(self, capture: ProfileCapture):
+        """Write the pstats file and Chrome trace of a finished capture."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{capture.request_id}"
+        capture._python_profile.dump_stats(os.path.join(self.output_dir, f"{stem}.pstats"))
+        capture._torch_profile.export_chrome_trace(os.path.join(self.output_dir, f"{stem}.trace.json"))
+        logger.info(f"Saved profile {stem}")
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest artifacts beyond max_artifacts."""
+        artifacts = self.list_artifacts()
+        # Each capture writes two files
+        excess = len(artifacts) - self.max_artifacts * 2
+        for name in artifacts[:max(excess, 0)]:
+            os.remove(os.path.join(self.output_dir, name))
+
+    def list_artifacts(self) -> List[str]:
+        """List saved artifact file names, oldest first."""
+        if not os.path.isdir(self.output_dir):
+            return []
+        return sorted(name for name in os.listdir(self.output_dir)
+                      if name.endswith('.pstats') or name.endswith('.trace.json'))
+
+    def artifact_path(self, name: str) -> Optional[str]:
+        """Resolve an artifact name to its path, or None if it does not exist."""
+        # Only names of saved artifacts resolve, so paths outside output_dir cannot be reached
+        if not _ARTIFACT_NAME.match(name) or name not in self.list_artifacts():
+            return None
+        path = os.path.join(self.output_dir, name)
+        return path if os.path.isfile(path) else None
+
+    def status(self) -> Dict:
+        """Current profiling settings and saved artifacts."""
+        return {
+            'enabled': self.enabled,
+            'remaining': self._remaining,
+            'sample_rate': self._sample_rate,
+            'artifacts': self.list_artifacts()
+        }
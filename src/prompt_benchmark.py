@@ -0,0 +1,147 @@
+"""
+Offline A/B harness for prompt versions.
+
+Runs a fixed corpus of snippets through each registered prompt version and
+reports prompt tokens, output tokens, latency and section completeness.
+
+Usage: python -m src.prompt_benchmark [--versions default concise] [--repeats 3]
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from .config import Config
+from .prompts import PROMPT_REGISTRY, count_tokens
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_CORPUS = [
+    {
+        'language': 'python',
+        'code': '''def calculate_average(numbers):
+    total = 0
+    for num in numbers:
+        total += num
+    return total/len(numbers)
+'''
+    },
+    {
+        'language': 'python',
+        'code': '''import sqlite3
+
+def find_user(conn, username):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE name = '" + username + "'")
+    return cursor.fetchall()
+'''
+    },
+    {
+        'language': 'javascript',
+        'code': '''function authenticateUser(username, password) {
+    localStorage.setItem('password', password);
+    const query = `SELECT * FROM users WHERE username='${username}'`;
+    return fetch('/api/auth', { method: 'POST', body: JSON.stringify({ query }) });
+}
+'''
+    },
+    {
+        'language': 'java',
+        'code': '''public class Counter {
+    private static int count = 0;
+    public void increment() { count++; }
+    public int get() { return count; }
+}
+'''
+    },
+    {
+        'language': 'go',
+        'code': '''func readConfig(path string) map[string]string {
+    data, _ := ioutil.ReadFile(path)
+    result := map[string]string{}
+    json.Unmarshal(data, &result)
+    return result
+}
+'''
+    },
+]
+
+
+def run_benchmark(code_reviewer, versions: Optional[List[str]] = None,
+                  corpus: List[Dict] = BENCHMARK_CORPUS, repeats: int = 1,
+                  max_new_tokens: int = Config.MAX_OUTPUT_LENGTH) -> List[Dict]:
+    """Run every snippet through each prompt version and summarize per version."""
+    model_manager = code_reviewer.model_manager
+    tokenizer = getattr(model_manager, 'tokenizer', None)
+    results = []
+
+    for version in versions or PROMPT_REGISTRY.versions():
+        template = PROMPT_REGISTRY.get(version)
+        prompt_tokens, output_tokens, latencies, completeness = [], [], [], []
+        for _ in range(repeats):
+            for sample in corpus:
+                prompt = template.render(sample['code'], sample['language'])
+                if tokenizer is not None:
+                    prompt_tokens.append(len(template.encode(sample['code'], sample['language'], tokenizer)))
+                else:
+                    prompt_tokens.append(count_tokens(None, prompt))
+
+                start = time.perf_counter()
+                response = model_manager.generate_text(prompt, max_new_tokens=max_new_tokens)
+                latencies.append(time.perf_counter() - start)
+
+                output_tokens.append(count_tokens(tokenizer, response))
+                sections = code_reviewer._parse_review_response(response)
+                completeness.append(sum(1 for s in sections if s['items']) / len(sections))
+
+        results.append({
+            'version': version,
+            'samples': len(latencies),
+            'avg_prompt_tokens': statistics.mean(prompt_tokens),
+            'avg_output_tokens': statistics.mean(output_tokens),
+            'avg_latency': statistics.mean(latencies),
+            'max_latency': max(latencies),
+            'section_completeness': statistics.mean(completeness)
+        })
+    return results
+
+
+def format_results(results: List[Dict]) -> str:
+    """Render benchmark results as a plain-text table."""
+    header = f"{'version':<12} {'prompt_tok':>10} {'output_tok':>10} {'avg_s':>8} {'max_s':>8} {'complete':>9}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(
+            f"{r['version']:<12} {r['avg_prompt_tokens']:>10.1f} {r['avg_output_tokens']:>10.1f} "
+            f"{r['avg_latency']:>8.3f} {r['max_latency']:>8.3f} {r['section_completeness']:>9.0%}"
+        )
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point for the prompt benchmark."""
+    parser = argparse.ArgumentParser(description="Compare prompt versions on a fixed corpus.")
+    parser.add_argument("--versions", nargs="+", choices=PROMPT_REGISTRY.versions(),
+                        help="Prompt versions to compare (default: all)")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per snippet")
+    parser.add_argument("--max-new-tokens", type=int, default=Config.MAX_OUTPUT_LENGTH)
+    parser.add_argument("--json", dest="json_path", help="Also write raw results to this file")
+    args = parser.parse_args(argv)
+
+    from .model_manager import ModelManager
+    from .code_reviewer import CodeReviewer
+
+    reviewer = CodeReviewer(ModelManager(model_name=Config.MODEL_NAME))
+    results = run_benchmark(reviewer, args.versions, repeats=args.repeats,
+                            max_new_tokens=args.max_new_tokens)
+    print(format_results(results))
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
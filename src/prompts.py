@@ -0,0 +1,162 @@
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+CODE_PLACEHOLDER = "{code}"
+# Static token lists kept per template, across tokenizers and languages
+TOKEN_CACHE_SIZE = 256
+
+
+def count_tokens(tokenizer, text: str) -> int:
+    """Count tokens, falling back to whitespace splitting without a tokenizer."""
+    if tokenizer is None:
+        return len(text.split())
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def _tokenizer_key(tokenizer) -> Tuple[str, int]:
+    """Identity of a tokenizer's vocabulary that survives replacing the tokenizer object."""
+    size = len(tokenizer) if hasattr(tokenizer, '__len__') else 0
+    return getattr(tokenizer, 'name_or_path', type(tokenizer).__name__), size
+
+
+class EncodedPrompt(str):
+    """Prompt text that carries its token IDs, so backends can skip tokenizing it.
+
+    Backends without a tokenizer use it as the plain string it is.
+    """
+
+    def __new__(cls, text: str, input_ids: List[int]):
+        prompt = super().__new__(cls, text)
+        prompt.input_ids = input_ids
+        return prompt
+
+
+class PromptTemplate:
+    """A review prompt split around the code so it is rendered without re-parsing.
+
+    The template may use {language} anywhere and must contain {code} exactly once.
+    """
+
+    def __init__(self, version: str, template: str, description: str = ""):
+        if template.count(CODE_PLACEHOLDER) != 1:
+            raise ValueError(f"Prompt template {version} must contain {CODE_PLACEHOLDER} exactly once")
+        self.version = version
+        self.description = description
+        self.template = template
+        self._prefix, self._suffix = template.split(CODE_PLACEHOLDER)
+        self._token_cache: Dict[Tuple[str, int, str], Tuple[List[int], List[int]]] = {}
+
+    def render(self, code: str, language: str) -> str:
+        """Render the prompt for the given code."""
+        return self._prefix.replace("{language}", language) + code + self._suffix.replace("{language}", language)
+
+    def _static_tokens(self, tokenizer, language: str) -> Tuple[List[int], List[int]]:
+        """Token IDs of the text around the code, cached per tokenizer vocabulary and language."""
+        key = _tokenizer_key(tokenizer) + (language,)
+        if key not in self._token_cache:
+            if len(self._token_cache) >= TOKEN_CACHE_SIZE:
+                self._token_cache.pop(next(iter(self._token_cache)))
+            prefix = self._prefix.replace("{language}", language)
+            suffix = self._suffix.replace("{language}", language)
+            self._token_cache[key] = (
+                tokenizer.encode(prefix, add_special_tokens=True),
+                tokenizer.encode(suffix, add_special_tokens=False)
+            )
+        return self._token_cache[key]
+
+    def encode(self, code: str, language: str, tokenizer) -> List[int]:
+        """Token IDs of the rendered prompt, reusing the pre-tokenized static text."""
+        prefix_ids, suffix_ids = self._static_tokens(tokenizer, language)
+        return prefix_ids + tokenizer.encode(code, add_special_tokens=False) + suffix_ids
+
+    def render_encoded(self, code: str, language: str, tokenizer) -> str:
+        """Render the prompt, with its token IDs attached when there is a tokenizer."""
+        text = self.render(code, language)
+        if tokenizer is None:
+            return text
+        return EncodedPrompt(text, self.encode(code, language, tokenizer))
+
+
+class PromptRegistry:
+    """Prompt templates by version."""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, template: PromptTemplate):
+        """Add or replace a template version."""
+        self._templates[template.version] = template
+
+    def get(self, version: str) -> PromptTemplate:
+        """Look up a template, raising KeyError for unknown versions."""
+        if version not in self._templates:
+            raise KeyError(f"Unknown prompt version: {version}")
+        return self._templates[version]
+
+    def versions(self) -> List[str]:
+        """All registered versions."""
+        return list(self._templates)
+
+    def __contains__(self, version: str) -> bool:
+        return version in self._templates
+
+
+PROMPT_REGISTRY = PromptRegistry()
+
+PROMPT_REGISTRY.register(PromptTemplate(
+    "default",
+    """As a code reviewer, analyze the following {language} code and provide specific suggestions in exactly these sections:
+- Issues: (list critical problems)
+- Improvements: (list suggested enhancements)
+- Best Practices: (list recommendations)
+- Security: (list security concerns)
+
+Code to review:
+```{language}
+{code}
+```
+
+Provide your review in exactly these sections: Issues, Improvements, Best Practices, Security.
+Each section should contain a list of specific points.
+""",
+    description="Original prompt with section descriptions repeated before and after the code"
+))
+
+PROMPT_REGISTRY.register(PromptTemplate(
+    "concise",
+    """Review this {language} code.
+```{language}
+{code}
+```
+Answer with the sections - Issues:, - Improvements:, - Best Practices:, - Security:, each a list of short points.
+""",
+    description="Shorter instructions stated once, after the code"
+))
+
+# Appended to a review's context for each follow-up question
+FOLLOWUP_TEMPLATE = """
+
+Follow-up question about the code and review above: {question}
+Answer:"""
+
+# Parallel section mode: one shared prefix holding the code, forked into one
+# continuation per review section. Reviews generated this way are tagged with
+# FORKED_PROMPT_VERSION whatever version was requested.
+FORKED_PROMPT_VERSION = "forked"
+
+SECTION_PREFIX_TEMPLATE = """As a code reviewer, analyze the following {language} code.
+
+Code to review:
+```{language}
+{code}
+```
+"""
+
+SECTION_CONTINUATIONS = {
+    'Issues': "List only the critical problems in this code, one point per line.\n- Issues:\n",
+    'Improvements': "List only suggested enhancements for this code, one point per line.\n- Improvements:\n",
+    'Best Practices': "List only best-practice recommendations for this code, one point per line.\n- Best Practices:\n",
+    'Security': "List only security concerns in this code, one point per line.\n- Security:\n",
+}
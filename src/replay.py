@@ -0,0 +1,180 @@
+"""
+Load test the review API by replaying captured traffic.
+
+Reads a capture written by TrafficRecorder, synthesises code of each recorded
+language and size, and sends it at the recorded arrival rate (or a multiple
+of it) without waiting for earlier requests, so queueing shows up as latency.
+Reports throughput, latency percentiles and error rates.
+
+Usage:
+    python -m src.replay captures/traffic.jsonl --url http://localhost:8000 --speed 2
+    python -m src.replay captures/traffic.jsonl --stub   # in-process server, mock backend
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Line templates used to pad synthetic code to the recorded size; {n} keeps
+# every request distinct so the fingerprint cache and coalescing do not hide load.
+CODE_TEMPLATES = {
+    'python': "def handler_{n}_{i}(items):\n    return [item * {i} for item in items if item]\n",
+    'javascript': "function handler_{n}_{i}(items) {{\n  return items.filter(Boolean).map(x => x * {i});\n}}\n",
+    'typescript': "function handler_{n}_{i}(items: number[]): number[] {{\n  return items.map(x => x * {i});\n}}\n",
+    'java': "int handler_{n}_{i}(int[] items) {{\n    int total = 0;\n    for (int x : items) total += x * {i};\n    return total;\n}}\n",
+    'go': "func handler_{n}_{i}(items []int) int {{\n\ttotal := 0\n\tfor _, x := range items {{ total += x * {i} }}\n\treturn total\n}}\n",
+}
+DEFAULT_TEMPLATE = "handler_{n}_{i} = compute({i})\n"
+
+
+def load_capture(path: str, endpoint: str = "review") -> List[Dict]:
+    """Read capture records for one endpoint in arrival order."""
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records = [r for r in records if r.get('endpoint', 'review') == endpoint]
+    records.sort(key=lambda r: r['offset'])
+    return records
+
+
+def synthesize_code(record: Dict, n: int) -> str:
+    """Code in the recorded language of roughly the recorded size."""
+    template = CODE_TEMPLATES.get(record['language'], DEFAULT_TEMPLATE)
+    parts, size, i = [], 0, 0
+    while size < record['code_bytes']:
+        part = template.format(n=n, i=i)
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return ''.join(parts)[:max(record['code_bytes'], 1)]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def summarize(results: List[Dict], duration: float) -> Dict:
+    """Throughput, latency percentiles and error rates of a replay."""
+    ok = [r for r in results if r['status'] == 200]
+    latencies = [r['latency'] for r in ok]
+    statuses = Counter(str(r['status']) for r in results)
+    return {
+        'requests': len(results),
+        'succeeded': len(ok),
+        'error_rate': 1 - len(ok) / len(results) if results else 0.0,
+        'errors_by_status': {status: count for status, count in statuses.items() if status != '200'},
+        'duration': duration,
+        'throughput': len(ok) / duration if duration > 0 else 0.0,
+        'latency_mean': statistics.mean(latencies) if latencies else 0.0,
+        'latency_p50': _percentile(latencies, 0.50),
+        'latency_p95': _percentile(latencies, 0.95),
+        'latency_p99': _percentile(latencies, 0.99),
+        'latency_max': max(latencies, default=0.0)
+    }
+
+
+async def _send(client: httpx.AsyncClient, record: Dict, n: int, timeout: float) -> Dict:
+    payload = {
+        'code': synthesize_code(record, n),
+        'language': record['language'],
+        'prompt_version': record.get('prompt_version', 'default')
+    }
+    started = time.monotonic()
+    try:
+        response = await client.post("/api/v1/review", json=payload, timeout=timeout)
+        status = response.status_code
+    except httpx.TimeoutException:
+        status = 'timeout'
+    except httpx.HTTPError as e:
+        logger.debug(f"Request {n} failed: {str(e)}")
+        status = 'connection_error'
+    return {'status': status, 'latency': time.monotonic() - started}
+
+
+async def replay(records: List[Dict], client: httpx.AsyncClient, speed: float = 1.0,
+                 limit: Optional[int] = None, timeout: float = 300.0) -> Dict:
+    """Send records at their recorded gaps divided by speed and summarise the results."""
+    if speed <= 0:
+        raise ValueError("speed must be positive")
+    records = records[:limit] if limit else records
+    started = time.monotonic()
+    tasks = []
+    due = 0.0
+    for n, record in enumerate(records):
+        # Open loop: schedule against the recorded timeline, not previous completions
+        due += record['gap'] / speed
+        delay = due - (time.monotonic() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_send(client, record, n, timeout)))
+    results = await asyncio.gather(*tasks)
+    summary = summarize(results, time.monotonic() - started)
+    summary.update(speed=speed, offered_rate=len(records) / due if due > 0 else None)
+    return summary
+
+
+def format_summary(summary: Dict) -> str:
+    """Human-readable replay report."""
+    lines = [
+        f"Requests:    {summary['requests']} ({summary['succeeded']} succeeded) at {summary['speed']}x recorded rate",
+        f"Duration:    {summary['duration']:.1f}s",
+        f"Throughput:  {summary['throughput']:.2f} reviews/s",
+        f"Latency:     mean {summary['latency_mean']:.3f}s  p50 {summary['latency_p50']:.3f}s  "
+        f"p95 {summary['latency_p95']:.3f}s  p99 {summary['latency_p99']:.3f}s  max {summary['latency_max']:.3f}s",
+        f"Error rate:  {summary['error_rate']:.2%}"
+    ]
+    for status, count in sorted(summary['errors_by_status'].items()):
+        lines.append(f"  {status}: {count}")
+    return '\n'.join(lines)
+
+
+def _stub_client() -> httpx.AsyncClient:
+    """Client for an in-process server using the mock backend."""
+    os.environ['INFERENCE_BACKEND'] = 'mock'
+    from .config import Config
+    Config.INFERENCE_BACKEND = 'mock'
+    from .api import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stub")
+
+
+async def _run(args) -> Dict:
+    records = load_capture(args.capture)
+    if not records:
+        raise SystemExit(f"No review requests in {args.capture}")
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    client = _stub_client() if args.stub else httpx.AsyncClient(base_url=args.url, limits=limits)
+    async with client:
+        return await replay(records, client, speed=args.speed, limit=args.limit, timeout=args.timeout)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point for traffic replay."""
+    parser = argparse.ArgumentParser(description="Replay captured traffic against the review API.")
+    parser.add_argument("capture", help="JSONL capture written by the server")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server to load")
+    parser.add_argument("--stub", action="store_true", help="Replay against an in-process server with the mock backend")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiple of the recorded request rate")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--max-connections", type=int, default=256, help="Connection pool size")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(_run(args))
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
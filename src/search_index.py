@@ -0,0 +1,166 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+_TOKEN = re.compile(r'[a-z0-9_]+')
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was were will with".split()
+)
+
+
+def analyze(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords, plurals folded so 'queries' matches 'query'."""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith('ies'):
+            token = token[:-3] + 'y'
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class _Doc:
+    __slots__ = ('language', 'timestamp', 'items', 'lengths')
+
+    def __init__(self, language: str, timestamp: datetime, items: List[Tuple[str, str]],
+                 lengths: Dict[str, int]):
+        self.language = language
+        self.timestamp = timestamp
+        self.items = items
+        # Term count per section, and in total under '*'
+        self.lengths = lengths
+
+
+class SearchIndex:
+    """Inverted index over the suggestions of reviews in history, ranked with BM25.
+
+    A review is one document; postings keep term frequencies per section, so a
+    section filter scores only that section's text. Queries touch only the
+    postings of their own terms, so their cost does not grow with history size
+    for rare terms.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        # term -> review_id -> lowercased section (or '*' for the whole review) -> term frequency
+        self._postings: Dict[str, Dict[str, Counter]] = {}
+        self._docs: Dict[str, _Doc] = {}
+        self._total_length: Counter = Counter()
+        self._section_docs: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, review):
+        """Index a review's suggestions, replacing any earlier entry for its ID."""
+        items = [(section['type'], item) for section in review.suggestions for item in section.get('items', [])]
+        frequencies: Dict[str, Counter] = {}
+        lengths: Counter = Counter()
+        for section, item in items:
+            # Sections are keyed case-insensitively, like languages
+            key = section.strip().lower()
+            terms = analyze(item)
+            lengths[key] += len(terms)
+            for term in terms:
+                frequencies.setdefault(term, Counter())[key] += 1
+        for by_section in frequencies.values():
+            by_section['*'] = sum(by_section.values())
+        lengths['*'] = sum(lengths.values())
+
+        with self._lock:
+            self._remove(review.review_id)
+            self._docs[review.review_id] = _Doc(review.language.strip().lower(), review.timestamp, items, lengths)
+            for term, by_section in frequencies.items():
+                self._postings.setdefault(term, {})[review.review_id] = by_section
+            self._total_length.update(lengths)
+            self._section_docs.update(lengths.keys())
+
+    def remove(self, review_id: str):
+        """Drop a review from the index."""
+        with self._lock:
+            self._remove(review_id)
+
+    def _remove(self, review_id: str):
+        doc = self._docs.pop(review_id, None)
+        if doc is None:
+            return
+        for term in {term for _, item in doc.items for term in analyze(item)}:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(review_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length.subtract(doc.lengths)
+        self._section_docs.subtract(doc.lengths.keys())
+
+    def search(self, query: str, language: Optional[str] = None, section: Optional[str] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None,
+               offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict]]:
+        """Reviews matching any query term, best first; returns (total matches, page of results).
+
+        Each result has review_id, language, timestamp, score and the matching
+        suggestion items.
+        """
+        terms = list(dict.fromkeys(analyze(query)))
+        language = language.strip().lower() if language else None
+        section = section.strip().lower() if section else None
+        field = section or '*'
+        filtered = bool(language or since or until)
+        with self._lock:
+            doc_count = self._section_docs[field]
+            if not terms or doc_count <= 0:
+                return 0, []
+            average_length = self._total_length[field] / doc_count
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term, {})
+                matches = [(review_id, by_section[field]) for review_id, by_section in postings.items()
+                           if field in by_section]
+                if not matches:
+                    continue
+                idf = math.log(1 + (doc_count - len(matches) + 0.5) / (len(matches) + 0.5))
+                for review_id, frequency in matches:
+                    doc = self._docs[review_id]
+                    if filtered and not self._accepts(doc, language, since, until):
+                        continue
+                    length = doc.lengths[field]
+                    norm = self.K1 * (1 - self.B + self.B * length / average_length)
+                    scores[review_id] = scores.get(review_id, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+
+            ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda pair: (-pair[1], pair[0]))
+            query_terms = set(terms)
+            page = [self._result(review_id, score, section, query_terms)
+                    for review_id, score in ranked[offset:]]
+        return len(scores), page
+
+    @staticmethod
+    def _accepts(doc: _Doc, language: Optional[str], since: Optional[datetime], until: Optional[datetime]) -> bool:
+        if language and doc.language != language:
+            return False
+        if since and doc.timestamp < since:
+            return False
+        if until and doc.timestamp >= until:
+            return False
+        return True
+
+    def _result(self, review_id: str, score: float, section: Optional[str], terms: Set[str]) -> Dict:
+        doc = self._docs[review_id]
+        return {
+            'review_id': review_id,
+            'language': doc.language,
+            'timestamp': doc.timestamp.isoformat(),
+            'score': round(score, 4),
+            'matches': [{'section': item_section, 'item': item} for item_section, item in doc.items
+                        if (section is None or item_section.strip().lower() == section) and terms.intersection(analyze(item))]
+        }
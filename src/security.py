@@ -0,0 +1,12 @@
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from .config import Config
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject requests without the configured admin token."""
+    if not Config.ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin access required")
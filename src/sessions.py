@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def _tensor_bytes(value: Any) -> int:
+    """Bytes held by the tensors in a KV cache (a Cache object or legacy tuples).
+
+    Raises TypeError for caches that cannot be measured.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (list, tuple)):
+        return sum(_tensor_bytes(item) for item in value)
+    if hasattr(value, 'to_legacy_cache'):
+        # The legacy tuples share the cache's tensors, so this copies nothing
+        return _tensor_bytes(value.to_legacy_cache())
+    if hasattr(value, 'key_cache') and hasattr(value, 'value_cache'):
+        # Fixed-size caches (static, hybrid) have no legacy form but keep their tensors here
+        return _tensor_bytes(value.key_cache) + _tensor_bytes(value.value_cache)
+    raise TypeError(f"cannot measure a {type(value).__name__}")
+
+
+class GenerationSession:
+    """The context of a generation, so it can be continued with more text.
+
+    text is the full prompt and output so far and is enough to rebuild the
+    context on any model. When the backend supports it, input_ids and
+    past_key_values hold the attention cache for that text so continuing it
+    only prefills the new tokens; the cache is only valid for its owner model.
+    """
+
+    def __init__(self, text: str, input_ids: Optional[torch.Tensor] = None, past_key_values: Any = None):
+        self.text = text
+        self.input_ids = input_ids
+        self.past_key_values = past_key_values
+        # Set by backends when the generation that produced this session continued a cached context
+        self.reused_cache = False
+        self._owner = None
+
+    def bind(self, model_manager):
+        """Record the model the cache was computed with."""
+        self._owner = weakref.ref(model_manager)
+
+    def has_cache_for(self, model_manager) -> bool:
+        return self.past_key_values is not None and self._owner is not None and self._owner() is model_manager
+
+    def drop_cache(self):
+        self.input_ids = None
+        self.past_key_values = None
+
+    @property
+    def nbytes(self) -> int:
+        return _tensor_bytes(self.past_key_values) + _tensor_bytes(self.input_ids) + len(self.text)
+
+
+class SessionStore:
+    """LRU store of generation sessions bounded by count, total bytes and age.
+
+    Sessions are taken out while in use, so concurrent continuations of one
+    session never share a cache; a taker that finds nothing recomputes.
+    """
+
+    def __init__(self, max_bytes: int, max_sessions: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def _remove(self, key: str) -> GenerationSession:
+        session, size, _ = self._sessions.pop(key)
+        self._bytes -= size
+        return session
+
+    def _expire(self, now: float):
+        expired = [key for key, (_, _, stored_at) in self._sessions.items() if now - stored_at > self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+        self.stats['expired'] += len(expired)
+
+    def put(self, key: str, session: GenerationSession):
+        """Store a session, evicting the least recently used ones to stay within limits."""
+        try:
+            size = session.nbytes
+        except TypeError as e:
+            # An unmeasured cache would escape the byte limit, so only the text is kept
+            logger.error(f"Cannot measure the cache of session {key} ({str(e)}); storing its text only")
+            session.drop_cache()
+            size = session.nbytes
+        if size > self.max_bytes:
+            logger.info(f"Not storing session {key}: {size} bytes exceeds the session memory limit")
+            return
+        now = time.time()
+        with self._lock:
+            if key in self._sessions:
+                self._remove(key)
+            self._expire(now)
+            while self._sessions and (len(self._sessions) >= self.max_sessions or self._bytes + size > self.max_bytes):
+                self._remove(next(iter(self._sessions)))
+                self.stats['evictions'] += 1
+            self._sessions[key] = (session, size, now)
+            self._bytes += size
+
+    def take(self, key: str) -> Optional[GenerationSession]:
+        """Remove and return a live session, or None if it expired or was evicted."""
+        with self._lock:
+            self._expire(time.time())
+            if key not in self._sessions:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._bytes = 0
+
+    def describe(self) -> Dict:
+        """Occupancy and hit statistics."""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'bytes': self._bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                **self.stats
+            }
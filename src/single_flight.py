@@ -0,0 +1,72 @@
+import logging
+import threading
+from concurrent.futures import Future
+# Only an alias of the builtin TimeoutError from Python 3.11
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .cancellation import CancellationToken, ReviewCancelled, SharedToken, use_token
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers that arrive while it
+    is running wait on the same future and receive its result or exception.
+    The function runs under a SharedToken of every caller's cancellation token,
+    so it is cancelled only once all of them have given up; a caller that gives
+    up earlier stops waiting with ReviewCancelled.
+    """
+
+    # Seconds between cancellation checks of a waiting caller
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self._calls: Dict[str, Tuple[Future, SharedToken]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any],
+           token: Optional[CancellationToken] = None) -> Tuple[Any, bool]:
+        """Run fn once per key at a time; returns (result, shared)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = (Future(), SharedToken())
+                self._calls[key] = call
+            future, shared_token = call
+            shared_token.add(token)
+
+        if not leader:
+            logger.info(f"Joining in-flight call {key[:12]}")
+            return self._wait(future, token), True
+
+        try:
+            with use_token(shared_token):
+                result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def _wait(self, future: Future, token: Optional[CancellationToken]) -> Any:
+        if token is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=self.POLL_INTERVAL)
+            except FutureTimeout:
+                if token.cancelled:
+                    raise ReviewCancelled(token.reason)
+
+    def in_flight(self) -> int:
+        """Number of keys currently executing."""
+        with self._lock:
+            return len(self._calls)
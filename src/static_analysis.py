@@ -0,0 +1,131 @@
+"""
+Model-free review checks, used when the server is too loaded to run the model.
+
+Python code is checked on its AST; every language also gets line-based
+checks. Findings use the same sections and "Line N:" references as model
+reviews, so clients render them the same way.
+"""
+import ast
+import re
+from typing import Dict, List
+
+MAX_LINE_LENGTH = 120
+MAX_FUNCTION_LINES = 50
+
+SECRET_ASSIGNMENT = re.compile(
+    r'''(?i)\b\w*(password|passwd|secret|api_?key|token|private_?key)\w*\s*[:=]\s*["'][^"']{4,}["']'''
+)
+SQL_CONCATENATION = re.compile(
+    r'''(?i)["'](\s*(select|insert|update|delete)\b[^"']*)["']\s*(\+|%|\.format\()|f["']\s*(select|insert|update|delete)\b[^"']*\{'''
+)
+SQL_MESSAGE = "SQL built from strings can allow SQL injection; use parameterized queries"
+TODO_COMMENT = re.compile(r'(#|//|/\*)\s*(TODO|FIXME|XXX)\b')
+
+# Line-based checks: (pattern, section, message), optionally per language
+LINE_CHECKS = {
+    None: [
+        (re.compile(r'\beval\s*\('), 'Security', "Avoid eval(); it executes arbitrary code"),
+    ],
+    'javascript': [
+        (re.compile(r'\.innerHTML\s*='), 'Security', "Assigning innerHTML can introduce XSS; use textContent"),
+        (re.compile(r'(?<![=!])==(?!=)'), 'Best Practices', "Use === instead of == to avoid type coercion"),
+        (re.compile(r'^\s*var\s'), 'Best Practices', "Use let or const instead of var"),
+        (re.compile(r'catch\s*\([^)]*\)\s*\{\s*\}'), 'Issues', "Empty catch block hides errors"),
+    ],
+    'java': [
+        (re.compile(r'catch\s*\([^)]*\)\s*\{\s*\}'), 'Issues', "Empty catch block hides errors"),
+        (re.compile(r'\bSystem\.out\.println\('), 'Best Practices', "Use a logger instead of System.out"),
+    ],
+    'go': [
+        (re.compile(r'\b_\s*(,\s*_\s*)?=\s*\w+[\w.]*\('), 'Issues', "Returned error is discarded"),
+    ],
+}
+LINE_CHECKS['typescript'] = LINE_CHECKS['javascript']
+
+
+def static_review(code: str, language: str) -> Dict[str, List[str]]:
+    """Findings by section (Issues, Improvements, Best Practices, Security)."""
+    findings: Dict[str, List[str]] = {'Issues': [], 'Improvements': [], 'Best Practices': [], 'Security': []}
+    language = language.strip().lower()
+    if language == 'python':
+        _check_python(code, findings)
+    _check_lines(code, language, findings)
+    for items in findings.values():
+        items.sort(key=lambda item: int(item[len("Line "):item.index(':')]))
+    return findings
+
+
+def _add(findings: Dict[str, List[str]], section: str, line: int, message: str):
+    item = f"Line {line}: {message}"
+    if item not in findings[section]:
+        findings[section].append(item)
+
+
+def _check_lines(code: str, language: str, findings: Dict[str, List[str]]):
+    checks = LINE_CHECKS[None] + LINE_CHECKS.get(language, [])
+    for number, line in enumerate(code.splitlines(), 1):
+        if SECRET_ASSIGNMENT.search(line):
+            _add(findings, 'Security', number, "Hardcoded secret; load it from configuration or the environment")
+        if SQL_CONCATENATION.search(line):
+            _add(findings, 'Security', number, SQL_MESSAGE)
+        if TODO_COMMENT.search(line):
+            _add(findings, 'Improvements', number, "Unresolved TODO/FIXME comment")
+        if len(line) > MAX_LINE_LENGTH:
+            _add(findings, 'Best Practices', number, f"Line longer than {MAX_LINE_LENGTH} characters")
+        for pattern, section, message in checks:
+            if pattern.search(line):
+                _add(findings, section, number, message)
+
+
+def _check_python(code: str, findings: Dict[str, List[str]]):
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        _add(findings, 'Issues', e.lineno or 1, f"Syntax error: {e.msg}")
+        return
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            _check_function(node, findings)
+        elif isinstance(node, ast.ClassDef) and ast.get_docstring(node) is None and not node.name.startswith('_'):
+            _add(findings, 'Best Practices', node.lineno, f"Add a docstring to class {node.name}")
+        elif isinstance(node, ast.ExceptHandler):
+            if node.type is None:
+                _add(findings, 'Issues', node.lineno, "Bare except catches SystemExit and KeyboardInterrupt")
+            if all(isinstance(stmt, ast.Pass) for stmt in node.body):
+                _add(findings, 'Issues', node.lineno, "Exception is silently ignored")
+        elif isinstance(node, ast.ImportFrom) and any(alias.name == '*' for alias in node.names):
+            _add(findings, 'Best Practices', node.lineno, "Avoid wildcard imports")
+        elif isinstance(node, ast.Compare) and any(
+                isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(right, ast.Constant) and right.value is None
+                for op, right in zip(node.ops, node.comparators)):
+            _add(findings, 'Best Practices', node.lineno, "Compare with None using 'is' / 'is not'")
+        elif isinstance(node, ast.Call):
+            _check_call(node, findings)
+
+
+def _check_function(node, findings: Dict[str, List[str]]):
+    if not node.name.startswith('_') and ast.get_docstring(node) is None:
+        _add(findings, 'Best Practices', node.lineno, f"Add a docstring to function {node.name}")
+    for default in node.args.defaults + node.args.kw_defaults:
+        if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+            _add(findings, 'Issues', node.lineno,
+                 f"Mutable default argument in {node.name} is shared between calls")
+    length = (node.end_lineno or node.lineno) - node.lineno + 1
+    if length > MAX_FUNCTION_LINES:
+        _add(findings, 'Improvements', node.lineno,
+             f"Function {node.name} is {length} lines long; consider splitting it")
+
+
+def _check_call(node: ast.Call, findings: Dict[str, List[str]]):
+    name = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, 'id', '')
+    if name == 'exec':
+        _add(findings, 'Security', node.lineno, "Avoid exec(); it executes arbitrary code")
+    elif name in ('loads', 'load') and getattr(node.func, 'value', None) is not None \
+            and getattr(node.func.value, 'id', '') == 'pickle':
+        _add(findings, 'Security', node.lineno, "Unpickling untrusted data can execute code")
+    elif any(kw.arg == 'shell' and isinstance(kw.value, ast.Constant) and kw.value.value is True
+             for kw in node.keywords):
+        _add(findings, 'Security', node.lineno, "shell=True allows shell injection; pass an argument list")
+    elif name in ('execute', 'executemany') and node.args and isinstance(node.args[0], (ast.JoinedStr, ast.BinOp)):
+        _add(findings, 'Security', node.lineno, SQL_MESSAGE)
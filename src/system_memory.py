@@ -0,0 +1,87 @@
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# cgroup v1 reports "unlimited" as a huge page-aligned number
+_CGROUP_V1_UNLIMITED = 1 << 60
+
+
+def _read_int(path: str) -> Optional[int]:
+    """Read an integer from a sysfs/procfs file, or None if unavailable."""
+    try:
+        with open(path, 'r') as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    if value == 'max':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _meminfo(field: str) -> Optional[int]:
+    """Read a field of /proc/meminfo in bytes."""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, or None when it cannot be read.
+
+    Uses /proc on Linux and psutil, when installed, elsewhere. Peak RSS from
+    getrusage is not used: it never falls, and its unit differs by platform.
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def memory_limit_bytes() -> Optional[int]:
+    """Memory limit of this container (cgroup) or host, whichever is lower."""
+    limits = [
+        _read_int('/sys/fs/cgroup/memory.max'),
+        _read_int('/sys/fs/cgroup/memory/memory.limit_in_bytes'),
+        _meminfo('MemTotal')
+    ]
+    limits = [limit for limit in limits if limit and limit < _CGROUP_V1_UNLIMITED]
+    return min(limits) if limits else None
+
+
+def memory_used_bytes() -> Optional[int]:
+    """Memory charged to this container, falling back to host usage."""
+    for path in ('/sys/fs/cgroup/memory.current', '/sys/fs/cgroup/memory/memory.usage_in_bytes'):
+        used = _read_int(path)
+        if used is not None:
+            return used
+    total, available = _meminfo('MemTotal'), _meminfo('MemAvailable')
+    if total is None or available is None:
+        return None
+    return total - available
+
+
+def available_memory_bytes() -> Optional[int]:
+    """Memory that can still be allocated before hitting the container or host limit."""
+    candidates = [_meminfo('MemAvailable')]
+    limit, used = memory_limit_bytes(), memory_used_bytes()
+    if limit is not None and used is not None:
+        candidates.append(max(limit - used, 0))
+    candidates = [c for c in candidates if c is not None]
+    return min(candidates) if candidates else None
@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from .prompts import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_CAPTURE_NAME = re.compile(r'^[\w.-]+\.jsonl$')
+
+
+class TrafficRecorder:
+    """Opt-in recording of anonymised request shapes for load replay.
+
+    Each captured request becomes one JSONL record with its language, code
+    size, token count, arrival gap and outcome; code and identifiers are never
+    written. Arrival gaps are taken when a request arrives (mark_arrival) and
+    the rest is recorded once it finishes, so records may be written slightly
+    out of arrival order; `offset` gives the arrival order.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.records = 0
+        self._file = None
+        self._started_at = 0.0
+        self._last_arrival: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self, name: Optional[str] = None) -> Dict:
+        """Start appending records to output_dir/name (default: timestamped file)."""
+        name = name or f"traffic-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+        if not _CAPTURE_NAME.match(name):
+            raise ValueError("Capture name must be a plain file name ending in .jsonl")
+        os.makedirs(self.output_dir, exist_ok=True)
+        with self._lock:
+            self._close()
+            self.path = os.path.join(self.output_dir, name)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._started_at = time.monotonic()
+            self._last_arrival = None
+            self.records = 0
+            self.enabled = True
+        logger.info(f"Capturing traffic to {self.path}")
+        return self.status()
+
+    def stop(self) -> Dict:
+        """Stop capturing and close the file."""
+        with self._lock:
+            self._close()
+            self.enabled = False
+        return self.status()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def mark_arrival(self) -> Optional[Tuple[float, float]]:
+        """Note a request arrival; returns (offset, gap) or None when not capturing."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            gap = 0.0 if self._last_arrival is None else now - self._last_arrival
+            self._last_arrival = now
+            return now - self._started_at, gap
+
+    def record(self, arrival: Tuple[float, float], endpoint: str, language: str, code: str, status: int,
+               latency: float, tokenizer=None, **shape):
+        """Append the anonymised shape of a finished request."""
+        offset, gap = arrival
+        entry = {
+            'offset': round(offset, 6),
+            'gap': round(gap, 6),
+            'endpoint': endpoint,
+            'language': language.strip().lower(),
+            'code_bytes': len(code.encode('utf-8')),
+            'code_lines': code.count('\n') + 1,
+            'tokens': count_tokens(tokenizer, code),
+            'status': status,
+            'latency': round(latency, 6),
+            **shape
+        }
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self.records += 1
+
+    def status(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'path': self.path,
+            'records': self.records
+        }
@@ -0,0 +1,61 @@
+import pytest
+from src import autotune
+from src.config import Config
+from src.model_manager import ModelManager
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "autotune.json")
+
+def test_host_fingerprint_depends_on_model():
+    """Test that fingerprints are stable and model-specific."""
+    first = autotune.host_fingerprint("model-a", "transformers")
+
+    assert first == autotune.host_fingerprint("model-a", "transformers")
+    assert first != autotune.host_fingerprint("model-b", "transformers")
+
+def test_candidate_settings():
+    """Test the candidate grid for an 8 CPU host."""
+    candidates = autotune.candidate_settings(8)
+
+    assert {c['threads'] for c in candidates} == {2, 4, 8}
+    assert {c['batch_size'] for c in candidates} == set(Config.AUTOTUNE_BATCH_SIZES)
+    assert {c['dtype'] for c in candidates} == set(Config.AUTOTUNE_DTYPES)
+
+def test_save_and_load_tuning(cache_path):
+    """Test that entries for several hosts are kept side by side."""
+    autotune.save_tuning("host-a", {'settings': {'threads': 2}}, path=cache_path)
+    autotune.save_tuning("host-b", {'settings': {'threads': 4}}, path=cache_path)
+
+    assert autotune.load_tuning("host-a", path=cache_path) == {'settings': {'threads': 2}}
+    assert autotune.load_tuning("host-b", path=cache_path) == {'settings': {'threads': 4}}
+    assert autotune.load_tuning("host-c", path=cache_path) is None
+
+def test_run_autotune_selects_best(monkeypatch):
+    """Test that the fastest candidate wins and is applied."""
+    manager = ModelManager(model_name=Config.MODEL_NAME, backend="mock", autotune_mode="off")
+    monkeypatch.setattr(autotune, "candidate_settings", lambda cpus: [
+        {'threads': 1, 'batch_size': 1, 'dtype': 'float32'},
+        {'threads': 1, 'batch_size': 4, 'dtype': 'float32'},
+    ])
+
+    result = autotune.run_autotune(manager, max_new_tokens=4)
+    autotune.apply_settings(manager, result['settings'])
+
+    # The mock backend takes the same time for any batch size
+    assert result['settings']['batch_size'] == 4
+    assert manager.batch_size == 4
+
+def test_benchmark_counts_generated_tokens(monkeypatch):
+    """Test that throughput counts the tokens generated, not max_new_tokens per sequence."""
+    manager = ModelManager(model_name=Config.MODEL_NAME, backend="mock", autotune_mode="off")
+    # One sequence stops early at EOS
+    monkeypatch.setattr(manager.backend, "generate_batch", lambda prompts, max_new_tokens: ["a b c d", "a"])
+    times = iter([0.0, 1.0])
+    monkeypatch.setattr(autotune.time, "perf_counter", lambda: next(times))
+
+    result = autotune.benchmark(manager, {'threads': 1, 'batch_size': 2, 'dtype': 'float32'}, max_new_tokens=4)
+    assert result['tokens_per_second'] == 5
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,68 @@
+import json
+import pytest
+from src.bulk_review import _iter_batches, iter_source_files, load_checkpoint
+
+@pytest.fixture
+def source_tree(tmp_path):
+    """Create a small directory of source files."""
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("x = 1\n")
+    (tmp_path / "pkg" / "b.js").write_text("let y = 2;\n")
+    (tmp_path / "README.md").write_text("# docs\n")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_text("module.exports = {};\n")
+    return tmp_path
+
+def test_iter_source_files_filters(source_tree):
+    """Test language filtering and excluded directories."""
+    files = [(p.replace(str(source_tree), ""), lang) for p, lang in iter_source_files(str(source_tree))]
+    assert files == [("/pkg/a.py", "python"), ("/pkg/b.js", "javascript")]
+
+    python_only = list(iter_source_files(str(source_tree), {"python"}))
+    assert [lang for _, lang in python_only] == ["python"]
+
+def test_checkpoint_resume(source_tree, tmp_path):
+    """Test that finished files are skipped and failed and partial records are dropped."""
+    batches = list(_iter_batches(str(source_tree), None, set(), batch_size=10, max_file_bytes=1000))
+    first, second = batches[0]
+
+    output = tmp_path / "out.jsonl"
+    with open(output, "w") as f:
+        f.write(json.dumps({"path": first["path"], "sha256": first["sha256"]}) + "\n")
+        f.write(json.dumps({"path": second["path"], "sha256": second["sha256"], "error": "boom"}) + "\n")
+        f.write('{"path": "partial')
+
+    done = load_checkpoint(str(output))
+    assert done == {(first["path"], first["sha256"])}
+    # The failed record is removed so its retry leaves one record per file
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert records == [{"path": first["path"], "sha256": first["sha256"]}]
+
+    remaining = list(_iter_batches(str(source_tree), None, done, batch_size=10, max_file_bytes=1000))
+    assert [item["path"] for item in remaining[0]] == [second["path"]]
+
+if __name__ == '__main__':
+    pytest.main([__file__])
+
+def test_worker_archives_to_its_own_directory(tmp_path, monkeypatch):
+    """Test that each worker archives under its own directory and flushes it on shutdown."""
+    import os
+    from src import bulk_review
+    from src.code_reviewer import CodeReview
+    from src.config import Config
+
+    finalizers = []
+    monkeypatch.setattr(Config, "HISTORY_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "INFERENCE_BACKEND", "mock")
+    monkeypatch.setattr("torch.set_num_threads", lambda threads: None)
+    monkeypatch.setattr("multiprocessing.util.Finalize", lambda obj, callback, exitpriority: finalizers.append(callback))
+    monkeypatch.setattr(bulk_review, "_worker_reviewer", None)
+    bulk_review._init_worker("test-model", 2)
+
+    archive = bulk_review._worker_reviewer.archive
+    assert archive.directory == os.path.join(str(tmp_path), f"bulk-worker-{os.getpid()}")
+    archive.append(CodeReview("x = 1", "python", "bulk-1"))
+    for finalize in finalizers:
+        finalize()
+    assert archive.describe()['pending_rows'] == 0
+    assert archive.describe()['files'] == 1
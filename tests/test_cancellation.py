@@ -0,0 +1,108 @@
+import threading
+import time
+from unittest.mock import patch
+import pytest
+import torch
+from fastapi.testclient import TestClient
+from transformers import LlamaConfig, LlamaForCausalLM, StoppingCriteriaList
+from src.cancellation import (DEADLINE, DISCONNECTED, CancellationCriteria, CancellationToken, ReviewCancelled,
+                              SharedToken, current_token, use_token)
+from src.code_reviewer import CodeReviewer
+from src.config import Config
+from src.model_manager import ModelManager
+from src.single_flight import SingleFlight
+
+def test_deadline_cancels_token():
+    """Test that a token reports its deadline once it passes."""
+    token = CancellationToken(timeout=0.05)
+    assert not token.cancelled
+    assert token.wait(5.0)
+    assert token.reason == DEADLINE
+
+def test_shared_token_needs_every_caller():
+    """Test that shared work is cancelled only when all callers cancel."""
+    first, second = CancellationToken(), CancellationToken()
+    shared = SharedToken([first, second])
+    first.cancel()
+    assert not shared.cancelled
+    second.cancel()
+    assert shared.reason == DISCONNECTED
+    assert not SharedToken([CancellationToken(), None]).cancelled
+
+def test_stopping_criteria_ends_generation():
+    """Test that a cancelled token stops generate() at the next decode step."""
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=100, hidden_size=32, intermediate_size=64,
+        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2
+    )).eval()
+    token = CancellationToken()
+    token.cancel()
+    input_ids = torch.tensor([[1, 5, 9, 13]])
+    output = model.generate(input_ids=input_ids, max_new_tokens=50, min_length=0, do_sample=False, pad_token_id=0,
+                            stopping_criteria=StoppingCriteriaList([CancellationCriteria(token)]))
+    assert output.shape[1] == input_ids.shape[1] + 1
+
+def test_single_flight_waiter_leaves_without_cancelling_leader():
+    """Test that a cancelled waiter stops waiting while the shared call keeps running."""
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    seen = {}
+
+    def work():
+        started.set()
+        release.wait(5)
+        seen['cancelled'] = current_token().cancelled
+        return "done"
+
+    leader_token, waiter_token = CancellationToken(), CancellationToken()
+    results = {}
+    leader = threading.Thread(target=lambda: results.setdefault('leader', flights.do("k", work, leader_token)))
+    leader.start()
+    started.wait(5)
+
+    def wait():
+        try:
+            flights.do("k", work, waiter_token)
+        except ReviewCancelled as e:
+            results['waiter'] = e.reason
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.1)
+    waiter_token.cancel()
+    waiter.join(5)
+    release.set()
+    leader.join(5)
+
+    assert results['waiter'] == DISCONNECTED
+    assert results['leader'] == ("done", False)
+    assert seen['cancelled'] is False
+
+def test_overdue_review_is_not_stored():
+    """Test that a review past its deadline stops early and leaves no trace in history."""
+    reviewer = CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+    started = time.monotonic()
+    with patch.object(Config, "MOCK_LATENCY_SECONDS", 5.0), use_token(CancellationToken(timeout=0.1)):
+        with pytest.raises(ReviewCancelled):
+            reviewer.review_code("x = 1\n", "python", "late-1")
+    assert time.monotonic() - started < 2
+    assert reviewer.get_review("late-1") is None
+    assert reviewer.sessions.take("late-1") is None
+
+def test_request_timeout_header():
+    """Test that X-Request-Timeout bounds the review and is validated."""
+    from src.api import app
+    client = TestClient(app)
+    with patch.object(Config, "MOCK_LATENCY_SECONDS", 5.0):
+        response = client.post("/api/v1/review", json={"code": "y = 2", "language": "python"},
+                               headers={"X-Request-Timeout": "0.1"})
+    assert response.status_code == 504
+    response = client.post("/api/v1/review", json={"code": "y = 2", "language": "python"},
+                           headers={"X-Request-Timeout": "soon"})
+    assert response.status_code == 400
+
+    review_id = client.post("/api/v1/review", json={"code": "y = 3", "language": "python"}).json()["review_id"]
+    response = client.post(f"/api/v1/review/{review_id}/followup", json={"question": "Why?"},
+                           headers={"X-Request-Timeout": "soon"})
+    assert response.status_code == 400
+    assert "X-Request-Timeout" in response.json()["detail"]
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import httpx
+import pytest
+from unittest.mock import patch
+from src.client import CodeReviewClient, CodeReviewError, ResultCache, retry_after_seconds
+
+REVIEW = {"review_id": "r", "suggestions": [], "metrics": {}, "timestamp": "t"}
+
+def run(coro):
+    return asyncio.run(coro)
+
+def make_client(handler, **kwargs):
+    return CodeReviewClient("http://test", transport=httpx.MockTransport(handler), **kwargs)
+
+def test_retries_honour_retry_after():
+    """Test that 503s are retried after the server's Retry-After delay."""
+    responses = [httpx.Response(503, headers={"Retry-After": "2"}), httpx.Response(200, json=REVIEW)]
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    async def scenario():
+        async with make_client(lambda request: responses.pop(0)) as client:
+            return await client.review("x = 1", "python")
+
+    with patch("src.client.asyncio.sleep", fake_sleep):
+        assert run(scenario()) == REVIEW
+    assert delays == [2.0]
+
+def test_timeout_header_only_sent_for_positive_timeouts():
+    """Test that the server deadline header is omitted when the client has no timeout."""
+    headers = []
+
+    def handler(request):
+        headers.append(request.headers.get("X-Request-Timeout"))
+        return httpx.Response(200, json=REVIEW)
+
+    async def scenario(timeout):
+        async with make_client(handler, timeout=timeout) as client:
+            await client.review("x = 1", "python")
+
+    run(scenario(None))
+    run(scenario(30.0))
+    assert headers == [None, "30.0"]
+
+def test_client_errors_are_not_retried():
+    """Test that 4xx responses other than 429 raise immediately."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"detail": "Unknown prompt version"})
+
+    async def scenario():
+        async with make_client(handler) as client:
+            await client.review("x", "python", prompt_version="nope")
+
+    with pytest.raises(CodeReviewError) as error:
+        run(scenario())
+    assert error.value.status == 400
+    assert len(calls) == 1
+
+def test_gives_up_after_max_retries():
+    """Test that persistent 429s raise after the configured retries."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429)
+
+    async def scenario():
+        async with make_client(handler, max_retries=2, backoff_base=0.001) as client:
+            await client.review("x", "python")
+
+    with pytest.raises(CodeReviewError):
+        run(scenario())
+    assert len(calls) == 3
+
+def test_cache_skips_repeated_content(tmp_path):
+    """Test that identical submissions are answered from the cache, including across clients."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json=REVIEW)
+
+    async def scenario():
+        async with make_client(handler, cache=ResultCache(directory=str(tmp_path))) as client:
+            await client.review("x = 1", "python")
+            await client.review("x = 1", "python")
+        async with make_client(handler, cache=ResultCache(directory=str(tmp_path))) as client:
+            await client.review("x = 1", "python")
+            await client.review("x = 2", "python")
+
+    run(scenario())
+    assert len(calls) == 2
+
+def test_review_many_bounds_concurrency():
+    """Test that no more than max_concurrency requests are in flight."""
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return httpx.Response(200, json={**REVIEW, "code": json.loads(request.content)["code"]})
+
+    async def scenario():
+        async with make_client(handler, max_concurrency=3) as client:
+            return await client.review_many([{"code": f"x = {i}", "language": "python"} for i in range(10)])
+
+    results = run(scenario())
+    assert [result["code"] for result in results] == [f"x = {i}" for i in range(10)]
+    assert state["peak"] == 3
+
+def test_batch_sends_only_uncached_items():
+    """Test that batch results combine cached and fresh reviews in input order."""
+    sent = []
+
+    def handler(request):
+        if request.url.path == "/api/v1/review":
+            return httpx.Response(200, json={**REVIEW, "review_id": "single"})
+        batch = json.loads(request.content)["requests"]
+        sent.append(batch)
+        return httpx.Response(200, json={"reviews": [{**REVIEW, "review_id": item["code"]} for item in batch]})
+
+    async def scenario():
+        async with make_client(handler) as client:
+            await client.review("b", "python")
+            return await client.review_batch([
+                {"code": "a", "language": "python"},
+                {"code": "b", "language": "python"},
+                {"code": "c", "language": "python"}
+            ])
+
+    results = run(scenario())
+    assert [result["review_id"] for result in results] == ["a", "single", "c"]
+    assert [item["code"] for item in sent[0]] == ["a", "c"]
+
+def test_stream_batch_maps_indexes():
+    """Test that streamed results carry indexes into the caller's list."""
+    def handler(request):
+        batch = json.loads(request.content)["requests"]
+        if not request.url.path.endswith("/stream"):
+            return httpx.Response(200, json={"reviews": [{**REVIEW, "review_id": item["code"]} for item in batch]})
+        lines = [json.dumps({**REVIEW, "index": i, "review_id": item["code"]}) for i, item in reversed(list(enumerate(batch)))]
+        return httpx.Response(200, text="\n".join(lines) + "\n")
+
+    async def scenario():
+        async with make_client(handler) as client:
+            await client.review_batch([{"code": "a", "language": "python"}])
+            return [result async for result in client.stream_batch([
+                {"code": "a", "language": "python"},
+                {"code": "b", "language": "python"},
+                {"code": "c", "language": "python"}
+            ])]
+
+    results = run(scenario())
+    assert {result["index"]: result["review_id"] for result in results} == {0: "a", 1: "b", 2: "c"}
+
+def test_retry_after_formats():
+    """Test Retry-After parsing for seconds, HTTP dates and garbage."""
+    assert retry_after_seconds("5") == 5.0
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert retry_after_seconds("soon") is None
+    assert retry_after_seconds(None) is None
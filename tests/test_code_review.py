@@ -217,6 +217,20 @@ def test_error_handling(client, mock_code_reviewer):
     data = response.json()
     assert "detail" in data
 
+def test_incremental_language_mismatch(client):
+    """Test that a base review in another language is rejected as a bad request."""
+    from src import api
+    error = ValueError("Base review abc is for python, not javascript")
+    with patch.object(api.code_reviewer, 'get_review', return_value=Mock()), \
+            patch.object(api.code_reviewer, 'review_code', side_effect=error):
+        response = client.post(
+            "/api/v1/review",
+            json={"code": "let x = 1;", "language": "javascript", "base_review_id": "abc"}
+        )
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == str(error)
+
 def test_different_languages(client, mock_code_reviewer):
     """Test code review with different programming languages."""
     languages = ["python", "javascript", "java", "cpp", "typescript"]
@@ -235,5 +249,55 @@ def test_different_languages(client, mock_code_reviewer):
         assert "review_id" in data
         assert "suggestions" in data
 
+def test_review_batch(client, mock_code_reviewer):
+    """Test that batch reviews return one result per request in order."""
+    response = client.post(
+        "/api/v1/review/batch",
+        json={"requests": [
+            {"code": "x = 1", "language": "python"},
+            {"code": "let y = 2;", "language": "javascript"}
+        ]}
+    )
+
+    assert response.status_code == 200
+    reviews = response.json()["reviews"]
+    assert len(reviews) == 2
+    assert all("suggestions" in review for review in reviews)
+
+def test_review_batch_validation(client, mock_code_reviewer):
+    """Test that empty and incremental batches are rejected."""
+    assert client.post("/api/v1/review/batch", json={"requests": []}).status_code == 400
+    response = client.post(
+        "/api/v1/review/batch",
+        json={"requests": [{"code": "x", "language": "python", "base_review_id": "abc"}]}
+    )
+    assert response.status_code == 400
+
+def test_review_batch_stream(client, mock_code_reviewer):
+    """Test that streamed batch results are NDJSON lines with their request index."""
+    response = client.post(
+        "/api/v1/review/batch/stream",
+        json={"requests": [{"code": f"x = {i}", "language": "python"} for i in range(3)]}
+    )
+
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines() if line]
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    assert all("review_id" in result for result in results)
+
+def test_history_search(client):
+    """Test history search results and parameter validation."""
+    code_reviewer = CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+    review = CodeReview(code="q = 1", language="python", review_id="search-1")
+    review.suggestions = [{"type": "Security", "items": ["Possible SQL injection in query builder"]}]
+    code_reviewer._add_to_history(review)
+
+    with patch("src.api.code_reviewer", code_reviewer):
+        response = client.get("/api/v1/history/search", params={"q": "SQL injection", "section": "Security"})
+        assert response.status_code == 200
+        assert response.json()["results"][0]["review_id"] == "search-1"
+        assert client.get("/api/v1/history/search", params={"q": " "}).status_code == 400
+        assert client.get("/api/v1/history/search", params={"q": "sql", "page": 0}).status_code == 400
+
 if __name__ == '__main__':
     pytest.main([__file__])
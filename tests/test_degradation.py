@@ -0,0 +1,125 @@
+from unittest.mock import patch
+import pytest
+from src.code_reviewer import CodeReviewer
+from src.config import Config
+from src.degradation import FALLBACK_MODEL, FULL, REDUCED, STATIC, DegradationController
+from src.model_manager import ModelManager
+from src.static_analysis import static_review
+
+def controller(**kwargs):
+    return DegradationController(slo_seconds=1.0, window=4, min_samples=4, cooldown_seconds=0, **kwargs)
+
+def test_steps_down_and_recovers():
+    """Test that the mode steps one level per breach and back up once latency recovers."""
+    slo = controller()
+    for expected in (REDUCED, FALLBACK_MODEL, STATIC):
+        for _ in range(4):
+            slo.observe(2.0)
+        assert slo.mode == expected
+    for _ in range(8):
+        slo.observe(2.0)
+    assert slo.mode == STATIC
+
+    for expected in (FALLBACK_MODEL, REDUCED, FULL):
+        for _ in range(4):
+            slo.observe(0.1)
+        assert slo.mode == expected
+    assert slo.describe()['transitions'] == 6
+
+def test_needs_samples_cooldown_and_hysteresis():
+    """Test that single outliers, recent steps and near-SLO latency do not change the mode."""
+    slo = controller()
+    slo.observe(5.0)
+    assert slo.mode == FULL
+
+    slo = DegradationController(slo_seconds=1.0, window=4, min_samples=4, cooldown_seconds=60)
+    for _ in range(8):
+        slo.observe(5.0)
+    assert slo.mode == REDUCED
+
+    slo = controller(modes=[FULL, REDUCED])
+    for _ in range(4):
+        slo.observe(5.0)
+    for _ in range(8):
+        slo.observe(0.8)
+    assert slo.mode == REDUCED
+
+def test_steps_up_only_once_load_recovers():
+    """Test that fast reviews in a cheaper mode do not step back up while load is unchanged."""
+    now = [0.0]
+    slo = controller(load_window_seconds=10, clock=lambda: now[0])
+
+    def traffic(latency, seconds, per_second):
+        for _ in range(seconds * per_second):
+            now[0] += 1 / per_second
+            slo.arrive()
+            slo.observe(latency)
+
+    traffic(2.0, 1, 4)
+    assert slo.mode == REDUCED
+    # Same load, now served quickly by the reduced mode
+    traffic(0.1, 20, 4)
+    assert slo.mode == REDUCED
+    assert slo.describe()['recovery_arrival_rate'] == pytest.approx(0.4 * 0.8)
+
+    traffic(0.1, 20, 1)
+    assert slo.mode == REDUCED
+    now[0] += 10
+    traffic(0.1, 4, 1)
+    assert slo.mode == FULL
+
+def test_disabled_controller_stays_full():
+    """Test that a disabled controller ignores latency."""
+    slo = controller(enabled=False)
+    for _ in range(10):
+        slo.observe(10.0)
+    assert slo.mode == FULL
+
+def test_static_review_findings():
+    """Test the model-free checks."""
+    findings = static_review(
+        "import pickle\n"
+        "def load(data, seen=[]):\n"
+        "    try:\n"
+        "        cursor.execute(\"SELECT * FROM users WHERE id=\" + data)\n"
+        "    except:\n"
+        "        pass\n",
+        "python"
+    )
+    assert "Line 2: Mutable default argument in load is shared between calls" in findings['Issues']
+    assert "Line 5: Bare except catches SystemExit and KeyboardInterrupt" in findings['Issues']
+    assert len([item for item in findings['Security'] if "SQL injection" in item]) == 1
+    assert static_review("def broken(:\n", "python")['Issues'][0].startswith("Line 1: Syntax error")
+    assert static_review("var token = 'abcdef';", "javascript")['Security']
+
+@pytest.fixture
+def reviewer():
+    fallback = ModelManager(model_name="fallback-model", backend="mock")
+    return CodeReviewer(ModelManager(model_name="test-model", backend="mock"), fallback)
+
+def test_static_mode_reviews_without_model(reviewer):
+    """Test that static mode skips the model and its reviews are not reused later."""
+    reviewer.degradation._level = reviewer.degradation.modes.index(STATIC)
+    with patch.object(reviewer.model_manager, "generate_text") as generate:
+        review = reviewer.review_code("def f(x=[]):\n    return x\n", "python", "static-1")
+    generate.assert_not_called()
+    assert review.mode == STATIC
+    assert review.suggestions[0]['items'] == ["Line 1: Mutable default argument in f is shared between calls"]
+
+    reviewer.degradation._level = 0
+    again = reviewer.review_code("def f(x=[]):\n    return x\n", "python", "full-1")
+    assert again.mode == FULL and again.reused_from is None
+
+def test_fallback_mode_uses_smaller_model(reviewer):
+    """Test that the fallback mode generates with the fallback model and a shorter budget."""
+    reviewer.degradation._level = reviewer.degradation.modes.index(FALLBACK_MODEL)
+    with patch.object(reviewer.fallback_model, "generate_session",
+                      wraps=reviewer.fallback_model.generate_session) as generate:
+        review = reviewer.review_code("x = 1\n", "python", "fallback-1")
+    assert generate.call_args.kwargs['max_new_tokens'] == Config.DEGRADED_MAX_OUTPUT_LENGTH
+    assert review.mode == FALLBACK_MODEL
+
+def test_fallback_mode_skipped_without_fallback_model():
+    """Test that without a fallback model the controller goes from reduced to static."""
+    reviewer = CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+    assert FALLBACK_MODEL not in reviewer.degradation.modes
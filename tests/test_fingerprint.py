@@ -0,0 +1,91 @@
+from unittest.mock import patch
+import pytest
+from src.code_reviewer import CodeReviewer
+from src.config import Config
+from src.fingerprint import code_fingerprint, normalize_code
+from src.model_manager import ModelManager
+
+ORIGINAL = "def add(a, b):\n    return a + b\n"
+REFORMATTED = "# helper\ndef add( a,b ):\n\n    return (a + b)  # sum\n"
+
+def test_python_fingerprint_ignores_comments_and_formatting():
+    """Test that reformatted Python code keeps its fingerprint."""
+    original = "def add(a, b):\n    return a + b\n"
+    reformatted = "# helper\ndef add( a,b ):\n\n    return (a + b)  # sum\n"
+
+    assert code_fingerprint(original, "python") == code_fingerprint(reformatted, "python")
+
+def test_python_fingerprint_detects_changes():
+    """Test that semantic changes produce a new fingerprint."""
+    original = "def add(a, b):\n    return a + b\n"
+    changed = "def add(a, b):\n    return a - b\n"
+
+    assert code_fingerprint(original, "python") != code_fingerprint(changed, "python")
+
+def test_python_fingerprint_invalid_syntax():
+    """Test that code that does not parse is still normalized."""
+    broken = "def add(a, b:\n    return a + b  # broken\n"
+
+    assert "broken" not in normalize_code(broken, "python")
+    assert code_fingerprint(broken, "python") == code_fingerprint(broken.replace("  # broken", ""), "python")
+
+def test_c_style_fingerprint_ignores_comments():
+    """Test comment and whitespace stripping for C-style languages."""
+    original = "function f(x) {\n  return x * 2;\n}"
+    commented = "/* doubles */\nfunction f(x) {   // input\n    return x*2;\n}"
+
+    assert code_fingerprint(original, "javascript") == code_fingerprint(commented, "javascript")
+
+def test_comment_markers_inside_strings_are_kept():
+    """Test that comment markers inside string literals are not stripped."""
+    code = 'const url = "http://example.com";'
+
+    assert "http://example.com" in normalize_code(code, "javascript")
+
+def test_fingerprint_depends_on_language():
+    """Test that the same text in different languages does not collide."""
+    code = "x = 1"
+
+    assert code_fingerprint(code, "python") != code_fingerprint(code, "ruby")
+
+@pytest.fixture
+def reviewer():
+    """Create a reviewer with the fingerprint cache enabled."""
+    with patch.object(Config, 'ENABLE_FINGERPRINT_CACHE', True):
+        yield CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+
+def _assert_reused(review, first):
+    """Check that review was served from first without sharing its findings."""
+    assert review.reused_from == first.review_id
+    assert review.metrics['reused'] is True
+    assert review.suggestions == first.suggestions
+    assert review.suggestions is not first.suggestions
+    assert all(a is not b for a, b in zip(review.suggestions, first.suggestions))
+
+def test_review_code_reuses_equivalent_submission(reviewer):
+    """Test that a reformatted resubmission is answered from the fingerprint index without generating."""
+    first = reviewer.review_code(ORIGINAL, "python", "first")
+
+    with patch.object(reviewer, '_run_review', side_effect=AssertionError("generated")):
+        review = reviewer.review_code(REFORMATTED, "python", "second")
+
+    _assert_reused(review, first)
+    review.suggestions[0]['items'].append("Edited")
+    assert "Edited" not in first.suggestions[0]['items']
+
+def test_review_batch_reuses_equivalent_submission(reviewer):
+    """Test that batch entries matching an earlier review skip generation."""
+    first = reviewer.review_code(ORIGINAL, "python", "first")
+
+    with patch.object(ModelManager, 'generate_batch', side_effect=AssertionError("generated")):
+        reviews = reviewer.review_batch([
+            {'code': REFORMATTED, 'language': "python", 'review_id': "batch-0"},
+            {'code': ORIGINAL, 'language': "python", 'review_id': "batch-1"}
+        ])
+
+    for review in reviews:
+        _assert_reused(review, first)
+    assert reviews[0].suggestions is not reviews[1].suggestions
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,209 @@
+import json
+import time
+import uuid
+from collections import Counter
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from src.gateway import Gateway, HashRing, create_gateway_app
+from src.metrics_rollup import MetricsRollup
+
+REPLICAS = ["http://replica-0:8000", "http://replica-1:8000", "http://replica-2:8000"]
+
+class FakeReplicas:
+    """In-process stand-ins for review servers, dispatched on the request host."""
+
+    def __init__(self, urls):
+        self.urls = urls
+        self.down = set()
+        self.reviews = {url: [] for url in urls}
+        self.followups = Counter()
+        self.rollups = {url: MetricsRollup() for url in urls}
+
+    def _review(self, url, body):
+        review = {'review_id': str(uuid.uuid4()), 'language': body['language'], 'suggestions': [],
+                  'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S.%f')}
+        self.reviews[url].append(review)
+        self.rollups[url].record(body['language'], 0.5, 0)
+        return review
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        url = f"{request.url.scheme}://{request.url.host}:{request.url.port}"
+        if url in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        path = request.url.path
+        if path == "/health":
+            return httpx.Response(200, json={'status': 'healthy'})
+        if path == "/api/v1/review":
+            return httpx.Response(200, json=self._review(url, json.loads(request.content)))
+        if path == "/api/v1/review/batch":
+            items = json.loads(request.content)['requests']
+            return httpx.Response(200, json={'reviews': [self._review(url, item) for item in items]})
+        if path.endswith("/followup"):
+            review_id = path.split('/')[-2]
+            if not any(review['review_id'] == review_id for review in self.reviews[url]):
+                return httpx.Response(404, json={'detail': 'Review not found'})
+            self.followups[url] += 1
+            return httpx.Response(200, json={'review_id': review_id, 'answer': 'ok'})
+        if path == "/api/v1/metrics/sketch":
+            return httpx.Response(200, json=self.rollups[url].export(request.url.params.get('window', 'all')))
+        if path == "/api/v1/history":
+            return httpx.Response(200, json=self.reviews[url])
+        return httpx.Response(404, json={'detail': 'Not Found'})
+
+@pytest.fixture
+def replicas():
+    return FakeReplicas(REPLICAS)
+
+@pytest.fixture
+def client(replicas):
+    gateway = Gateway(REPLICAS, transport=httpx.MockTransport(replicas.handler))
+    with TestClient(create_gateway_app(gateway, health_interval=3600)) as client:
+        yield client
+
+def _owner(replicas, review_id):
+    return next(url for url, reviews in replicas.reviews.items()
+                if any(review['review_id'] == review_id for review in reviews))
+
+def test_ring_spreads_keys_and_moves_few_on_add():
+    """Test that keys spread over nodes and adding a node moves only its share."""
+    ring = HashRing(REPLICAS, vnodes=64)
+    keys = [f"key-{i}" for i in range(3000)]
+    before = {key: next(ring.walk(key)) for key in keys}
+    assert min(Counter(before.values()).values()) > 600
+
+    ring.add("http://replica-3:8000")
+    after = {key: next(ring.walk(key)) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert all(after[key] == "http://replica-3:8000" for key in moved)
+    assert 0.15 < len(moved) / len(keys) < 0.35
+
+def test_equivalent_code_reaches_same_replica(client, replicas):
+    """Test that code differing only in comments and whitespace is routed to one replica."""
+    first = client.post("/api/v1/review", json={'code': "def f(x):\n    return x + 1\n", 'language': "python"})
+    second = client.post("/api/v1/review",
+                         json={'code': "# increment\ndef f(x):\n\n    return x + 1  # done\n", 'language': "python"})
+    assert first.status_code == second.status_code == 200
+    assert first.headers['X-Replica'] == second.headers['X-Replica']
+
+    followup = client.post(f"/api/v1/review/{first.json()['review_id']}/followup", json={'question': "Why?"})
+    assert followup.status_code == 200
+    assert replicas.followups[first.headers['X-Replica']] == 1
+
+def test_failover_skips_unhealthy_replica(client, replicas):
+    """Test that a replica that stops answering is marked down and its keys move on."""
+    body = {'code': "print('hello')", 'language': "python"}
+    owner = client.post("/api/v1/review", json=body).headers['X-Replica']
+    replicas.down.add(owner)
+
+    response = client.post("/api/v1/review", json=body)
+    assert response.status_code == 200
+    assert response.headers['X-Replica'] != owner
+    replicas_state = {r['url']: r['healthy'] for r in client.get("/api/v1/gateway/replicas").json()['replicas']}
+    assert replicas_state[owner] is False
+
+def test_batch_keeps_request_order(client, replicas):
+    """Test that a batch split across replicas comes back in request order."""
+    items = [{'code': f"x = {i}", 'language': "python"} for i in range(12)]
+    reviews = client.post("/api/v1/review/batch", json={'requests': items}).json()['reviews']
+    assert len(reviews) == 12
+    owners = [_owner(replicas, review['review_id']) for review in reviews]
+    assert len(set(owners)) > 1
+
+    lines = client.post("/api/v1/review/batch/stream", json={'requests': items}).text.splitlines()
+    assert sorted(json.loads(line)['index'] for line in lines) == list(range(12))
+
+def test_metrics_and_history_merge_replicas(client, replicas):
+    """Test that metrics and history cover the reviews of every replica."""
+    for i in range(9):
+        client.post("/api/v1/review", json={'code': f"y = {i} * 2", 'language': "python"})
+    assert sum(1 for reviews in replicas.reviews.values() if reviews) > 1
+
+    metrics = client.get("/api/v1/metrics", params={'window': '1h'}).json()
+    assert metrics['total_reviews'] == 9
+    assert metrics['p50_response_time'] == pytest.approx(0.5, rel=0.01)
+
+    history = client.get("/api/v1/history", params={'limit': 5}).json()
+    assert len(history) == 5
+    timestamps = [entry['timestamp'] for entry in history]
+    assert timestamps == sorted(timestamps)
+    assert all(entry['replica'] in REPLICAS for entry in history)
+
+def test_followup_search_skips_unavailable_replica(client, replicas):
+    """Test that a replica failing during the search for an unknown review does not end it."""
+    review = {'review_id': "elsewhere", 'language': "python", 'suggestions': [], 'timestamp': "t"}
+    replicas.reviews[REPLICAS[2]].append(review)
+    replicas.down.add(REPLICAS[0])
+
+    response = client.post("/api/v1/review/elsewhere/followup", json={'question': "Why?"})
+    assert response.status_code == 200
+    assert response.headers['X-Replica'] == REPLICAS[2]
+    # The failed replica is now known to be down, so the search no longer waits for it
+    assert client.post("/api/v1/review/missing/followup", json={'question': "Why?"}).status_code == 404
+
+def _free_port_range(count):
+    import socket
+    for base in range(20000, 40000, 97):
+        sockets = []
+        try:
+            for port in range(base, base + count):
+                sock = socket.socket()
+                sockets.append(sock)
+                sock.bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+    pytest.skip("No free ports")
+
+def test_spawned_mock_replicas(tmp_path, monkeypatch):
+    """Test routing and follow-ups against real replica processes serving the mock backend."""
+    pytest.importorskip("uvicorn")
+    from src.config import Config
+    from src.gateway import spawn_replicas
+
+    monkeypatch.setenv("INFERENCE_BACKEND", "mock")
+    monkeypatch.setattr(Config, "HISTORY_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(Config, "TRAFFIC_CAPTURE_DIR", str(tmp_path / "captures"))
+    spawned = spawn_replicas(2, _free_port_range(2))
+    try:
+        urls = [url for url, _ in spawned]
+        deadline = time.monotonic() + 120
+        pending = set(urls)
+        while pending and time.monotonic() < deadline:
+            for url in list(pending):
+                try:
+                    if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                        pending.discard(url)
+                except httpx.TransportError:
+                    pass
+            time.sleep(0.5)
+        assert not pending, f"Replicas did not start: {pending}"
+
+        with TestClient(create_gateway_app(Gateway(urls), health_interval=3600)) as client:
+            body = {'code': "def f(x):\n    return x\n", 'language': "python"}
+            first = client.post("/api/v1/review", json=body)
+            assert first.status_code == 200
+            assert first.headers['X-Replica'] in urls
+            second = client.post("/api/v1/review", json=body)
+            assert second.headers['X-Replica'] == first.headers['X-Replica']
+            followup = client.post(f"/api/v1/review/{first.json()['review_id']}/followup",
+                                   json={'question': "Why?"})
+            assert followup.status_code == 200
+            assert followup.headers['X-Replica'] == first.headers['X-Replica']
+    finally:
+        for _, process in spawned:
+            process.terminate()
+        for _, process in spawned:
+            process.wait(timeout=30)
+
+def test_stream_reports_items_of_unavailable_replicas(client, replicas):
+    """Test that every item gets a line, with an error, when no replica can review it."""
+    replicas.down.update(REPLICAS)
+    items = [{'code': f"x = {i}", 'language': "python"} for i in range(6)]
+    response = client.post("/api/v1/review/batch/stream", json={'requests': items})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line['index'] for line in lines) == list(range(6))
+    assert all(line['error'] == "No replica available" for line in lines)
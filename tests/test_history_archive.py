@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+import pyarrow.parquet as pq
+import pytest
+from src.code_reviewer import CodeReview, CodeReviewer
+from src.config import Config
+from src.history_archive import (COMPACTION_MANIFEST, HistoryArchive, counts_by_language_day, latency_by_code_size,
+                                 review_row, rows_table, section_counts, theme_counts)
+from src.model_manager import ModelManager
+
+def make_review(n, language="python", day=1, code="x = 1\n", response_time=1.0, findings=()):
+    review = CodeReview(code, language, f"review-{n}")
+    review.timestamp = datetime(2024, 3, day, 12, 0)
+    review.suggestions = [{'type': section, 'items': [text]} for section, text in findings]
+    review.metrics = {'response_time': response_time, 'suggestion_count': len(findings)}
+    return review
+
+def test_archive_writes_and_compacts(tmp_path):
+    """Test that flushed parts are merged once a month has too many files."""
+    archive = HistoryArchive(str(tmp_path), flush_rows=100, compact_files=2)
+    for n in range(7):
+        archive.append(make_review(n))
+        if n < 6:
+            archive.flush()
+
+    files = list((tmp_path / "2024-03").glob("*.parquet"))
+    assert len(files) <= 2
+    assert any(f.name.startswith("compacted-") for f in files)
+    # Six rows on disk, one still buffered, none lost by compaction
+    assert archive.table().num_rows == 7
+    assert archive.describe()['pending_rows'] == 1
+
+def test_archive_writes_in_background(tmp_path):
+    """Test that a full buffer is written by the archive's thread, not the appending one."""
+    archive = HistoryArchive(str(tmp_path), flush_rows=2)
+    writers = []
+    original = HistoryArchive._write_temp
+
+    def record(table, path):
+        writers.append(threading.current_thread().name)
+        return original(table, path)
+
+    with patch.object(HistoryArchive, "_write_temp", side_effect=record):
+        for n in range(2):
+            archive.append(make_review(n))
+        deadline = time.monotonic() + 5
+        while archive.describe()['pending_rows'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert writers == ["history-archive"]
+    assert archive.table().num_rows == 2
+
+def test_interrupted_compaction_is_finished(tmp_path):
+    """Test that parts already merged before a crash are removed instead of counted twice."""
+    archive = HistoryArchive(str(tmp_path), flush_rows=100, compact_files=2)
+    for n in range(2):
+        archive.append(make_review(n))
+        archive.flush()
+    month_dir = tmp_path / "2024-03"
+    parts = sorted(f.name for f in month_dir.glob("*.parquet"))
+    # Crash after the merged file was moved into place but before the parts were deleted
+    pq.write_table(archive.table(), month_dir / "compacted-1-1.parquet")
+    (month_dir / COMPACTION_MANIFEST).write_text(json.dumps({'output': "compacted-1-1.parquet", 'parts': parts}))
+
+    recovered = HistoryArchive(str(tmp_path))
+    assert recovered.table().num_rows == 2
+    assert [f.name for f in month_dir.glob("*.parquet")] == ["compacted-1-1.parquet"]
+    assert not (month_dir / COMPACTION_MANIFEST).exists()
+
+def test_archive_filters_by_time(tmp_path):
+    """Test that queries return only rows in [since, until)."""
+    archive = HistoryArchive(str(tmp_path), flush_rows=1)
+    for n, day in enumerate((1, 2, 3)):
+        archive.append(make_review(n, day=day))
+
+    table = archive.table(since=datetime(2024, 3, 2), until=datetime(2024, 3, 3))
+    assert table['review_id'].to_pylist() == ["review-1"]
+
+def test_aggregates():
+    """Test the language/day, section, theme and latency aggregates."""
+    reviews = [
+        make_review(0, "python", 1, findings=[("Security", "Possible SQL injection in query"),
+                                              ("Issues", "Missing error handling")]),
+        make_review(1, "python", 1, findings=[("Security", "Use parameterized queries")]),
+        make_review(2, "go", 2, code="x" * 2000, response_time=3.0),
+    ]
+    table = rows_table([review_row(r) for r in reviews])
+
+    assert counts_by_language_day(table) == [
+        {'day': '2024-03-01', 'language': 'python', 'reviews': 2, 'suggestions': 3},
+        {'day': '2024-03-02', 'language': 'go', 'reviews': 1, 'suggestions': 0},
+    ]
+    sections = section_counts(table)
+    assert sections['all'] == {'Security': 2, 'Issues': 1}
+    assert 'go' not in sections
+
+    themes = theme_counts(table)
+    assert themes['sql_injection'] == {'findings': 2, 'reviews': 2}
+    assert themes['error_handling'] == {'findings': 1, 'reviews': 1}
+    assert themes['naming'] == {'findings': 0, 'reviews': 0}
+
+    buckets = latency_by_code_size(table)
+    assert buckets[0]['reviews'] == 2 and buckets[0]['p50_response_time'] == pytest.approx(1.0)
+    assert buckets[2]['reviews'] == 1 and buckets[2]['mean_response_time'] == pytest.approx(3.0)
+    assert buckets[-1]['max_bytes'] is None
+
+def test_evicted_reviews_are_archived(tmp_path):
+    """Test that history eviction moves reviews to the archive and analytics see both."""
+    with patch.object(Config, "MAX_HISTORY_ITEMS", 2), \
+            patch.object(Config, "HISTORY_ARCHIVE_DIR", str(tmp_path)), \
+            patch.object(Config, "HISTORY_ARCHIVE_FLUSH_ROWS", 1):
+        reviewer = CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+        for n in range(4):
+            reviewer._add_to_history(make_review(n))
+
+    assert [r.review_id for r in reviewer.review_history] == ["review-2", "review-3"]
+    assert sorted(reviewer.archive.table()['review_id'].to_pylist()) == ["review-0", "review-1"]
+    assert reviewer.history_table().num_rows == 4
+    assert reviewer.history_table(since=datetime(2024, 3, 2)).num_rows == 0
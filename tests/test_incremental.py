@@ -0,0 +1,104 @@
+from unittest.mock import patch
+import pytest
+from src.code_reviewer import CodeReviewer
+from src.config import Config
+from src.incremental import FILE_LEVEL, attribute_findings, diff_blocks, offset_findings, splice_findings, split_blocks
+from src.model_manager import ModelManager
+
+SECTIONS = ['Issues', 'Improvements', 'Best Practices', 'Security']
+
+BASE_CODE = '''import os
+
+def load(path):
+    return open(path).read()
+
+def save(path, data):
+    with open(path, "w") as f:
+        f.write(data)
+'''
+
+def test_split_python_blocks():
+    """Test that top-level functions become separate blocks."""
+    blocks = split_blocks(BASE_CODE, "python")
+
+    assert [block['name'] for block in blocks] == ["module:1", "load", "save"]
+    assert blocks[1]['start'] == 3
+    assert blocks[1]['end'] == 4
+
+def test_split_generic_blocks():
+    """Test brace-aware splitting for C-style languages."""
+    code = "function a() {\n  return 1;\n\n}\n\nfunction b() {\n  return 2;\n}\n"
+    blocks = split_blocks(code, "javascript")
+
+    assert [block['name'] for block in blocks] == ["a", "b"]
+
+def test_diff_ignores_comment_only_changes():
+    """Test that reformatting a block does not mark it as changed."""
+    new_code = BASE_CODE.replace("def load(path):", "def load(path):  # read file")
+    new_code = new_code.replace('f.write(data)', 'f.write(data.strip())')
+    diff = diff_blocks(split_blocks(BASE_CODE, "python"), split_blocks(new_code, "python"))
+
+    assert [block['name'] for block in diff['changed']] == ["save"]
+    assert [block['name'] for block in diff['unchanged']] == ["module:1", "load"]
+    assert [block['name'] for block in diff['removed']] == ["save"]
+
+def test_attribute_and_splice_findings():
+    """Test that findings follow the blocks they mention."""
+    blocks = split_blocks(BASE_CODE, "python")
+    suggestions = [
+        {'type': 'Issues', 'items': ["load never closes the file", "Missing tests"]},
+        {'type': 'Security', 'items': ["save writes to an arbitrary path"]}
+    ]
+    findings = attribute_findings(suggestions, blocks)
+    load_hash = blocks[1]['hash']
+
+    assert findings[load_hash] == [{'type': 'Issues', 'items': ["load never closes the file"]}]
+    assert findings[FILE_LEVEL] == [{'type': 'Issues', 'items': ["Missing tests"]}]
+
+    spliced = splice_findings(SECTIONS, findings, [FILE_LEVEL, load_hash])
+    assert [s['type'] for s in spliced] == SECTIONS
+    assert spliced[0]['items'] == ["Missing tests", "load never closes the file"]
+    assert spliced[3]['items'] == []
+
+def test_file_level_findings_dropped_after_edit():
+    """Test that file-level findings of the base review do not survive an edit."""
+    reviewer = CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+    base = reviewer.review_code(BASE_CODE, "python", "file-level-base")
+    base.block_findings = {FILE_LEVEL: [{'type': 'Issues', 'items': ["Missing tests"]}]}
+
+    edited = BASE_CODE.replace('f.write(data)', 'f.write(data.strip())')
+    with patch.object(Config, 'ENABLE_FINGERPRINT_CACHE', False):
+        review = reviewer.review_code(edited, "python", "file-level-edit", base_review_id=base.review_id)
+    assert FILE_LEVEL not in review.block_findings
+    assert all("Missing tests" not in section['items'] for section in review.suggestions)
+
+def test_offset_findings():
+    """Test that line references on a block move to its lines in the file."""
+    block = split_blocks(BASE_CODE, "python")[2]
+    sections = [{'type': 'Issues', 'items': ["Line 2 opens the file", "Lines 1-3 lack tests", "Line 9 is out of range"]}]
+
+    assert offset_findings(sections, block)[0]['items'] == [
+        "Line 7 opens the file", "Lines 6-8 lack tests", "Line 9 is out of range"
+    ]
+    assert offset_findings([{'type': 'Issues', 'items': ["Line 3 opens the file"]}], block, 2)[0]['items'] == [
+        "Line 7 opens the file"
+    ]
+
+def test_incremental_findings_use_file_lines():
+    """Test that findings on re-reviewed and moved blocks refer to lines of the new revision."""
+    reviewer = CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+    base = reviewer.review_code(BASE_CODE, "python", "lines-base")
+    load_hash = split_blocks(BASE_CODE, "python")[1]['hash']
+    base.block_findings = {load_hash: [{'type': 'Issues', 'items': ["Line 4 never closes the file"]}]}
+
+    edited = BASE_CODE.replace("import os\n", "import os\n# File helpers\n")
+    edited = edited.replace('f.write(data)', 'f.write(data.strip())')
+    block_review = ([{'type': 'Issues', 'items': ["Line 3 writes unvalidated data"]}], 0)
+    with patch.object(Config, 'ENABLE_FINGERPRINT_CACHE', False), \
+            patch.object(reviewer, '_generate_suggestions', return_value=block_review):
+        review = reviewer.review_code(edited, "python", "lines-edit", base_review_id=base.review_id)
+
+    assert review.suggestions[0]['items'] == ["Line 5 never closes the file", "Line 9 writes unvalidated data"]
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,160 @@
+import pytest
+import torch
+from unittest.mock import patch
+from transformers import LlamaConfig, LlamaForCausalLM
+from src.inference_backends import BACKENDS, MOCK_RESPONSE, MockBackend, TransformersBackend, create_backend
+from src.model_manager import ModelManager
+from src.prompts import EncodedPrompt
+from src.config import Config
+
+def test_create_backend_by_name():
+    """Test backend selection by name."""
+    assert set(BACKENDS) == {"transformers", "compiled", "onnx", "mock"}
+    assert isinstance(create_backend("MOCK"), MockBackend)
+
+def test_create_backend_unknown():
+    """Test that unknown backends are rejected."""
+    with pytest.raises(ValueError) as exc_info:
+        create_backend("tensorrt")
+
+    assert "Unknown inference backend" in str(exc_info.value)
+
+def test_mock_backend_is_deterministic():
+    """Test that the mock backend returns the same response for every prompt."""
+    backend = create_backend("mock")
+    backend.load(Config.MODEL_NAME, None, "cpu")
+
+    assert backend.generate("a", 10) == backend.generate("b", 10) == MOCK_RESPONSE
+    assert backend.generate_batch(["a", "b"], 10) == [MOCK_RESPONSE, MOCK_RESPONSE]
+
+def test_model_manager_delegates_to_backend():
+    """Test that ModelManager loads no tokenizer or weights for the mock backend."""
+    manager = ModelManager(model_name=Config.MODEL_NAME, backend="mock")
+
+    assert manager.tokenizer is None
+    assert manager.model is None
+    assert manager.generate_text("Test input") == MOCK_RESPONSE
+    assert manager.generate_batch(["a", "b"]) == [MOCK_RESPONSE, MOCK_RESPONSE]
+
+class CharTokenizer:
+    """Tokenizer with one token per character, enough to drive a tiny model."""
+
+    pad_token_id = 0
+    padding_side = "right"
+
+    def _encode(self, text, add_special_tokens):
+        return ([1] if add_special_tokens else []) + [3 + ord(c) % 90 for c in text]
+
+    def __call__(self, text, return_tensors=None, add_special_tokens=True, padding=False,
+                 truncation=False, max_length=None):
+        texts = [text] if isinstance(text, str) else text
+        rows = [self._encode(t, add_special_tokens) for t in texts]
+        width = max(len(row) for row in rows)
+        pad = lambda row, value: [value] * (width - len(row)) + row
+        return _Encoding(
+            input_ids=torch.tensor([pad(row, 0) for row in rows]),
+            attention_mask=torch.tensor([pad([1] * len(row), 0) for row in rows])
+        )
+
+    def batch_decode(self, rows, skip_special_tokens=True):
+        return [[int(token) for token in row] for row in rows]
+
+    def decode(self, row, skip_special_tokens=True):
+        return ''.join(chr(int(token)) for token in row)
+
+class _Encoding(dict):
+    def to(self, device):
+        return self
+
+def test_forked_generation_matches_separate_prompts():
+    """Test that forking a prefilled prefix decodes like generating each full prompt."""
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=100, hidden_size=32, intermediate_size=64,
+        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2
+    )).eval()
+    backend = TransformersBackend()
+    backend.model, backend.tokenizer = model, CharTokenizer()
+    prefix = "def f(x):\n    return x\n"
+    branches = ["- Issues:\n", "- Best Practices:\n"]
+
+    with patch.object(Config, "TEMPERATURE", 0):
+        forked = backend.generate_forked(prefix, branches, max_new_tokens=8)
+
+    for branch, tokens in zip(branches, forked):
+        ids = torch.tensor([backend.tokenizer._encode(prefix, True) + backend.tokenizer._encode(branch, False)])
+        expected = model.generate(input_ids=ids, attention_mask=torch.ones_like(ids), max_new_tokens=8,
+                                  do_sample=False, pad_token_id=0)
+        assert tokens == [int(token) for token in expected[0][ids.shape[1]:]]
+
+def test_forked_generation_falls_back_to_batch():
+    """Test that backends without forking batch the full prompts."""
+    manager = ModelManager(model_name=Config.MODEL_NAME, backend="mock")
+    with patch.object(manager.backend, "generate_batch", wraps=manager.backend.generate_batch) as batch:
+        assert manager.generate_forked("prefix ", ["a", "b"]) == [MOCK_RESPONSE, MOCK_RESPONSE]
+    batch.assert_called_once_with(["prefix a", "prefix b"], 1024)
+
+def test_encoded_prompts_skip_tokenization():
+    """Test that prompts carrying token IDs generate like the same text tokenized by the backend."""
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=100, hidden_size=32, intermediate_size=64,
+        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2
+    )).eval()
+    backend = TransformersBackend()
+    backend.model, backend.tokenizer = model, CharTokenizer()
+    texts = ["def f(x):\n    return x\n", "x = 1\n"]
+    encoded = [EncodedPrompt(text, backend.tokenizer._encode(text, True)) for text in texts]
+
+    with patch.object(Config, "TEMPERATURE", 0), \
+            patch.object(CharTokenizer, "__call__", autospec=True, side_effect=CharTokenizer.__call__) as tokenize:
+        assert backend.generate_batch(encoded, max_new_tokens=6) == backend.generate_batch(texts, max_new_tokens=6)
+    assert tokenize.call_count == 1
+
+def test_session_over_input_limit_is_rebuilt():
+    """Test that a continuation past MAX_INPUT_LENGTH recomputes the end of the context."""
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=100, hidden_size=32, intermediate_size=64,
+        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2
+    )).eval()
+    backend = TransformersBackend()
+    backend.model, backend.tokenizer, backend.device = model, CharTokenizer(), "cpu"
+
+    with patch.object(Config, "TEMPERATURE", 0), patch.object(Config, "MAX_INPUT_LENGTH", 40):
+        _, session = backend.generate_session("def f(x):\n    return x\n", None, max_new_tokens=4)
+        previous = session.past_key_values
+        with patch.object(model, "generate", wraps=model.generate) as generate:
+            _, session = backend.generate_session("Why is this slow?" * 2, session, max_new_tokens=4)
+    assert generate.call_args.kwargs['past_key_values'] is not previous
+    assert session.reused_cache is False
+    assert generate.call_args.kwargs['input_ids'].shape[1] == 40
+    assert session.input_ids.shape[1] == 44
+
+def test_sessions_continue_dynamic_caches_and_skip_hybrid_ones():
+    """Test that sessions continue a DynamicCache, and keep only text for Gemma 2's hybrid cache."""
+    from transformers import DynamicCache, Gemma2Config, Gemma2ForCausalLM
+    torch.manual_seed(0)
+    llama = LlamaForCausalLM(LlamaConfig(
+        vocab_size=100, hidden_size=32, intermediate_size=64,
+        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2
+    )).eval()
+    gemma = Gemma2ForCausalLM(Gemma2Config(
+        vocab_size=100, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, head_dim=8, sliding_window=16
+    )).eval()
+    assert gemma.generation_config.cache_implementation == "hybrid"
+
+    with patch.object(Config, "TEMPERATURE", 0):
+        for model, keeps_cache in ((llama, True), (gemma, False)):
+            manager = ModelManager(model_name=Config.MODEL_NAME, backend="mock")
+            manager.backend = TransformersBackend()
+            manager.backend.model, manager.backend.tokenizer, manager.backend.device = model, CharTokenizer(), "cpu"
+            _, session = manager.generate_session("def f(x):\n    return x\n", max_new_tokens=4)
+            assert isinstance(session.past_key_values, DynamicCache) is keeps_cache
+            assert session.nbytes > 0
+            _, session = manager.generate_session("Why?", session, max_new_tokens=4)
+            assert session.reused_cache is keeps_cache
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from src.live_metrics import MetricsBroadcaster
+
+def make_review(review_id):
+    return SimpleNamespace(
+        review_id=review_id,
+        language="python",
+        timestamp=datetime.now(),
+        metrics={'response_time': 0.5, 'suggestion_count': 3},
+        reused_from=None
+    )
+
+class CountingMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.values = {'total_reviews': 0, 'reviews_today': 0}
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.values)
+
+def test_snapshot_then_delta():
+    """Test that subscribers get a snapshot first and then only changed metrics."""
+    async def scenario():
+        metrics = CountingMetrics()
+        broadcaster = MetricsBroadcaster(metrics, interval=0.01)
+        queue = await broadcaster.subscribe()
+        assert (await queue.get())['type'] == 'snapshot'
+
+        metrics.values['total_reviews'] = 1
+        broadcaster.notify_review(make_review("r1"))
+        update = await asyncio.wait_for(queue.get(), 1)
+        broadcaster.unsubscribe(queue)
+        return update
+
+    update = asyncio.run(scenario())
+    assert update['type'] == 'update'
+    assert update['metrics'] == {'total_reviews': 1}
+    assert [review['review_id'] for review in update['reviews']] == ["r1"]
+
+def test_one_aggregation_per_tick():
+    """Test that metrics are computed once per tick regardless of subscribers."""
+    async def scenario():
+        metrics = CountingMetrics()
+        broadcaster = MetricsBroadcaster(metrics, interval=0.05)
+        queues = [await broadcaster.subscribe() for _ in range(10)]
+        calls_before = metrics.calls
+        for i in range(5):
+            broadcaster.notify_review(make_review(f"r{i}"))
+        messages = [[await q.get(), await asyncio.wait_for(q.get(), 1)] for q in queues]
+        for queue in queues:
+            broadcaster.unsubscribe(queue)
+        return metrics.calls - calls_before, messages
+
+    calls, messages = asyncio.run(scenario())
+    assert calls == 1
+    assert all(len(update['reviews']) == 5 for _, update in messages)
+
+def test_idle_ticks_send_nothing():
+    """Test that nothing is pushed when no review was added."""
+    async def scenario():
+        metrics = CountingMetrics()
+        broadcaster = MetricsBroadcaster(metrics, interval=0.01)
+        queue = await broadcaster.subscribe()
+        await queue.get()
+        await asyncio.sleep(0.05)
+        broadcaster.unsubscribe(queue)
+        return queue.qsize(), metrics.calls
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+def test_slow_subscriber_resyncs_with_snapshot():
+    """Test that an overflowing queue is replaced by a fresh snapshot."""
+    async def scenario():
+        metrics = CountingMetrics()
+        broadcaster = MetricsBroadcaster(metrics, interval=3600, max_queue=2)
+        queue = await broadcaster.subscribe()
+        for i in range(3):
+            metrics.values['total_reviews'] = i + 1
+            broadcaster.notify_review(make_review(f"r{i}"))
+            broadcaster._publish(broadcaster._collect())
+        broadcaster.unsubscribe(queue)
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    messages = asyncio.run(scenario())
+    assert [message['type'] for message in messages] == ['snapshot', 'update']
+    state = {**messages[0]['metrics'], **messages[1]['metrics']}
+    assert state['total_reviews'] == 3
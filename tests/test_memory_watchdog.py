@@ -0,0 +1,141 @@
+import threading
+import time
+from unittest.mock import patch
+import pytest
+from transformers import LlamaConfig, LlamaForCausalLM
+from src.cancellation import CancellationToken, ReviewCancelled, use_token
+from src.code_reviewer import CodeReviewer
+from src.config import Config
+from src import memory_watchdog
+from src.memory_watchdog import DECREASE, HOLD, INCREASE, MemoryWatchdog, kv_bytes_per_token, register_prometheus
+from src.model_manager import ModelManager
+
+GB = 1024 ** 3
+
+class FakeMemory:
+    def __init__(self, rss):
+        self.rss = rss
+
+    def __call__(self):
+        return self.rss
+
+def watchdog(memory, **kwargs):
+    options = dict(max_concurrency=8, max_batch_tokens=8192, min_batch_tokens=1024, batch_tokens_step=1024,
+                   rss_reader=memory)
+    options.update(kwargs)
+    return MemoryWatchdog(10 * GB, **options)
+
+def test_limits_follow_aimd():
+    """Test that limits halve under pressure and grow by one step once there is headroom."""
+    memory = FakeMemory(9 * GB)
+    limits = watchdog(memory)
+    assert limits.sample()['decision'] == DECREASE
+    assert (limits.concurrency_limit, limits.batch_token_limit) == (4, 4096)
+    limits.sample()
+    limits.sample()
+    assert (limits.concurrency_limit, limits.batch_token_limit) == (1, 1024)
+    assert limits.sample()['decision'] == HOLD
+
+    memory.rss = 8 * GB
+    assert limits.sample()['decision'] == HOLD
+    memory.rss = 2 * GB
+    assert limits.sample()['decision'] == INCREASE
+    assert (limits.concurrency_limit, limits.batch_token_limit) == (2, 2048)
+    for _ in range(10):
+        limits.sample()
+    assert (limits.concurrency_limit, limits.batch_token_limit) == (8, 8192)
+    assert limits.describe()['decisions'][DECREASE] == 3
+
+def test_admission_waits_for_concurrency_and_headroom():
+    """Test that requests over the limit wait, and that the first request is always admitted."""
+    memory = FakeMemory(1 * GB)
+    limits = watchdog(memory, max_concurrency=1)
+    admitted = []
+
+    def second():
+        with limits.admit(100):
+            admitted.append(time.monotonic())
+
+    with limits.admit(100):
+        thread = threading.Thread(target=second)
+        thread.start()
+        time.sleep(0.3)
+        assert not admitted and limits.describe()['waiting'] == 1
+    thread.join(timeout=5)
+    assert admitted
+
+    # Projected KV cache over the high watermark holds back all but the first request
+    limits = watchdog(FakeMemory(8 * GB), token_bytes=lambda: 1024 * 1024)
+    with limits.admit(1000):
+        token = CancellationToken(timeout=0.2)
+        with use_token(token), pytest.raises(ReviewCancelled):
+            with limits.admit(1000):
+                pass
+
+def test_split_batch_respects_token_limit():
+    """Test that batches are split in order within the token limit."""
+    limits = watchdog(FakeMemory(0), max_batch_tokens=1000)
+    assert limits.split_batch([400, 400, 400, 1500, 100]) == [[0, 1], [2], [3], [4]]
+
+def test_disabled_watchdog_bypasses_limits():
+    """Test that a disabled watchdog neither holds requests back nor splits batches."""
+    limits = watchdog(FakeMemory(9 * GB), max_concurrency=1, max_batch_tokens=1000, enabled=False)
+    with limits.admit(100), limits.admit(100):
+        assert limits.describe()['in_flight'] == 2
+    assert limits.split_batch([400, 400, 1500]) == [[0, 1, 2]]
+    assert not MemoryWatchdog(None, max_concurrency=1, max_batch_tokens=1000).enabled
+
+def test_prometheus_collector_registered_once():
+    """Test that registering again, as a second startup does, reuses the collector."""
+    prometheus_client = pytest.importorskip("prometheus_client")
+    first, second = watchdog(FakeMemory(1 * GB)), watchdog(FakeMemory(2 * GB))
+    assert register_prometheus(first) and register_prometheus(second)
+    try:
+        assert prometheus_client.REGISTRY.get_sample_value('code_review_memory_rss_bytes') == 2 * GB
+    finally:
+        prometheus_client.REGISTRY.unregister(memory_watchdog._collector)
+        memory_watchdog._collector = None
+
+def test_rss_without_proc():
+    """Test that RSS comes from psutil without /proc, and is unknown without either."""
+    import sys
+    from src.system_memory import process_rss_bytes
+    real_open = open
+
+    def no_proc_status(path, *args, **kwargs):
+        if path == '/proc/self/status':
+            raise OSError(path)
+        return real_open(path, *args, **kwargs)
+
+    with patch("builtins.open", side_effect=no_proc_status):
+        with patch("psutil.Process") as process:
+            process.return_value.memory_info.return_value.rss = 123
+            assert process_rss_bytes() == 123
+        with patch.dict(sys.modules, {'psutil': None}):
+            assert process_rss_bytes() is None
+
+    limits = watchdog(lambda: None, max_concurrency=2)
+    limits.sample()
+    assert limits.concurrency_limit == 2
+    with limits.admit(1000), limits.admit(1000):
+        pass
+
+def test_kv_bytes_per_token():
+    """Test the KV cache size per token of a grouped-query model."""
+    config = LlamaConfig(vocab_size=32, hidden_size=64, intermediate_size=64, num_hidden_layers=3,
+                         num_attention_heads=8, num_key_value_heads=2)
+    assert kv_bytes_per_token(LlamaForCausalLM(config)) == 2 * 3 * 2 * 8 * 4
+    assert kv_bytes_per_token(None) == 0
+
+def test_batch_review_split_by_token_limit():
+    """Test that a batch review over the token limit runs as several generate_batch calls."""
+    reviewer = CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+    reviewer.memory_watchdog.enabled = True
+    reviewer.memory_watchdog.batch_token_limit = reviewer._token_estimate("x = 1", Config.MAX_OUTPUT_LENGTH) * 2
+    requests = [{'code': f"x = {i}", 'language': "python", 'review_id': f"split-{i}"} for i in range(5)]
+    with patch.object(reviewer.model_manager, "generate_batch",
+                      wraps=reviewer.model_manager.generate_batch) as generate:
+        reviews = reviewer.review_batch(requests)
+    assert [len(call.args[0]) for call in generate.call_args_list] == [2, 2, 1]
+    assert [review.review_id for review in reviews] == [r['review_id'] for r in requests]
+    assert all(review.suggestions for review in reviews)
@@ -0,0 +1,102 @@
+import random
+import time
+import pytest
+from src.metrics_rollup import LatencySketch, MetricsRollup, merge_exports
+
+def test_sketch_quantiles_within_accuracy():
+    """Test that sketch quantiles stay within the configured relative error."""
+    rng = random.Random(0)
+    values = [rng.lognormvariate(0, 1) for _ in range(20000)]
+    sketch = LatencySketch(accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    values.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+    assert sketch.count == len(values)
+    assert sketch.mean == pytest.approx(sum(values) / len(values))
+
+def test_sketch_memory_is_bounded():
+    """Test that the number of bins does not grow with the number of values."""
+    sketch = LatencySketch(accuracy=0.01)
+    for i in range(100000):
+        sketch.add((i % 1000) / 100 + 0.001)
+    bins = len(sketch.bins)
+    for i in range(100000):
+        sketch.add((i % 1000) / 100 + 0.001)
+    assert len(sketch.bins) == bins
+
+def test_sketch_merge_matches_single_sketch():
+    """Test that merging sketches equals adding all values to one."""
+    merged, left, right = LatencySketch(), LatencySketch(), LatencySketch()
+    for i in range(1, 1001):
+        merged.add(i / 100)
+        (left if i % 2 else right).add(i / 100)
+    left.merge(right)
+
+    assert left.count == merged.count
+    assert left.bins == merged.bins
+    assert left.quantile(0.99) == merged.quantile(0.99)
+
+def test_rollup_windows_and_languages():
+    """Test per-language percentiles and that old buckets fall out of short windows."""
+    rollup = MetricsRollup()
+    now = time.time()
+    rollup.record("python", 1.0, 4, timestamp=now - 3600 * 3)
+    for _ in range(99):
+        rollup.record("python", 0.5, 2, timestamp=now)
+    rollup.record("javascript", 2.0, 6, timestamp=now)
+
+    recent = rollup.summary('5m')
+    assert recent['total_reviews'] == 100
+    assert recent['by_language']['python']['total_reviews'] == 99
+    assert recent['p50_response_time'] == pytest.approx(0.5, rel=0.01)
+    assert recent['p99_response_time'] == pytest.approx(0.5, rel=0.01)
+
+    assert rollup.summary('6h')['total_reviews'] == 101
+    assert rollup.summary('all')['total_reviews'] == 101
+
+    python = rollup.summary('6h', language="python")
+    assert list(python['by_language']) == ["python"]
+    assert python['avg_suggestions'] == pytest.approx(202 / 100)
+
+def test_rollup_groups_extra_languages():
+    """Test that languages beyond the limit are counted as 'other'."""
+    rollup = MetricsRollup(max_languages=2)
+    for language in ("python", "go", "rust", "ruby"):
+        rollup.record(language, 0.1, 1)
+    assert set(rollup.summary()['by_language']) == {"python", "go", "other"}
+
+def test_rollup_rejects_unknown_window():
+    """Test that unknown windows raise ValueError."""
+    with pytest.raises(ValueError):
+        MetricsRollup().summary('2w')
+
+def test_merged_exports_match_single_rollup():
+    """Test that merging exports of several rollups equals one rollup that saw every review."""
+    combined, first, second = MetricsRollup(), MetricsRollup(), MetricsRollup()
+    now = time.time()
+    for i in range(1, 201):
+        language = "python" if i % 3 else "go"
+        combined.record(language, i / 50, i % 5, timestamp=now)
+        (first if i % 2 else second).record(language, i / 50, i % 5, timestamp=now)
+
+    merged = merge_exports([first.export('1h'), second.export('1h')], '1h')
+    expected = combined.summary('1h')
+    assert merged['total_reviews'] == expected['total_reviews'] == 200
+    assert merged['p99_response_time'] == expected['p99_response_time']
+    assert merged['by_language']['go']['p50_response_time'] == expected['by_language']['go']['p50_response_time']
+
+def test_short_window_throughput_uses_covered_time(monkeypatch):
+    """Test that throughput early in the current minute is divided by the time that passed."""
+    now = 1_699_999_980.0 + 15  # 15 seconds into a minute
+    monkeypatch.setattr("src.metrics_rollup.time.time", lambda: now)
+    rollup = MetricsRollup()
+    rollup.started_at = now - 3600
+    for _ in range(30):
+        rollup.record("python", 0.5, 1, timestamp=now)
+
+    assert rollup.summary('1m')['throughput'] == pytest.approx(2.0)
+    assert rollup.summary('5m')['throughput'] == pytest.approx(30 / 255)
@@ -0,0 +1,85 @@
+import ast
+from src.minify import minify_code, strip_comments
+
+PYTHON_CODE = '''# Copyright (c) Example Corp.
+# Licensed under the Apache License, Version 2.0
+
+
+def greet(name):
+    # Build the greeting
+    message = "Hello # not a comment, " + name  # trailing comment
+
+    if name:
+        return message
+    return None
+'''
+
+JS_CODE = '''/*
+ * License header
+ * spanning lines
+ */
+function add(a, b) {
+        // sum
+        return a + b; // done
+}
+
+const url = "http://example.com";
+'''
+
+def test_python_minification_keeps_structure():
+    """Test that comments and blank lines go while the AST stays the same."""
+    minified = minify_code(PYTHON_CODE, "python")
+
+    assert "Copyright" not in minified.code
+    assert "# not a comment" in minified.code
+    assert "trailing comment" not in minified.code
+    assert ast.dump(ast.parse(minified.code)) == ast.dump(ast.parse(PYTHON_CODE))
+    assert minified.code.split('\n')[1] == ' message = "Hello # not a comment, " + name'
+
+def test_line_map_points_to_original_lines():
+    """Test that each minified line maps to its original line number."""
+    minified = minify_code(PYTHON_CODE, "python")
+    original = PYTHON_CODE.split('\n')
+
+    assert minified.line_map == [5, 7, 9, 10, 11]
+    for line, number in zip(minified.code.split('\n'), minified.line_map):
+        assert line.strip() == original[number - 1].split('  #')[0].strip()
+
+def test_c_style_comments_and_strings():
+    """Test block and line comments are removed but strings with // are kept."""
+    minified = minify_code(JS_CODE, "javascript")
+
+    assert "License" not in minified.code
+    assert "// sum" not in minified.code
+    assert 'const url = "http://example.com";' in minified.code
+    assert minified.line_map == [5, 7, 8, 10]
+    assert minified.code.split('\n')[1] == ' return a + b;'
+
+def test_strip_comments_keeps_line_count():
+    """Test that comment stripping never shifts lines."""
+    for code, language in ((PYTHON_CODE, "python"), (JS_CODE, "javascript")):
+        assert strip_comments(code, language).count('\n') == code.count('\n')
+
+def test_unknown_language_only_trims_whitespace():
+    """Test that languages without known comment syntax keep their text."""
+    minified = minify_code("a\n\n    b  # kept\n", "cobol")
+    assert minified.code == "a\n b  # kept"
+    assert minified.line_map == [1, 3]
+
+def test_remap_findings():
+    """Test that line references in findings are rewritten to original lines."""
+    minified = minify_code(PYTHON_CODE, "python")
+    sections = [{'type': 'Issues', 'items': [
+        "Line 2 concatenates strings",
+        "lines 3-4 could be simplified",
+        "See line 5, the L2 cache and line 99"
+    ]}]
+
+    remapped = minified.remap_findings(sections)
+
+    assert remapped[0]['items'] == [
+        "Line 7 concatenates strings",
+        "lines 9-10 could be simplified",
+        "See line 11, the L2 cache and line 99"
+    ]
+    assert sections[0]['items'][0] == "Line 2 concatenates strings"
@@ -0,0 +1,70 @@
+import gc
+import weakref
+import pytest
+from unittest.mock import patch
+from src.config import Config
+from src.model_manager import ModelManager
+from src.model_swap import InsufficientMemoryError, ModelSlot
+
+@pytest.fixture
+def slot():
+    return ModelSlot(ModelManager(model_name="old-model", backend="mock"))
+
+def test_lease_tracks_in_flight(slot):
+    """Test that leases count in-flight requests per manager."""
+    assert slot.in_flight() == 0
+    with slot.lease() as manager:
+        assert manager is slot.current
+        assert slot.in_flight() == 1
+    assert slot.in_flight() == 0
+
+def test_swap_drains_old_model(slot):
+    """Test that new leases switch immediately and the swap waits for old ones."""
+    with slot.lease() as old_manager:
+        slot.start_swap("new-model", backend="mock")
+        slot._swap_thread.join(timeout=0.5)
+
+        # The swap is waiting for the lease on the old model
+        assert slot.swapping
+        assert slot.status['state'] == 'draining'
+        assert slot.current.model_name == "new-model"
+        with slot.lease() as new_manager:
+            assert new_manager is not old_manager
+
+    slot._swap_thread.join(timeout=5)
+    assert not slot.swapping
+    assert slot.status['state'] == 'idle'
+
+def test_swap_refused_without_memory(slot):
+    """Test that a swap does not start when both models cannot fit."""
+    with patch('src.model_swap.estimate_model_bytes', return_value=8 * 2**30), \
+            patch('src.model_swap.available_memory_bytes', return_value=4 * 2**30):
+        with pytest.raises(InsufficientMemoryError):
+            slot.start_swap("big-model", backend="transformers")
+
+    assert slot.current.model_name == "old-model"
+    assert not slot.swapping
+
+def test_swap_rejects_unknown_backend(slot):
+    """Test validation of the requested backend."""
+    with pytest.raises(ValueError):
+        slot.start_swap("new-model", backend="tensorrt")
+
+def test_api_swap_frees_old_model():
+    """Test that nothing but the slot holds the served model, so a swap releases it."""
+    from fastapi.testclient import TestClient
+    from src import api
+
+    old_manager = weakref.ref(api.code_reviewer.model_slot.current)
+    client = TestClient(api.app)
+    with patch.object(Config, "ADMIN_TOKEN", "token"):
+        response = client.post("/api/v1/admin/model", headers={"X-Admin-Token": "token"},
+                               json={"model_name": Config.MODEL_NAME, "backend": "mock"})
+    assert response.status_code == 202
+    api.code_reviewer.model_slot._swap_thread.join(timeout=10)
+    gc.collect()
+    assert api.code_reviewer.model_slot.status['state'] == 'idle'
+    assert old_manager() is None
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,78 @@
+import json
+import os
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from src.config import Config
+from src.model_manager import GENERATE_LABEL, ModelManager
+from src.profiling import ProfileCapture, RequestProfiler
+
+@pytest.fixture
+def profiler(tmp_path):
+    return RequestProfiler(str(tmp_path / "profiles"), max_artifacts=2)
+
+def test_claims_next_count_requests(profiler):
+    """Test that exactly the configured number of requests is profiled."""
+    profiler.configure(count=2)
+    for request_id in ("a", "b"):
+        with profiler.claim(request_id) as capture:
+            assert isinstance(capture, ProfileCapture)
+    assert not isinstance(profiler.claim("c"), ProfileCapture)
+    assert not profiler.enabled
+
+def test_sample_rate(profiler):
+    """Test that a sampled request is profiled only when it falls within the rate."""
+    profiler.configure(sample_rate=0.5)
+    with patch("src.profiling.random.random", return_value=0.9):
+        assert not isinstance(profiler.claim("skipped"), ProfileCapture)
+    with patch("src.profiling.random.random", return_value=0.1):
+        assert isinstance(profiler.claim("sampled"), ProfileCapture)
+    assert profiler.enabled
+    with pytest.raises(ValueError):
+        profiler.configure(sample_rate=1.5)
+
+def test_busy_profiler_skips_concurrent_requests(profiler):
+    """Test that a request arriving during a capture is not profiled and keeps its claim."""
+    profiler.configure(count=2)
+    with profiler.claim("first"):
+        assert not isinstance(profiler.claim("second"), ProfileCapture)
+    assert profiler.status()['remaining'] == 1
+
+def test_capture_labels_model_time_and_prunes(profiler):
+    """Test that traces separate model calls and that old artifacts are pruned."""
+    model = ModelManager(model_name="test-model", backend="mock")
+    profiler.configure(count=3)
+    for request_id in ("a", "b", "c"):
+        with profiler.claim(request_id):
+            model.generate_text("def f(): pass")
+
+    artifacts = profiler.list_artifacts()
+    assert len(artifacts) == 4
+    assert not any(name.endswith("_a.pstats") for name in artifacts)
+    trace = next(name for name in artifacts if name.endswith(".trace.json"))
+    with open(os.path.join(profiler.output_dir, trace)) as f:
+        events = json.load(f)['traceEvents']
+    assert any(event.get('name') == GENERATE_LABEL for event in events)
+
+def test_artifact_download_rejects_traversal(profiler, tmp_path):
+    """Test that only saved artifacts can be downloaded."""
+    (tmp_path / "secret.pstats").write_text("secret")
+    profiler.configure(count=1)
+    with profiler.claim("a"):
+        pass
+    assert profiler.artifact_path("../secret.pstats") is None
+    assert profiler.artifact_path("..") is None
+    assert profiler.artifact_path(profiler.list_artifacts()[0]) is not None
+
+    from src.api import app
+    client = TestClient(app)
+    with patch.object(Config, "ADMIN_TOKEN", "token"), patch("src.api.request_profiler", profiler):
+        headers = {"X-Admin-Token": "token"}
+        assert client.get("/api/v1/admin/profiling/..%2Fsecret.pstats", headers=headers).status_code == 404
+        assert client.get("/api/v1/admin/profiling/%2E%2E", headers=headers).status_code == 404
+        name = profiler.list_artifacts()[0]
+        assert client.get(f"/api/v1/admin/profiling/{name}", headers=headers).status_code == 200
+        assert client.get(f"/api/v1/admin/profiling/{name}").status_code == 403
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,72 @@
+import pytest
+from src.prompts import PROMPT_REGISTRY, PromptRegistry, PromptTemplate
+
+class CharTokenizer:
+    """Tokenizer stub that maps each character to a token."""
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text, add_special_tokens=True):
+        self.calls += 1
+        return [ord(c) for c in text]
+
+def test_default_prompt_renders_code():
+    """Test that the default template embeds code and language."""
+    prompt = PROMPT_REGISTRY.get("default").render("x = {1}", "python")
+
+    assert "```python\nx = {1}\n```" in prompt
+    assert prompt.startswith("As a code reviewer, analyze the following python code")
+
+def test_registry_versions():
+    """Test lookup of registered and unknown versions."""
+    assert "default" in PROMPT_REGISTRY
+    assert "concise" in PROMPT_REGISTRY
+    with pytest.raises(KeyError):
+        PROMPT_REGISTRY.get("missing")
+
+def test_template_requires_code_placeholder():
+    """Test that templates without a code slot are rejected."""
+    with pytest.raises(ValueError):
+        PromptTemplate("bad", "Review some {language}")
+
+def test_encode_reuses_static_tokens():
+    """Test that the static prompt text is only tokenized once per language."""
+    template = PromptTemplate("t", "Review {language}:\n{code}\nDone")
+    tokenizer = CharTokenizer()
+
+    first = template.encode("a", "go", tokenizer)
+    second = template.encode("b", "go", tokenizer)
+
+    assert first == [ord(c) for c in template.render("a", "go")]
+    assert second == [ord(c) for c in template.render("b", "go")]
+    assert tokenizer.calls == 4
+
+def test_static_tokens_keyed_by_vocabulary():
+    """Test that a different tokenizer never gets another tokenizer's cached static tokens."""
+    template = PromptTemplate("t", "Review {language}:\n{code}")
+    first, second = CharTokenizer(), CharTokenizer()
+    first.name_or_path, second.name_or_path = "model-a", "model-b"
+    second.encode = lambda text, add_special_tokens=True: [ord(c) + 1 for c in text]
+
+    template.encode("a", "go", first)
+    assert template.encode("a", "go", second) == [ord(c) + 1 for c in template.render("a", "go")]
+
+def test_render_encoded_attaches_token_ids():
+    """Test that rendered prompts carry their token IDs only when there is a tokenizer."""
+    template = PromptTemplate("t", "Review {language}:\n{code}")
+    prompt = template.render_encoded("a", "go", CharTokenizer())
+    assert prompt == template.render("a", "go")
+    assert prompt.input_ids == [ord(c) for c in prompt]
+    assert not hasattr(template.render_encoded("a", "go", None), "input_ids")
+
+def test_register_replaces_version():
+    """Test that registering an existing version replaces it."""
+    registry = PromptRegistry()
+    registry.register(PromptTemplate("v1", "{code}"))
+    registry.register(PromptTemplate("v1", "Code: {code}", description="new"))
+
+    assert registry.versions() == ["v1"]
+    assert registry.get("v1").description == "new"
+
+if __name__ == '__main__':
+    pytest.main([__file__])
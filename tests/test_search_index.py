@@ -0,0 +1,62 @@
+from datetime import datetime
+from unittest.mock import patch
+from src.code_reviewer import CodeReview, CodeReviewer
+from src.config import Config
+from src.model_manager import ModelManager
+from src.search_index import SearchIndex, analyze
+
+def make_review(review_id, findings, language="python", day=1):
+    review = CodeReview("x = 1\n", language, review_id)
+    review.timestamp = datetime(2024, 3, day)
+    review.suggestions = [{'type': section, 'items': [item]} for section, item in findings]
+    return review
+
+def test_analyze_folds_plurals_and_stopwords():
+    """Test that queries match singular and plural forms."""
+    assert analyze("The SQL injections in queries") == ["sql", "injection", "query"]
+
+def test_search_ranks_by_relevance():
+    """Test that more specific matches rank first and results show the matching items."""
+    index = SearchIndex()
+    index.add(make_review("a", [("Security", "SQL injection via string formatting in the login query"),
+                                ("Issues", "Missing docstring")]))
+    index.add(make_review("b", [("Security", "SQL injection")]))
+    index.add(make_review("c", [("Improvements", "Use a list comprehension")]))
+
+    total, results = index.search("sql injection")
+    assert total == 2
+    assert [r['review_id'] for r in results] == ["b", "a"]
+    assert results[1]['matches'] == [{'section': 'Security',
+                                       'item': "SQL injection via string formatting in the login query"}]
+
+def test_search_filters_and_paginates():
+    """Test language, section and time filters and pagination."""
+    index = SearchIndex()
+    for n in range(5):
+        index.add(make_review(f"py-{n}", [("Security", "Validate input")], day=n + 1))
+    index.add(make_review("go-0", [("Security", "Validate input")], language="go"))
+    index.add(make_review("py-x", [("Issues", "Validate input")]))
+
+    assert index.search("validate", language="Go")[0] == 1
+    assert index.search("validate", section="Issues")[1][0]['review_id'] == "py-x"
+    assert index.search("validate", section=" issues ")[1][0]['matches'][0]['section'] == "Issues"
+    assert index.search("validate", since=datetime(2024, 3, 4))[0] == 2
+
+    total, first = index.search("validate", offset=0, limit=4)
+    _, second = index.search("validate", offset=4, limit=4)
+    assert total == 7
+    assert len(first) == 4 and len(second) == 3
+    assert not {r['review_id'] for r in first} & {r['review_id'] for r in second}
+
+def test_eviction_prunes_index():
+    """Test that reviews evicted from history are no longer found."""
+    with patch.object(Config, "MAX_HISTORY_ITEMS", 2), patch.object(Config, "ENABLE_HISTORY_ARCHIVE", False):
+        reviewer = CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+        for n in range(3):
+            reviewer._add_to_history(make_review(f"r{n}", [("Security", f"Hardcoded token {n}")]))
+
+    result = reviewer.search_history("hardcoded token")
+    assert result['total'] == 2
+    assert {r['review_id'] for r in result['results']} == {"r1", "r2"}
+    assert reviewer.search_history("nonexistent")['results'] == []
+    assert len(reviewer.search_index) == 2
@@ -0,0 +1,191 @@
+import time
+import pytest
+import torch
+from src.code_reviewer import CodeReviewer
+from src.model_manager import ModelManager
+from src.sessions import GenerationSession, SessionStore
+
+def cached_session(numel):
+    return GenerationSession("context", torch.zeros(1, 4, dtype=torch.long), (torch.zeros(numel),))
+
+def test_store_evicts_least_recently_stored():
+    """Test that the store evicts the oldest sessions when over its byte limit."""
+    size = cached_session(100).nbytes
+    store = SessionStore(max_bytes=size * 2, max_sessions=10, ttl_seconds=60)
+    for key in ("a", "b", "c"):
+        store.put(key, cached_session(100))
+
+    assert store.take("a") is None
+    assert store.take("b") is not None
+    assert store.describe()['evictions'] == 1
+
+def test_store_limits_count_and_size():
+    """Test the session count limit and that oversized sessions are not stored."""
+    store = SessionStore(max_bytes=10_000, max_sessions=2, ttl_seconds=60)
+    for key in ("a", "b", "c"):
+        store.put(key, GenerationSession(key))
+    store.put("huge", cached_session(10_000))
+
+    assert store.describe()['sessions'] == 2
+    assert store.take("a") is None
+    assert store.take("huge") is None
+
+def test_store_expires_sessions():
+    """Test that sessions older than the TTL are dropped."""
+    store = SessionStore(max_bytes=10_000, max_sessions=10, ttl_seconds=0.05)
+    store.put("a", GenerationSession("a"))
+    time.sleep(0.1)
+    assert store.take("a") is None
+    assert store.describe()['expired'] == 1
+
+def test_take_is_exclusive():
+    """Test that a taken session is not handed out twice."""
+    store = SessionStore(max_bytes=10_000, max_sessions=10, ttl_seconds=60)
+    store.put("a", GenerationSession("a"))
+    assert store.take("a") is not None
+    assert store.take("a") is None
+
+def test_dynamic_cache_is_measured():
+    """Test that a DynamicCache counts the bytes of its keys and values."""
+    from transformers import DynamicCache
+    cache = DynamicCache.from_legacy_cache(((torch.zeros(1, 2, 4, 8), torch.zeros(1, 2, 4, 8)),))
+    assert GenerationSession("", past_key_values=cache).nbytes == 2 * 64 * 4
+
+def test_hybrid_cache_is_measured():
+    """Test that Gemma 2's preallocated hybrid cache counts its full size."""
+    from transformers import Gemma2Config, HybridCache
+    config = Gemma2Config(vocab_size=32, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                          num_attention_heads=4, num_key_value_heads=2, head_dim=8, sliding_window=16)
+    cache = HybridCache(config, batch_size=1, max_cache_len=64)
+    # Keys and values of a sliding window layer (16 positions) and a global one (64), 2 heads of 8 floats
+    assert GenerationSession("", past_key_values=cache).nbytes == 2 * (16 + 64) * 2 * 8 * 4
+
+def test_unmeasurable_cache_is_not_stored():
+    """Test that a cache of unknown size is dropped and only the session text is kept."""
+    store = SessionStore(max_bytes=10_000, max_sessions=10, ttl_seconds=60)
+    with pytest.raises(TypeError):
+        GenerationSession("", past_key_values=object()).nbytes
+    store.put("a", GenerationSession("text", torch.zeros(1, 4, dtype=torch.long), object()))
+    session = store.take("a")
+    assert session.text == "text" and session.past_key_values is None
+    assert store.describe()['bytes'] == 0
+
+@pytest.fixture
+def reviewer():
+    return CodeReviewer(ModelManager(model_name="test-model", backend="mock"))
+
+def test_follow_up_continues_review_session(reviewer):
+    """Test that a follow-up continues the context stored by the review."""
+    review = reviewer.review_code("def f():\n    return 1\n", "python", "review-1")
+    stored = reviewer.sessions.take("review-1")
+    assert "def f():" in stored.text
+    reviewer.sessions.put("review-1", stored)
+
+    seen = []
+    backend = reviewer.model_manager.backend
+    original = backend.generate_session
+
+    def record(prompt, session, max_new_tokens):
+        seen.append(session)
+        return original(prompt, session, max_new_tokens)
+
+    backend.generate_session = record
+    result = reviewer.follow_up(review.review_id, "Why?")
+
+    assert seen[0] is stored
+    assert "Why?" in reviewer.sessions.take("review-1").text
+    assert result['answer']
+
+def test_follow_up_recomputes_evicted_session(reviewer):
+    """Test that the context is rebuilt from the review when its session is gone."""
+    review = reviewer.review_code("x = 1\n", "python", "review-2")
+    reviewer.sessions.clear()
+
+    result = reviewer.follow_up(review.review_id, "Show me the fix")
+    session = reviewer.sessions.take("review-2")
+
+    assert result['session_reused'] is False
+    assert "x = 1" in session.text
+    assert "- Issues:" in session.text
+    assert session.text.rstrip().endswith(result['answer'].rstrip())
+
+def test_cache_only_reused_by_its_model(reviewer):
+    """Test that a cache computed by another model is dropped."""
+    other = ModelManager(model_name="other-model", backend="mock")
+    session = cached_session(10)
+    session.bind(other)
+
+    assert session.has_cache_for(other)
+    assert not session.has_cache_for(reviewer.model_manager)
+    reviewer.model_manager.generate_session(" more", session, max_new_tokens=8)
+    assert session.past_key_values is None
+
+def test_follow_up_rebuilds_over_long_session(reviewer):
+    """Test that a session grown past MAX_INPUT_LENGTH is replaced by the review context."""
+    from unittest.mock import patch
+    from src.config import Config
+
+    review = reviewer.review_code("x = 1\n", "python", "review-long")
+    stored = reviewer.sessions.take("review-long")
+    stored.text += " earlier answer" * 1000
+    reviewer.sessions.put("review-long", stored)
+
+    with patch.object(Config, "MAX_INPUT_LENGTH", len(stored.text.split())):
+        reviewer.follow_up(review.review_id, "Why?")
+    session = reviewer.sessions.take("review-long")
+    assert "earlier answer" not in session.text
+    assert "x = 1" in session.text and "Why?" in session.text
+
+def test_follow_up_reports_recomputed_context(reviewer):
+    """Test that a failed cached continuation is not reported as a reused session."""
+    review = reviewer.review_code("z = 3\n", "python", "review-fallback")
+    stored = reviewer.sessions.take("review-fallback")
+    stored.input_ids, stored.past_key_values = torch.zeros(1, 4, dtype=torch.long), (torch.zeros(4),)
+    stored.bind(reviewer.model_manager)
+    reviewer.sessions.put("review-fallback", stored)
+
+    backend = reviewer.model_manager.backend
+    original = backend.generate_session
+
+    def fail_cached(prompt, session, max_new_tokens):
+        if session.past_key_values is not None:
+            raise RuntimeError("cache_implementation and past_key_values")
+        return original(prompt, session, max_new_tokens)
+
+    backend.generate_session = fail_cached
+    assert reviewer.follow_up(review.review_id, "Why?")['session_reused'] is False
+
+def test_follow_up_unknown_review(reviewer):
+    """Test that unknown reviews raise KeyError."""
+    with pytest.raises(KeyError):
+        reviewer.follow_up("missing", "Why?")
+
+def test_parallel_sections_assemble_suggestions(reviewer):
+    """Test that forked section branches are assembled into the usual sections."""
+    from unittest.mock import patch
+    from src.config import Config
+    from src.code_reviewer import REVIEW_SECTIONS
+
+    with patch.object(Config, "PARALLEL_SECTIONS", True), \
+            patch.object(reviewer.model_manager, "generate_forked", wraps=reviewer.model_manager.generate_forked) as forked:
+        review = reviewer.review_code("def f():\n    return 1\n", "python", "review-parallel")
+
+    prefix, continuations = forked.call_args.args[:2]
+    assert "def f():" in prefix
+    assert len(continuations) == len(REVIEW_SECTIONS)
+    assert [section['type'] for section in review.suggestions] == REVIEW_SECTIONS
+    # Each branch keeps only the items under its own heading
+    assert review.suggestions[2]['items'][0] == "Add docstring to explain function purpose and parameters"
+
+def test_parallel_sections_tag_forked_prompt(reviewer):
+    """Test that forked reviews are tagged and cached under the forked prompt, not the requested one."""
+    from unittest.mock import patch
+    from src.config import Config
+    from src.prompts import FORKED_PROMPT_VERSION
+
+    with patch.object(Config, "PARALLEL_SECTIONS", True):
+        review = reviewer.review_code("y = 2\n", "python", "review-forked", prompt_version="concise")
+        reviewer.sessions.clear()
+        reviewer.follow_up("review-forked", "Why?")
+    assert review.prompt_version == FORKED_PROMPT_VERSION
+    assert reviewer.review_code("y = 2\n", "python", "review-plain", prompt_version="concise").metrics.get('reused') is None
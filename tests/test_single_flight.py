@@ -0,0 +1,83 @@
+import threading
+import time
+import pytest
+from src.cancellation import CancellationToken
+from src.single_flight import SingleFlight
+
+def test_concurrent_calls_share_result():
+    """Test that concurrent calls with one key run the function once."""
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return "review"
+
+    def call():
+        results.append(flight.do("key", work))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == "review" for result, _ in results)
+    assert flight.in_flight() == 0
+
+def test_sequential_calls_run_again():
+    """Test that a finished call is not cached."""
+    flight = SingleFlight()
+    counter = iter(range(10))
+
+    assert flight.do("key", lambda: next(counter)) == (0, False)
+    assert flight.do("key", lambda: next(counter)) == (1, False)
+
+def test_exception_propagates_to_waiters():
+    """Test that waiters receive the leader's exception."""
+    flight = SingleFlight()
+    started = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        time.sleep(0.2)
+        raise RuntimeError("generation failed")
+
+    def leader():
+        try:
+            flight.do("key", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait()
+    with pytest.raises(RuntimeError):
+        flight.do("key", lambda: "never runs")
+    thread.join()
+
+    assert errors == ["generation failed"]
+
+def test_waiter_with_token_outlasts_poll_interval():
+    """Test that a waiter holding a cancellation token keeps waiting across poll intervals."""
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(flight.POLL_INTERVAL * 6)
+        return "review"
+
+    thread = threading.Thread(target=flight.do, args=("key", slow))
+    thread.start()
+    started.wait()
+    assert flight.do("key", lambda: "never runs", CancellationToken(timeout=5)) == ("review", True)
+    thread.join()
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import httpx
+import pytest
+from src.replay import load_capture, replay, synthesize_code
+from src.traffic_capture import TrafficRecorder
+
+SECRET_CODE = "API_KEY = 'do-not-log-me'\nprint(API_KEY)\n"
+
+def test_recorder_writes_anonymised_shapes(tmp_path):
+    """Test that captures contain request shapes but never code."""
+    recorder = TrafficRecorder(str(tmp_path))
+    assert recorder.mark_arrival() is None
+
+    recorder.start("capture.jsonl")
+    first = recorder.mark_arrival()
+    second = recorder.mark_arrival()
+    recorder.record(second, endpoint="review", language="Python", code=SECRET_CODE, status=200, latency=0.5)
+    recorder.record(first, endpoint="review", language="go", code="x", status=500, latency=0.1)
+    recorder.stop()
+
+    content = (tmp_path / "capture.jsonl").read_text()
+    assert "do-not-log-me" not in content
+    records = [json.loads(line) for line in content.splitlines()]
+    assert records[0]['language'] == "python"
+    assert records[0]['code_bytes'] == len(SECRET_CODE)
+    assert records[0]['code_lines'] == 3
+    assert records[0]['tokens'] > 0
+    assert first[1] == 0.0
+    assert recorder.status()['records'] == 2
+
+def test_recorder_rejects_paths(tmp_path):
+    """Test that capture names cannot escape the capture directory."""
+    with pytest.raises(ValueError):
+        TrafficRecorder(str(tmp_path)).start("../outside.jsonl")
+
+def test_load_capture_orders_by_arrival(tmp_path):
+    """Test that records written out of order are replayed in arrival order."""
+    path = tmp_path / "capture.jsonl"
+    path.write_text('\n'.join(json.dumps(r) for r in [
+        {'offset': 2.0, 'gap': 1.0, 'endpoint': 'review', 'language': 'python', 'code_bytes': 10},
+        {'offset': 1.0, 'gap': 0.0, 'endpoint': 'review', 'language': 'python', 'code_bytes': 10},
+        {'offset': 3.0, 'gap': 1.0, 'endpoint': 'other', 'language': 'python', 'code_bytes': 10},
+    ]))
+    assert [r['offset'] for r in load_capture(str(path))] == [1.0, 2.0]
+
+def test_synthesized_code_matches_size_and_is_unique():
+    """Test that synthetic code has the recorded size and differs per request."""
+    record = {'language': 'python', 'code_bytes': 500}
+    first, second = synthesize_code(record, 0), synthesize_code(record, 1)
+    assert len(first) == 500
+    assert first != second
+    assert synthesize_code({'language': 'cobol', 'code_bytes': 50}, 0)
+
+def test_replay_reports_latency_and_errors():
+    """Test replay pacing, percentiles and error accounting against a fake server."""
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        return httpx.Response(500 if len(calls) == 3 else 200, json={})
+
+    records = [{'offset': i * 0.02, 'gap': 0.02, 'language': 'python', 'code_bytes': 40} for i in range(4)]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test") as client:
+            return await replay(records, client, speed=2.0)
+
+    summary = asyncio.run(run())
+
+    assert summary['requests'] == 4
+    assert summary['succeeded'] == 3
+    assert summary['error_rate'] == pytest.approx(0.25)
+    assert summary['errors_by_status'] == {'500': 1}
+    assert summary['duration'] >= 0.04
+    assert summary['latency_p99'] >= summary['latency_p50']
+    assert all(call['language'] == 'python' for call in calls)
+
+def test_api_records_reviews_after_responding(tmp_path):
+    """Test that successful and rejected reviews are both captured by the review endpoint."""
+    import time
+    from unittest.mock import patch
+    from fastapi.testclient import TestClient
+    from src.api import app
+
+    recorder = TrafficRecorder(str(tmp_path))
+    recorder.start("capture.jsonl")
+    with patch("src.api.traffic_recorder", recorder), TestClient(app) as client:
+        assert client.post("/api/v1/review", json={'code': "x = 1", 'language': "python"}).status_code == 200
+        assert client.post("/api/v1/review", json={'code': "x = 1", 'language': "python",
+                                                   'prompt_version': "missing"}).status_code == 400
+        deadline = time.monotonic() + 5
+        while recorder.records < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    recorder.stop()
+
+    records = [json.loads(line) for line in (tmp_path / "capture.jsonl").read_text().splitlines()]
+    assert sorted(record['status'] for record in records) == [200, 400]